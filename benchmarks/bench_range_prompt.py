@@ -0,0 +1,104 @@
+"""
+Benchmark the range-metrics prompt before and after downsampling + compact encoding
+
+Builds a 168h series at a 5m step (what get_metrics_range returns for a week)
+and reports prompt size, a rough token estimate and build time for the old
+verbose JSON and the new encoding. With --live both prompts are also sent to
+the configured Dify monitor bot and end-to-end latency is measured.
+
+Usage:
+    python benchmarks/bench_range_prompt.py [--hours 168] [--step 300] [--live]
+
+The webhookservice package validates its environment on import, so the usual
+JENKINS_USER / PROMETHEUS_BASE_URL variables (and DIFY_* for --live) must be set.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhookservice.services import dify_service  # noqa: E402
+from webhookservice.utils.async_http_client import run_sync  # noqa: E402
+from webhookservice.utils.sse import async_stream_dify_events  # noqa: E402
+
+
+def make_range_result(hours: int, step: int) -> dict:
+    """A memory series with a daily cycle, noise and one spike"""
+    random.seed(42)
+    end = int(time.time())
+    count = hours * 3600 // step
+    values = []
+    for i in range(count):
+        ts = end - (count - i) * step
+        base = 65e6 + 5e6 * math.sin(2 * math.pi * i * step / 86400)
+        if i == count // 3:
+            base *= 1.8
+        values.append([ts, str(base + random.gauss(0, 5e5))])
+    return {
+        "status": "success",
+        "data": {
+            "resultType": "matrix",
+            "result": [{"metric": {"__name__": "todo_process_resident_memory_bytes"}, "values": values}],
+        },
+    }
+
+
+def legacy_prompt(metrics_data: dict) -> str:
+    """The verbose per-point JSON prompt used before"""
+    series = metrics_data["data"]["result"][0]
+    metric_name = series["metric"].get("__name__", "unknown")
+    formatted_metrics = {
+        "metric_name": metric_name,
+        "values": [
+            {"timestamp": v[0], "value": float(v[1]) / 1024 / 1024}
+            for v in series["values"]
+        ],
+    }
+    return f"Please analyze these monitoring metrics over time and provide insights: {json.dumps(formatted_metrics)}"
+
+
+async def stream_analysis(prompt: str):
+    response = await dify_service.async_make_dify_request(dify_service.DIFY_MONITOR_BOT_API_KEY, prompt, timeout=120)
+    await async_stream_dify_events(response, {})
+
+
+def time_live(prompt: str) -> float:
+    started = time.perf_counter()
+    run_sync(stream_analysis(prompt))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hours", type=int, default=168)
+    parser.add_argument("--step", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--live", action="store_true", help="Send both prompts to Dify")
+    args = parser.parse_args()
+
+    metrics = make_range_result(args.hours, args.step)
+    points = len(metrics["data"]["result"][0]["values"])
+
+    rows = []
+    for name, build in (("before", legacy_prompt), ("after", dify_service.build_analysis_query)):
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            prompt = build(metrics)
+        build_ms = (time.perf_counter() - started) / args.iterations * 1000
+        latency = time_live(prompt) if args.live else None
+        rows.append((name, len(prompt.encode("utf-8")), len(prompt) // 4, build_ms, latency))
+
+    print(f"{points} points over {args.hours}h at {args.step}s step")
+    print(f"{'prompt':<8}{'bytes':>10}{'~tokens':>10}{'build ms':>10}{'e2e s':>8}")
+    for name, size, tokens, build_ms, latency in rows:
+        e2e = f"{latency:.2f}" if latency is not None else "-"
+        print(f"{name:<8}{size:>10}{tokens:>10}{build_ms:>10.2f}{e2e:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark handling a range result as Python lists versus columnar TimeSeries
+
+Replays what one health report does with a 168h range result: render it
+for Slack, summarise it, build the Dify prompt and fingerprint it. The
+"before" path is the old one: timestamps rewritten to strings in place,
+then every consumer converting strings back to floats and times. The
+"after" path parses the response once into int64/float64 arrays that every
+consumer shares. Reports time per report and peak traced memory.
+
+Usage:
+    python benchmarks/bench_range_series.py [--hours 168] [--step 300] [--series 1]
+
+The webhookservice package validates its environment on import, so the usual
+JENKINS_USER / PROMETHEUS_BASE_URL variables must be set.
+"""
+import argparse
+import copy
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhookservice.services.dify_service import build_analysis_query  # noqa: E402
+from webhookservice.utils.downsample import encode_series  # noqa: E402
+from webhookservice.utils.fingerprint import metrics_fingerprint  # noqa: E402
+from webhookservice.utils.metrics_formatter import process_time_series_data  # noqa: E402
+from webhookservice.utils.series import as_series, series_result  # noqa: E402
+
+
+def make_response(hours: int, step: int, series: int) -> str:
+    """A JSON query_range body of memory series with a daily cycle and noise"""
+    random.seed(42)
+    end = int(time.time()) // step * step
+    count = hours * 3600 // step + 1
+    result = []
+    for s in range(series):
+        values = [
+            [end - (count - 1 - i) * step, str(65e6 + 5e6 * math.sin(2 * math.pi * i * step / 86400) + random.gauss(0, 5e5))]
+            for i in range(count)
+        ]
+        result.append({"metric": {"__name__": "todo_process_resident_memory_bytes", "instance": f"app-{s}"}, "values": values})
+    return json.dumps({"status": "success", "data": {"resultType": "matrix", "result": result}})
+
+
+def _parse(ts) -> float:
+    return datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+def legacy_report(body: str):
+    """The list-based pipeline: format in place, then re-parse in every consumer"""
+    result = json.loads(body)
+    for series in result["data"]["result"]:
+        for value in series["values"]:
+            value[0] = datetime.fromtimestamp(value[0]).strftime("%Y-%m-%d %H:%M:%S")
+    rendered = copy.deepcopy(result)
+
+    values = result["data"]["result"][0]["values"]
+    values_float = [float(v[1]) / 1024 / 1024 for v in values]
+    summary = (min(values_float), max(values_float), sum(values_float) / len(values_float),
+               values[values_float.index(min(values_float))][0], values[values_float.index(max(values_float))][0])
+
+    timestamps = [_parse(v[0]) for v in values]
+    prompt = json.dumps(encode_series(timestamps, [float(v[1]) / 1024 / 1024 for v in values], 120, 2))
+
+    shapes = [
+        ([float(v[1]) for v in s["values"]], _parse(s["values"][-1][0]) - _parse(s["values"][0][0]))
+        for s in result["data"]["result"]
+    ]
+    return rendered, summary, prompt, shapes
+
+
+def columnar_report(body: str):
+    """Parse once into TimeSeries; consumers share the arrays"""
+    raw = json.loads(body)
+    result = series_result(as_series(s) for s in raw["data"]["result"])
+    summary = process_time_series_data(result["data"]["result"])
+    prompt = build_analysis_query(result)
+    fingerprint = metrics_fingerprint(result)
+    return result, summary, prompt, fingerprint
+
+
+def measure(report, body: str, iterations: int):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        report(body)
+    elapsed_ms = (time.perf_counter() - started) / iterations * 1000
+
+    tracemalloc.start()
+    kept = report(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return elapsed_ms, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hours", type=int, default=168)
+    parser.add_argument("--step", type=int, default=300)
+    parser.add_argument("--series", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    body = make_response(args.hours, args.step, args.series)
+    points = args.hours * 3600 // args.step + 1
+
+    print(f"{args.series} x {points} points over {args.hours}h at {args.step}s step")
+    print(f"{'path':<8}{'ms/report':>12}{'peak KiB':>12}")
+    for name, report in (("before", legacy_report), ("after", columnar_report)):
+        elapsed_ms, peak_kib = measure(report, body, args.iterations)
+        print(f"{name:<8}{elapsed_ms:>12.2f}{peak_kib:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark the shared Dify SSE parser against the per-consumer line loop it replaced
+
+Replays the recorded Dify streams in benchmarks/data and reports, per stream,
+the time to decode every event and how many lines the intent parsers read
+before closing the response.
+
+Usage:
+    python benchmarks/bench_sse_parser.py [--iterations 2000]
+
+The webhookservice package validates its environment on import, so the usual
+JENKINS_USER / PROMETHEUS_BASE_URL variables must be set.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhookservice.utils.sse import async_stream_dify_events, iter_dify_events  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+class RecordedResponse:
+    """Minimal stand-in for a streaming AsyncResponse"""
+
+    def __init__(self, raw: bytes):
+        self.lines = raw.split(b"\n")
+        self.lines_read = 0
+        self.closed = False
+
+    async def iter_lines(self):
+        for line in self.lines:
+            self.lines_read += 1
+            yield line
+
+    def close(self):
+        self.closed = True
+
+
+def legacy_decode(lines):
+    """The iter_lines + replace('data: ', '') + json.loads loop used before"""
+    events = []
+    for line in lines:
+        if not line:
+            continue
+        line_str = line.decode("utf-8").replace("data: ", "")
+        try:
+            events.append(json.loads(line_str))
+        except json.JSONDecodeError:
+            continue
+    return events
+
+
+def first_intent(data):
+    thought = data.get("thought", "")
+    if thought:
+        return thought
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'stream':<28}{'events':>8}{'legacy us':>12}{'sse us':>10}{'lines read':>14}")
+    for name in sorted(os.listdir(DATA_DIR)):
+        if not name.endswith(".sse"):
+            continue
+        with open(os.path.join(DATA_DIR, name), "rb") as f:
+            raw = f.read()
+        lines = raw.split(b"\n")
+
+        events = list(iter_dify_events(lines))
+        assert [e.get("event") for e in events] == [
+            e.get("event") for e in legacy_decode(lines)
+        ], f"{name}: parsers disagree"
+
+        legacy = timeit.timeit(lambda: legacy_decode(lines), number=args.iterations)
+        shared = timeit.timeit(lambda: list(iter_dify_events(lines)), number=args.iterations)
+
+        response = RecordedResponse(raw)
+        asyncio.run(async_stream_dify_events(response, {"agent_thought": first_intent}))
+
+        print(
+            f"{name:<28}{len(events):>8}"
+            f"{legacy / args.iterations * 1e6:>12.1f}"
+            f"{shared / args.iterations * 1e6:>10.1f}"
+            f"{response.lines_read:>8}/{len(lines):<5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
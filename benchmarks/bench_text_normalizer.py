@@ -0,0 +1,104 @@
+"""
+Micro-benchmark the Dify answer normalizer against the quadratic cleanup it replaced
+
+Runs both implementations over the golden corpus in tests/data/normalizer,
+checks they agree, and reports time per input. Use --write-golden to
+regenerate the expected outputs from the legacy implementation.
+
+Usage:
+    python benchmarks/bench_text_normalizer.py [--iterations 20] [--write-golden]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhookservice.utils.text_normalizer import clean_text  # noqa: E402
+
+CORPUS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "data", "normalizer"
+)
+
+
+def legacy_clean_text(text: str) -> str:
+    """The clean_text that used to live inside parse_deployment_intent"""
+    if not text:
+        return ""
+
+    formatted_text = None
+    for possible_text in text.split("I can help you"):
+        if "deploy applications" in possible_text and "Try commands like:" in possible_text:
+            formatted_text = "I can help you" + possible_text
+            break
+
+    if not formatted_text:
+        lines = text.split("\n")
+        cleaned_lines = []
+        for line in lines:
+            line = line.strip()
+            if not line or line in cleaned_lines:
+                continue
+            if line.startswith("-"):
+                if not line.startswith("- "):
+                    line = "- " + line[1:].strip()
+            cleaned_lines.append(line)
+        return "\n".join(cleaned_lines)
+
+    lines = []
+    current_line = ""
+    for char in formatted_text:
+        if char == "-" and current_line.strip():
+            if current_line.strip():
+                lines.append(current_line.strip())
+            current_line = "-"
+        else:
+            current_line += char
+    if current_line.strip():
+        lines.append(current_line.strip())
+
+    cleaned_lines = []
+    for line in lines:
+        line = line.strip()
+        if not line or line in cleaned_lines:
+            continue
+        if line.startswith("-"):
+            if not line.startswith("- "):
+                line = "- " + line[1:].strip()
+        cleaned_lines.append(line)
+
+    return "\n".join(cleaned_lines)
+
+
+def load_corpus():
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if name.endswith(".input.txt"):
+            with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+                yield name[: -len(".input.txt")], f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--write-golden", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'input':<26}{'chars':>8}{'legacy ms':>12}{'linear ms':>12}{'speedup':>9}")
+    for name, text in load_corpus():
+        expected = legacy_clean_text(text)
+        if args.write_golden:
+            with open(os.path.join(CORPUS_DIR, f"{name}.expected.txt"), "w", encoding="utf-8") as f:
+                f.write(expected)
+        assert clean_text(text) == expected, f"{name}: outputs differ"
+
+        legacy = timeit.timeit(lambda: legacy_clean_text(text), number=args.iterations) / args.iterations
+        linear = timeit.timeit(lambda: clean_text(text), number=args.iterations) / args.iterations
+        print(
+            f"{name:<26}{len(text):>8}{legacy * 1000:>12.3f}{linear * 1000:>12.3f}"
+            f"{legacy / linear if linear else 0:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
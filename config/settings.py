@@ -25,6 +25,111 @@ DIFY_MONITOR_BOT_API_KEY = os.environ.get("DIFY_MONITOR_BOT_API_KEY", "")
 
 # Prometheus Configuration
 PROMETHEUS_BASE_URL = os.environ.get("PROMETHEUS_BASE_URL")
+# JSON object of result field to PromQL, e.g. {"cpu_usage": "rate(...[1m]) * 100"}; empty uses the defaults
+PROMETHEUS_SNAPSHOT_METRICS = os.environ.get("PROMETHEUS_SNAPSHOT_METRICS", "")
+# Seconds; keep in line with scrape_interval in prometheus/prometheus.yml
+PROMETHEUS_SCRAPE_INTERVAL = int(os.environ.get("PROMETHEUS_SCRAPE_INTERVAL", "15"))
+# Responses are decoded series by series; reading stops after this many series
+PROMETHEUS_MAX_SERIES = int(os.environ.get("PROMETHEUS_MAX_SERIES", "500"))
+# Newest points kept per series; 11000 is Prometheus' own query_range limit
+PROMETHEUS_MAX_POINTS_PER_SERIES = int(os.environ.get("PROMETHEUS_MAX_POINTS_PER_SERIES", "11000"))
+PROMETHEUS_STREAM_CHUNK_SIZE = int(os.environ.get("PROMETHEUS_STREAM_CHUNK_SIZE", "65536"))  # Bytes per read
+
+# Range Query Resolution Configuration
+RANGE_SUMMARY_MAX_POINTS = int(os.environ.get("RANGE_SUMMARY_MAX_POINTS", "300"))  # Slack summaries and Dify prompts
+RANGE_DEFAULT_MAX_POINTS = int(os.environ.get("RANGE_DEFAULT_MAX_POINTS", "1000"))  # Callers without a hint
+RANGE_EXPORT_MAX_POINTS = int(os.environ.get("RANGE_EXPORT_MAX_POINTS", "11000"))  # Exports; Prometheus' per-series limit
+
+# HTTP Client Pool Configuration
+ASYNC_HTTP_LIMIT = int(os.environ.get("ASYNC_HTTP_LIMIT", "200"))  # Open connections per upstream session
+ASYNC_HTTP_LIMIT_PER_HOST = int(os.environ.get("ASYNC_HTTP_LIMIT_PER_HOST", "100"))  # Open connections per host
+HTTP_KEEPALIVE_IDLE = int(os.environ.get("HTTP_KEEPALIVE_IDLE", "60"))  # Seconds an idle pooled connection is kept
+
+# Intent Cache Configuration
+INTENT_CACHE_MAXSIZE = int(os.environ.get("INTENT_CACHE_MAXSIZE", "512"))  # Entries per bot
+INTENT_CACHE_TTL = int(os.environ.get("INTENT_CACHE_TTL", "3600"))  # Seconds
+
+# Intent Fast-Path Configuration
+INTENT_FAST_PATH_ENABLED = os.environ.get("INTENT_FAST_PATH_ENABLED", "true").lower() == "true"
+INTENT_FAST_PATH_MIN_CONFIDENCE = float(os.environ.get("INTENT_FAST_PATH_MIN_CONFIDENCE", "0.9"))
+INTENT_FAST_PATH_MAX_HOURS = float(os.environ.get("INTENT_FAST_PATH_MAX_HOURS", "720"))  # Longer ranges are left to the LLM
+
+# Range Query Chunking Configuration
+RANGE_CHUNK_POINTS = int(os.environ.get("RANGE_CHUNK_POINTS", "2880"))  # Points per series above which a range is split
+RANGE_CHUNK_WORKERS = int(os.environ.get("RANGE_CHUNK_WORKERS", "4"))  # Chunks fetched at once, across all requests
+SKETCH_RELATIVE_ACCURACY = float(os.environ.get("SKETCH_RELATIVE_ACCURACY", "0.01"))  # Percentile error of range summaries
+RANGE_STATS_MAX_HOURS = float(os.environ.get("RANGE_STATS_MAX_HOURS", "720"))  # Longest range a summary may cover
+RANGE_STATS_MAX_POINTS = int(os.environ.get("RANGE_STATS_MAX_POINTS", "200000"))  # Points per series a summary may read
+RANGE_STATS_MAX_CHUNKS = int(os.environ.get("RANGE_STATS_MAX_CHUNKS", "72"))  # Chunk queries one summary may send
+
+# Range Query Cache Configuration
+RANGE_CACHE_MAXSIZE = int(os.environ.get("RANGE_CACHE_MAXSIZE", "128"))  # Entries per step size; TTL is the step
+SERIES_STORE_MAXSIZE = int(os.environ.get("SERIES_STORE_MAXSIZE", "64"))  # (query, step) windows kept for tail fetches
+
+# Metrics Pre-warming Configuration
+PREWARM_ENABLED = os.environ.get("PREWARM_ENABLED", "true").lower() == "true"  # Refresh the snapshot in the background
+PREWARM_MAX_STALENESS = float(os.environ.get("PREWARM_MAX_STALENESS", "120"))  # Seconds a snapshot is served while refreshing
+# JSON list of {"metric", "hours", "purpose"} range queries to keep warm
+PREWARM_RANGE_QUERIES = os.environ.get("PREWARM_RANGE_QUERIES", "")
+
+# Anomaly Pre-screen Configuration
+ANOMALY_SCREEN_ENABLED = os.environ.get("ANOMALY_SCREEN_ENABLED", "true").lower() == "true"  # Skip Dify for nominal metrics
+ANOMALY_Z_THRESHOLD = float(os.environ.get("ANOMALY_Z_THRESHOLD", "3.5"))  # Robust standard deviations still nominal
+ANOMALY_BASELINE_WINDOW = int(os.environ.get("ANOMALY_BASELINE_WINDOW", "240"))  # Snapshots kept per metric; 1h at 15s
+ANOMALY_MIN_BASELINE = int(os.environ.get("ANOMALY_MIN_BASELINE", "20"))  # Samples needed before anything is nominal
+ANOMALY_MIN_SPREAD = float(os.environ.get("ANOMALY_MIN_SPREAD", "0.05"))  # Fraction of the median always treated as noise
+ANOMALY_RECENT_FRACTION = float(os.environ.get("ANOMALY_RECENT_FRACTION", "0.1"))  # Newest part of a range that is screened
+ANOMALY_CPU_MAX_PERCENT = float(os.environ.get("ANOMALY_CPU_MAX_PERCENT", "80"))  # Above this always goes to Dify
+ANOMALY_MEMORY_MAX_MB = float(os.environ.get("ANOMALY_MEMORY_MAX_MB", "1024"))  # Above this always goes to Dify
+
+# Fleet Sweep Configuration
+# JSON list of {"name", "job", "metric_prefix", "queries"}; defaults to the todo app
+FLEET_SERVICES = os.environ.get("FLEET_SERVICES", "")
+FLEET_SWEEP_WORKERS = int(os.environ.get("FLEET_SWEEP_WORKERS", "8"))  # Sweep queries sent to Prometheus at once
+FLEET_CPU_WARN_PERCENT = float(os.environ.get("FLEET_CPU_WARN_PERCENT", "80"))  # CPU usage flagged in a sweep
+FLEET_REPORT_TOP = int(os.environ.get("FLEET_REPORT_TOP", "10"))  # Worst services listed in a sweep report
+
+# PromQL Guard Configuration (ad-hoc queries from users and the LLM)
+PROMQL_MAX_COST = float(os.environ.get("PROMQL_MAX_COST", "500000"))  # Estimated sample reads; costlier queries are rejected
+PROMQL_MAX_RANGE_HOURS = float(os.environ.get("PROMQL_MAX_RANGE_HOURS", "168"))  # Longest range selector or subquery
+PROMQL_MAX_LOOKBACK_DAYS = float(os.environ.get("PROMQL_MAX_LOOKBACK_DAYS", "30"))  # Furthest back a query may read, offsets included
+PROMQL_MAX_SERIES = int(os.environ.get("PROMQL_MAX_SERIES", "50"))  # Unaggregated queries are wrapped in topk of this many
+PROMQL_MAX_POINTS_PER_SERIES = int(os.environ.get("PROMQL_MAX_POINTS_PER_SERIES", "1000"))  # Newest points kept per series
+PROMQL_EVAL_TIMEOUT = os.environ.get("PROMQL_EVAL_TIMEOUT", "5s")  # Prometheus abandons the query after this
+
+# LLM Prompt Configuration
+METRICS_PROMPT_MAX_POINTS = int(os.environ.get("METRICS_PROMPT_MAX_POINTS", "120"))  # Points per series sent to Dify
+METRICS_PROMPT_PRECISION = int(os.environ.get("METRICS_PROMPT_PRECISION", "2"))  # Decimal places per value
+METRICS_PROMPT_MAX_SERIES = int(os.environ.get("METRICS_PROMPT_MAX_SERIES", "5"))  # Series described, highest peak first
+
+# Analysis Cache Configuration
+ANALYSIS_CACHE_MAXSIZE = int(os.environ.get("ANALYSIS_CACHE_MAXSIZE", "256"))
+ANALYSIS_CACHE_TTL = int(os.environ.get("ANALYSIS_CACHE_TTL", "300"))  # Seconds
+ANALYSIS_CACHE_SIGNIFICANT_DIGITS = int(os.environ.get("ANALYSIS_CACHE_SIGNIFICANT_DIGITS", "2"))
+
+# Health Report Configuration
+SLACK_SUMMARY_MAX_SERIES = int(os.environ.get("SLACK_SUMMARY_MAX_SERIES", "5"))  # Series shown in a health report
+# Relative change of any reported value (0.05 = 5%) that makes Refresh ask Dify for a new analysis
+REFRESH_REANALYZE_THRESHOLD = float(os.environ.get("REFRESH_REANALYZE_THRESHOLD", "0.05"))
+
+# Slack Streaming Configuration
+SLACK_STREAMING_ENABLED = os.environ.get("SLACK_STREAMING_ENABLED", "true").lower() == "true"
+SLACK_UPDATE_MIN_INTERVAL = float(os.environ.get("SLACK_UPDATE_MIN_INTERVAL", "1.5"))  # Seconds between chat.update calls
+
+# LLM Backend Routing Configuration
+# JSON list of {"name", "endpoint", "deploy_api_key", "monitor_api_key"}; defaults to DIFY_API_ENDPOINT alone
+DIFY_BACKENDS = os.environ.get("DIFY_BACKENDS", "")
+LLM_FAILURE_THRESHOLD = int(os.environ.get("LLM_FAILURE_THRESHOLD", "3"))  # Consecutive failures before a circuit opens
+LLM_CIRCUIT_RESET_TIMEOUT = float(os.environ.get("LLM_CIRCUIT_RESET_TIMEOUT", "30"))  # Seconds before a probe is allowed
+LLM_ERROR_WINDOW = int(os.environ.get("LLM_ERROR_WINDOW", "20"))  # Recent calls used for a backend's error rate
+LLM_HEDGE_INTENTS = os.environ.get("LLM_HEDGE_INTENTS", "false").lower() == "true"  # Hedge intent parsing calls
+LLM_HEDGE_DELAY = float(os.environ.get("LLM_HEDGE_DELAY", "0.3"))  # Seconds before asking a second backend
+
+# Request Deadline Configuration
+SLACK_REQUEST_DEADLINE = float(os.environ.get("SLACK_REQUEST_DEADLINE", "60"))  # Seconds for a whole Slack request
+DIFY_REQUEST_TIMEOUT = float(os.environ.get("DIFY_REQUEST_TIMEOUT", "30"))  # Seconds per Dify call
+PROMETHEUS_REQUEST_TIMEOUT = float(os.environ.get("PROMETHEUS_REQUEST_TIMEOUT", "10"))  # Seconds per Prometheus call
+JENKINS_REQUEST_TIMEOUT = float(os.environ.get("JENKINS_REQUEST_TIMEOUT", "10"))  # Seconds per Jenkins call
 
 # Flask Configuration
 FLASK_HOST = "0.0.0.0"
@@ -44,7 +149,7 @@ def validate_config():
         raise ValueError("DIFY_DEPLOY_BOT_API_KEY environment variable is not set")
     if not DIFY_MONITOR_BOT_API_KEY:
         raise ValueError("DIFY_MONITOR_BOT_API_KEY environment variable is not set")
-    if not DIFY_API_ENDPOINT:
+    if not DIFY_API_ENDPOINT and not DIFY_BACKENDS:
         raise ValueError("DIFY_API_ENDPOINT environment variable is not set")
     if not PROMETHEUS_BASE_URL:
         raise ValueError("PROMETHEUS_BASE_URL environment variable is not set")
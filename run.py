@@ -1,6 +1,14 @@
+from config.settings import PREWARM_ENABLED
 from webhookservice import create_app
+from webhookservice.services.prometheus_service import start_prewarming
 
 app = create_app()
 
+# Keep the current metrics snapshot warm so requests don't wait on Prometheus.
+# Started here rather than in create_app, so building an app in tests or
+# tooling does not poll Prometheus.
+if PREWARM_ENABLED:
+    start_prewarming()
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5001)
@@ -2,6 +2,11 @@ import pytest
 from unittest.mock import Mock, patch
 import os
 import sys
+import json
+import time
+import threading
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # Add the project root directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -46,4 +51,110 @@ def sample_prometheus_query():
     return {
         "query": "cpu_usage",
         "time_range": "5m"
-    } 
\ No newline at end of file
+    }
+
+def sse_body(*events):
+    """Encode Dify payloads as a text/event-stream body"""
+    return "".join(f"data: {json.dumps(event)}\n\n" for event in events).encode("utf-8")
+
+
+MONITOR_ANSWER = sse_body(
+    {"event": "agent_thought", "thought": '{"query_type": "current", "metric": "cpu", "hours": 1}'},
+    {"event": "end", "answer": ""},
+)
+
+
+class FakeAsyncResponse:
+    """A stand-in AsyncResponse replaying fixed lines, or a fixed body"""
+
+    def __init__(self, lines=(), status_code=200, text=""):
+        self.lines = list(lines)
+        self.status_code = status_code
+        self.body = text
+        self.lines_read = 0
+        self.closed = False
+
+    async def iter_lines(self):
+        for line in self.lines:
+            self.lines_read += 1
+            yield line
+
+    async def iter_chunked(self, size):
+        data = self.body.encode("utf-8")
+        for start in range(0, len(data), size):
+            yield data[start:start + size]
+
+    async def text(self):
+        return self.body
+
+    async def json(self):
+        return json.loads(self.body)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+    def close(self):
+        self.closed = True
+
+
+class StandInServer:
+    """A local Dify/Prometheus stand-in that answers with a fixed status, delay and body"""
+
+    def __init__(self, status=200, delay=0.0, body=MONITOR_ANSWER, content_type="text/event-stream"):
+        self.status = status
+        self.delay = delay
+        self.body = body
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                server.requests.append(
+                    {"path": self.path, "authorization": self.headers.get("Authorization"), "body": self.rfile.read(length)}
+                )
+                self.respond()
+
+            def do_GET(self):
+                server.requests.append({"path": self.path, "authorization": self.headers.get("Authorization")})
+                self.respond()
+
+            def respond(self):
+                time.sleep(server.delay)
+                self.send_response(server.status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(server.body)))
+                self.end_headers()
+                self.wfile.write(server.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        # Clients that give up early (timeouts, lost hedges) are expected
+        self.httpd.handle_error = lambda request, client_address: None
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.endpoint = f"{self.base_url}/v1/chat-messages"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def servers():
+    """Start local stand-in servers: servers(status=500, delay=0.1, body=b"...")"""
+    started = []
+
+    def start(**kwargs):
+        server = StandInServer(**kwargs)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.close()
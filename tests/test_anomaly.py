@@ -0,0 +1,116 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from conftest import FakeAsyncResponse
+from webhookservice.services import dify_service
+from webhookservice.services.dify_service import send_metrics_to_dify
+from webhookservice.utils.anomaly import AnomalyScreen, MetricBaselines, nominal_analysis, robust_z
+from webhookservice.utils.cache import BoundedTTLCache
+from webhookservice.utils.series import TimeSeries, series_result
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def baselines():
+    baselines = MetricBaselines(window=240)
+    rng = np.random.default_rng(3)
+    for i in range(60):
+        baselines.observe("cpu_usage", 12 + rng.normal(0, 1), 1620000000 + 15 * i)
+        baselines.observe("memory_usage", 64 * MB + rng.normal(0, MB), 1620000000 + 15 * i)
+    return baselines
+
+
+@pytest.fixture
+def screen(baselines):
+    return AnomalyScreen(baselines)
+
+
+def test_baselines_skip_samples_already_seen():
+    baselines = MetricBaselines(window=3)
+    for timestamp, value in [(1, 1.0), (1, 9.0), (0, 9.0), (2, 2.0), (3, 3.0), (4, 4.0)]:
+        baselines.observe("cpu_usage", value, timestamp)
+    assert baselines.values("cpu_usage").tolist() == [2.0, 3.0, 4.0]
+
+
+def test_flat_metrics_are_not_scored_on_noise():
+    reference = np.full(50, 100.0)
+    assert abs(robust_z(np.array([101.0]), reference, min_spread=0.05)[0]) < 1
+    assert robust_z(np.array([130.0]), reference, min_spread=0.05)[0] == pytest.approx(6.0)
+
+
+def test_current_metrics_are_screened_against_the_baseline(screen):
+    nominal = screen.screen({"cpu_usage": 12.4, "memory_usage": 65 * MB, "server_time": "now"})
+    assert nominal.nominal
+    assert set(nominal.scores) == {"cpu_usage", "memory_usage"}
+    assert "`memory_usage`: `65.00 MB`" in nominal_analysis(nominal)
+
+    assert screen.screen({"cpu_usage": 45.0, "memory_usage": 65 * MB}).outcome == "anomalous"
+    assert AnomalyScreen(MetricBaselines(240)).screen({"cpu_usage": 12.4}).outcome == "no_baseline"
+
+
+def test_range_results_are_screened_against_their_own_history(screen):
+    rng = np.random.default_rng(5)
+    timestamps = np.arange(0, 300 * 288, 300)
+    steady = 64 * MB + rng.normal(0, MB, len(timestamps))
+    leaking = steady.copy()
+    leaking[-10:] += 20 * MB
+
+    def result(values):
+        return series_result([TimeSeries({"__name__": "todo_process_resident_memory_bytes", "instance": "a"}, timestamps, values)])
+
+    assert screen.screen(result(steady)).nominal
+    assert screen.screen(result(leaking)).outcome == "anomalous"
+    assert screen.screen(result(steady[:15])).outcome == "no_baseline"
+    assert screen.screen({"data": {"resultType": "vector", "result": []}}).outcome == "unsupported"
+
+
+@patch("webhookservice.services.dify_service.async_make_dify_request")
+def test_nominal_reports_skip_dify(mock_make_request, screen):
+    mock_make_request.return_value = FakeAsyncResponse()
+    with patch.object(dify_service, "anomaly_screen", screen), \
+            patch.object(dify_service, "analysis_cache", BoundedTTLCache(maxsize=16, ttl=60)):
+        result = send_metrics_to_dify({"cpu_usage": 12.4, "memory_usage": 65 * MB})
+        mock_make_request.assert_not_called()
+        assert result["screened"] is True
+        assert result["analysis"].startswith("✅ *All metrics nominal*")
+
+        mock_make_request.return_value.status_code = 500
+        send_metrics_to_dify({"cpu_usage": 60.0, "memory_usage": 65 * MB})
+        mock_make_request.assert_called_once()
+
+    stats = screen.stats()
+    assert (stats["nominal"], stats["anomalous"]) == (1, 1)
+    assert stats["llm_calls_avoided"] == 1 and stats["llm_calls_avoided_rate"] == 0.5
+
+
+def test_values_outside_their_band_always_need_the_llm(baselines):
+    screen = AnomalyScreen(baselines, bands={"cpu_usage": (None, 80), "memory_usage": (None, 512 * MB), "up": (1, None)})
+    # A metric that has been high all along looks nominal against its own baseline
+    for i in range(60):
+        baselines.observe("cpu_usage", 95.0, 1620001000 + 15 * i)
+    pinned = screen.screen({"cpu_usage": 95.0, "memory_usage": 65 * MB})
+    assert pinned.outcome == "out_of_band" and pinned.breaches == ["cpu_usage above 80"]
+
+    timestamps = np.arange(0, 300 * 100, 300)
+    down = series_result([TimeSeries({"__name__": "up", "instance": "a"}, timestamps, np.zeros(100))])
+    assert screen.screen(down).breaches == ["up below 1"]
+    assert screen.stats()["out_of_band"] == 2
+
+
+def test_current_value_is_screened_before_it_joins_the_baseline(baselines):
+    screen = AnomalyScreen(baselines)
+    sampled_at = 1620000000 + 15 * 60
+    # The refresher may already have recorded the snapshot being screened
+    for i in range(40):
+        baselines.observe("cpu_usage", 45.0, sampled_at + 15 * i)
+
+    assert screen.screen({"cpu_usage": 45.0, "memory_usage": 65 * MB, "timestamp": sampled_at}).outcome == "anomalous"
+
+    fresh = MetricBaselines(window=240)
+    for i in range(30):
+        fresh.observe("cpu_usage", 12.0, i)
+    AnomalyScreen(fresh).screen({"cpu_usage": 12.0, "timestamp": 30})
+    assert len(fresh.values("cpu_usage")) == 31
+    assert len(fresh.values("cpu_usage", before=30)) == 30
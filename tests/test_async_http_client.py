@@ -0,0 +1,129 @@
+import asyncio
+import json
+import socket
+import time
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from webhookservice.services import dify_service
+from webhookservice.services.prometheus_service import AsyncPrometheusService
+from webhookservice.utils.async_http_client import async_request, run_sync
+from webhookservice.utils.cache import BoundedTTLCache
+from webhookservice.utils.llm_router import Backend, LLMRouter
+
+
+@pytest.fixture
+def router_for():
+    def build(*servers, **kwargs):
+        router = LLMRouter([Backend(f"backend-{i}", s.endpoint) for i, s in enumerate(servers)], **kwargs)
+        return patch.object(dify_service, "dify_router", router)
+    return build
+
+
+@pytest.fixture(autouse=True)
+def fresh_intent_caches():
+    with patch.object(dify_service, "INTENT_FAST_PATH_ENABLED", False), \
+            patch.dict(dify_service.intent_caches, {
+                "deploy": BoundedTTLCache(maxsize=16, ttl=60),
+                "monitor": BoundedTTLCache(maxsize=16, ttl=60),
+            }):
+        yield
+
+
+def closed_url():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}/"
+
+
+def test_connection_errors_raise_requests_exceptions():
+    with pytest.raises(requests.ConnectionError):
+        run_sync(async_request("test", "GET", closed_url(), timeout=2))
+
+
+def test_read_timeout_raises_requests_timeout(servers):
+    slow = servers(delay=0.5)
+
+    async def fetch():
+        response = await async_request("test", "GET", slow.base_url, timeout=0.1)
+        return await response.text()
+
+    with pytest.raises(requests.Timeout):
+        run_sync(fetch())
+
+
+def test_async_monitoring_intent_matches_sync(servers, router_for):
+    server = servers()
+    with router_for(server):
+        result = run_sync(dify_service.async_parse_monitoring_intent("what is the cpu usage now?"))
+
+    assert result["type"] == "monitoring"
+    assert result["metric"] == "cpu"
+    assert result["original_message"] == "what is the cpu usage now?"
+
+
+def test_async_monitoring_intent_reports_errors(servers, router_for):
+    server = servers(status=400, body=b"bad request")
+    with router_for(server):
+        result = run_sync(dify_service.async_parse_monitoring_intent("cpu?"))
+    assert result == {"error": "bad request"}
+
+
+def test_async_deployment_intent_fails_over(servers, router_for):
+    broken = servers(status=503, body=b"busy")
+    healthy = servers(body=b'data: {"event": "agent_thought", "thought": "{\\"branch\\": \\"dev\\", \\"environment\\": \\"test\\"}"}\n\n')
+    with router_for(broken, healthy):
+        result = run_sync(dify_service.async_parse_deployment_intent("deploy dev to test"))
+    assert result == {"branch": "dev", "environment": "test", "channel": "#chatops"}
+
+
+def test_async_analysis_streams_chunks(servers, router_for):
+    server = servers(body=(
+        b'data: {"event": "message", "answer": "CPU is low."}\n\n'
+        b'data: {"event": "message", "answer": "Memory is stable."}\n\n'
+    ))
+    chunks = []
+    with router_for(server), patch.object(dify_service, "analysis_cache", BoundedTTLCache(maxsize=16, ttl=60)):
+        result = run_sync(dify_service.async_send_metrics_to_dify({"cpu_usage": 1.5}, on_chunk=chunks.append))
+    assert result["analysis"] == "CPU is low.\nMemory is stable."
+    assert chunks == ["CPU is low.", "CPU is low.\nMemory is stable."]
+
+
+def test_hundreds_of_concurrent_requests_on_one_loop(servers, router_for):
+    server = servers(delay=0.2)
+
+    async def burst():
+        return await asyncio.gather(
+            *(dify_service.async_parse_monitoring_intent(f"cpu usage {i}") for i in range(200))
+        )
+
+    started = time.monotonic()
+    with router_for(server):
+        results = run_sync(burst())
+    elapsed = time.monotonic() - started
+
+    assert all(result["metric"] == "cpu" for result in results)
+    # 200 sequential calls would take 40s; concurrently they overlap
+    assert elapsed < 10
+
+
+def test_async_prometheus_process_metrics(servers):
+    body = json.dumps({
+        "status": "success",
+        "data": {"resultType": "vector", "result": [
+            {"metric": {"snapshot_metric": "cpu_usage"}, "value": [1620000000, "0.5"]},
+            {"metric": {"snapshot_metric": "memory_usage"}, "value": [1620000000, "2048"]},
+        ]},
+    }).encode("utf-8")
+    server = servers(body=body, content_type="application/json")
+    service = AsyncPrometheusService()
+    service.api_url = f"{server.base_url}/api/v1"
+
+    metrics = run_sync(service.get_process_metrics("all"))
+
+    assert metrics == {"cpu_usage": 0.5, "memory_usage": 2048.0}
+    assert [r["path"].split("?")[0] for r in server.requests] == ["/api/v1/query"]
@@ -0,0 +1,36 @@
+from webhookservice.utils.cache import BoundedTTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_is_counted():
+    cache = BoundedTTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" becomes least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_ttl_expiry():
+    timer = FakeTimer()
+    cache = BoundedTTLCache(maxsize=4, ttl=10, timer=timer)
+    cache.set("a", 1)
+    timer.now = 11
+    cache.set("b", 2)  # Purges expired entries
+
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 1
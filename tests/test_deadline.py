@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+import requests
+from unittest.mock import patch
+from conftest import FakeAsyncResponse
+from webhookservice.services import dify_service, prometheus_service
+from webhookservice.services.prometheus_service import PrometheusService
+from webhookservice.utils.async_http_client import run_sync
+from webhookservice.utils.cache import BoundedTTLCache
+from webhookservice.utils.deadline import Deadline, DeadlineExceeded, hop_timeout
+from webhookservice.utils.llm_router import Backend, LLMRouter
+from webhookservice.utils.sse import async_stream_dify_events
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def streaming_response(*lines):
+    return FakeAsyncResponse(lines)
+
+
+def test_deadline_caps_hop_timeouts():
+    clock = FakeClock()
+    deadline = Deadline(10, clock=clock)
+    assert hop_timeout(deadline, 30) == 10
+    clock.now = 8
+    assert hop_timeout(deadline, 30) == 2
+    assert hop_timeout(deadline, 1) == 1
+    assert hop_timeout(None, 30) == 30
+
+    clock.now = 10
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(30)
+    # Existing timeout handling applies to an exhausted budget
+    assert issubclass(DeadlineExceeded, requests.Timeout)
+
+
+def test_stream_stops_once_deadline_passes():
+    clock = FakeClock()
+    deadline = Deadline(5, clock=clock)
+    seen = []
+
+    def on_message(data):
+        seen.append(data["answer"])
+        clock.now += 3
+
+    response = streaming_response(
+        b'data: {"event": "message", "answer": "one"}', b"",
+        b'data: {"event": "message", "answer": "two"}', b"",
+        b'data: {"event": "message", "answer": "three"}', b"",
+    )
+    assert asyncio.run(async_stream_dify_events(response, {"message": on_message}, deadline)) is None
+    assert seen == ["one", "two"]
+    assert response.closed
+
+
+@patch("webhookservice.services.dify_service.async_request")
+def test_analysis_returns_partial_result_and_skips_cache(mock_post):
+    clock = FakeClock()
+    deadline = Deadline(5, clock=clock)
+    mock_post.return_value = streaming_response(
+        b'data: {"event": "message", "answer": "CPU is high."}', b"",
+        b'data: {"event": "message", "answer": "Memory is stable."}', b"",
+    )
+    cache = BoundedTTLCache(maxsize=16, ttl=60)
+
+    def on_chunk(analysis):
+        clock.now += 10
+
+    with patch.object(dify_service, "analysis_cache", cache), \
+            patch.object(dify_service, "dify_router", LLMRouter([Backend("dify", "http://dify")])):
+        result = run_sync(
+            dify_service.async_send_metrics_to_dify({"cpu_usage": 91.0}, on_chunk=on_chunk, deadline=deadline)
+        )
+
+    assert result["analysis"] == "CPU is high."
+    assert result["partial"] is True
+    assert len(cache) == 0
+    assert mock_post.call_args[1]["timeout"] == 5
+
+
+@patch("webhookservice.services.dify_service.async_request")
+def test_exhausted_deadline_does_not_count_against_backend(mock_post):
+    clock = FakeClock()
+    deadline = Deadline(1, clock=clock)
+    clock.now = 2
+    router = LLMRouter([Backend("dify", "http://dify")], failure_threshold=1)
+
+    with patch.object(dify_service, "dify_router", router):
+        with pytest.raises(DeadlineExceeded):
+            run_sync(dify_service.async_make_dify_request("key", "hello", deadline=deadline))
+
+    mock_post.assert_not_called()
+    assert router.stats()["backends"]["dify"]["state"] == "closed"
+    assert router.error_rate("dify") == 0.0
+
+
+@patch("webhookservice.services.prometheus_service.async_request")
+def test_process_metrics_use_remaining_budget(mock_get):
+    clock = FakeClock()
+    deadline = Deadline(5, clock=clock)
+    mock_get.return_value = FakeAsyncResponse(text='{"data": {"result": [{"value": [0, "42.0"]}]}}')
+
+    assert PrometheusService().get_process_metrics("cpu", deadline=deadline) == {"cpu_usage": 42.0}
+    assert mock_get.call_args[1]["timeout"] == 5
+
+    clock.now = 6
+    assert PrometheusService().get_process_metrics("all", deadline=deadline) == {}
+    assert mock_get.call_count == 1
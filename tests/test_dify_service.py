@@ -1,54 +1,88 @@
 import pytest
+import asyncio
 import json
 import requests
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
+from conftest import FakeAsyncResponse
+from webhookservice.utils.async_http_client import run_sync
+from webhookservice.utils.cache import BoundedTTLCache
+from webhookservice.utils.llm_router import Backend, LLMRouter
 from webhookservice.services.dify_service import (
     handle_dify_api_errors,
-    make_dify_request,
+    async_make_dify_request,
     parse_deployment_intent,
     parse_monitoring_intent,
-    send_metrics_to_dify
+    send_metrics_to_dify,
+    async_send_metrics_to_dify,
+    build_analysis_query,
+    intent_caches,
+    normalize_message,
 )
+from webhookservice.services import dify_service
+
+@pytest.fixture(autouse=True)
+def clear_intent_caches():
+    for bot, cache in intent_caches.items():
+        intent_caches[bot] = BoundedTTLCache(maxsize=16, ttl=60)
+    yield
+
+@pytest.fixture(autouse=True)
+def clear_analysis_cache():
+    with patch.object(dify_service, 'analysis_cache', BoundedTTLCache(maxsize=16, ttl=60)):
+        yield
+
+@pytest.fixture(autouse=True)
+def disable_fast_path():
+    # These tests exercise the Dify path; the local grammar is covered in test_intent_rules
+    with patch('webhookservice.services.dify_service.INTENT_FAST_PATH_ENABLED', False):
+        yield
+
+@pytest.fixture(autouse=True)
+def disable_anomaly_screen():
+    # These tests exercise the Dify path; the local pre-screen is covered in test_anomaly
+    with patch('webhookservice.services.dify_service.ANOMALY_SCREEN_ENABLED', False):
+        yield
 
 @pytest.fixture
 def mock_response():
-    response = MagicMock()
-    response.status_code = 200
-    response.iter_lines.return_value = [
+    return FakeAsyncResponse([
         b'data: {"event": "agent_thought", "thought": "{\\"branch\\": \\"main\\", \\"environment\\": \\"staging\\"}"}',
         b'data: {"event": "end", "answer": "Deployment initiated"}'
-    ]
-    return response
+    ])
 
 def test_handle_dify_api_errors_success():
     @handle_dify_api_errors
-    def test_func():
+    async def test_func():
         return {"success": True}
     
-    result = test_func()
+    result = asyncio.run(test_func())
     assert result == {"success": True}
 
 def test_handle_dify_api_errors_timeout():
     @handle_dify_api_errors
-    def test_func():
+    async def test_func():
         raise requests.Timeout()
     
-    result = test_func()
+    result = asyncio.run(test_func())
     assert result == {"error": "Request timed out"}
 
-@patch('requests.post')
-def test_make_dify_request(mock_post, mock_response):
-    mock_post.return_value = mock_response
-    
-    response = make_dify_request("test_api_key", "test message")
+def test_make_dify_request(servers):
+    server = servers()
+
+    async def request():
+        response = await async_make_dify_request("test_api_key", "test message")
+        response.close()
+        return response
+
+    with patch.object(dify_service, "dify_router", LLMRouter([Backend("dify", server.endpoint)])):
+        response = run_sync(request())
     
     assert response.status_code == 200
-    mock_post.assert_called_once()
-    call_args = mock_post.call_args[1]
-    assert call_args['headers']['Authorization'] == 'Bearer test_api_key'
-    assert 'test message' in call_args['data']
+    assert len(server.requests) == 1
+    assert server.requests[0]['authorization'] == 'Bearer test_api_key'
+    assert b'test message' in server.requests[0]['body']
 
-@patch('webhookservice.services.dify_service.make_dify_request')
+@patch('webhookservice.services.dify_service.async_make_dify_request')
 def test_parse_deployment_intent(mock_make_request, mock_response):
     mock_make_request.return_value = mock_response
     
@@ -60,15 +94,12 @@ def test_parse_deployment_intent(mock_make_request, mock_response):
     assert result["branch"] == "main"
     assert result["environment"] == "staging"
 
-@patch('webhookservice.services.dify_service.make_dify_request')
+@patch('webhookservice.services.dify_service.async_make_dify_request')
 def test_parse_monitoring_intent(mock_make_request):
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.iter_lines.return_value = [
+    mock_make_request.return_value = FakeAsyncResponse([
         b'data: {"event": "agent_thought", "thought": "{\\"type\\": \\"monitoring\\", \\"query_type\\": \\"current\\", \\"metric\\": \\"cpu_usage\\", \\"hours\\": 1}"}',
         b'data: {"event": "end", "answer": "Metrics analysis"}'
-    ]
-    mock_make_request.return_value = mock_response
+    ])
     
     result = parse_monitoring_intent("Show me CPU usage")
     
@@ -79,7 +110,7 @@ def test_parse_monitoring_intent(mock_make_request):
     assert result["hours"] == 1
     assert "original_message" in result
 
-@patch('webhookservice.services.dify_service.make_dify_request')
+@patch('webhookservice.services.dify_service.async_make_dify_request')
 def test_send_metrics_to_dify(mock_make_request, mock_response):
     mock_make_request.return_value = mock_response
     
@@ -91,4 +122,120 @@ def test_send_metrics_to_dify(mock_make_request, mock_response):
     result = send_metrics_to_dify(metrics)
     
     assert isinstance(result, dict)
-    mock_make_request.assert_called_once() 
\ No newline at end of file
+    mock_make_request.assert_called_once() 
+
+def test_normalize_message():
+    assert normalize_message("<@U123ABC>  Show   Current CPU ") == "show current cpu"
+
+@patch('webhookservice.services.dify_service.async_make_dify_request')
+def test_monitoring_intent_is_cached_per_normalized_message(mock_make_request):
+    mock_make_request.return_value = FakeAsyncResponse([
+        b'data: {"event": "agent_thought", "thought": "{\\"query_type\\": \\"current\\", \\"metric\\": \\"all\\"}"}',
+    ])
+
+    first = parse_monitoring_intent("show current cpu")
+    second = parse_monitoring_intent("<@U123> Show  current CPU")
+
+    assert mock_make_request.call_count == 1
+    assert second["query_type"] == first["query_type"] == "current"
+    assert second["original_message"] == "<@U123> Show  current CPU"
+    stats = intent_caches["monitor"].stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert len(intent_caches["deploy"]) == 0
+
+@patch('webhookservice.services.dify_service.async_make_dify_request')
+def test_time_dependent_intent_is_never_cached(mock_make_request, mock_response):
+    mock_make_request.return_value = mock_response
+
+    parse_deployment_intent("deploy main to staging at 5pm")
+    parse_deployment_intent("deploy main to staging at 5pm")
+
+    assert mock_make_request.call_count == 2
+    assert len(intent_caches["deploy"]) == 0
+
+@patch('webhookservice.services.dify_service.async_make_dify_request')
+def test_error_results_are_not_cached(mock_make_request):
+    mock_make_request.return_value = FakeAsyncResponse(status_code=500, text="upstream error")
+
+    assert parse_monitoring_intent("show memory") == {"error": "upstream error"}
+    assert parse_monitoring_intent("show memory") == {"error": "upstream error"}
+    assert mock_make_request.call_count == 2
+
+@patch('webhookservice.services.dify_service.async_make_dify_request')
+def test_fast_path_skips_dify_for_common_commands(mock_make_request):
+    mock_make_request.return_value = FakeAsyncResponse()
+    with patch('webhookservice.services.dify_service.INTENT_FAST_PATH_ENABLED', True):
+        result = parse_deployment_intent("deploy feature/new-login to staging")
+        parse_monitoring_intent("why did memory spike after the release")
+
+    assert result == {"branch": "feature/new-login", "environment": "staging", "channel": "#chatops"}
+    mock_make_request.assert_called_once()
+
+def test_build_analysis_query_downsamples_range_metrics():
+    values = [[1620000000 + i * 300, str(64 * 1024 * 1024 + i)] for i in range(2016)]
+    metrics = {
+        "data": {
+            "resultType": "matrix",
+            "result": [{"metric": {"__name__": "todo_process_resident_memory_bytes"}, "values": values}],
+        }
+    }
+
+    query = build_analysis_query(metrics)
+    encoded = json.loads(query[query.index("{"):])
+
+    assert encoded["unit"] == "MB"
+    assert encoded["start"] == 1620000000
+    assert encoded["step"] == 300
+    assert encoded["points"] == 2016
+    assert len(encoded["values"]) <= 120
+    assert len(query) < 3000
+
+@patch('webhookservice.services.dify_service.async_make_dify_request')
+def test_analysis_is_reused_for_near_identical_snapshots(mock_make_request):
+    mock_make_request.return_value = FakeAsyncResponse([b'data: {"event": "message", "answer": "All good"}'])
+
+    first = send_metrics_to_dify({"cpu_usage": 35.35, "memory_usage": 68313088.0, "server_time": "2024-12-24 16:30:12"})
+    second = send_metrics_to_dify({"cpu_usage": 35.41, "memory_usage": 68420000.0, "server_time": "2024-12-24 16:31:12"})
+    third = send_metrics_to_dify({"cpu_usage": 92.0, "memory_usage": 68313088.0, "server_time": "2024-12-24 16:32:12"})
+
+    assert first["analysis"] == second["analysis"] == "All good"
+    assert second["cached"] is True
+    assert "cached" not in third
+    assert mock_make_request.call_count == 2
+
+
+def test_callers_sharing_an_analysis_all_get_its_chunks():
+    metrics = {"cpu_usage": 35.35, "memory_usage": 68313088.0, "server_time": "2024-12-24 16:30:12"}
+    chunks = {"leader": [], "follower": []}
+    results = {}
+
+    async def scenario():
+        started, joined = asyncio.Event(), asyncio.Event()
+
+        async def analyze(metrics, fingerprint, on_chunk, deadline):
+            started.set()
+            await joined.wait()
+            on_chunk("All good")
+            return {"analysis": "All good", "raw_metrics": metrics}
+
+        async def report(name):
+            results[name] = await async_send_metrics_to_dify(dict(metrics), on_chunk=chunks[name].append)
+
+        coalesced = dify_service.analysis_flights.stats()["coalesced"]
+        with patch.object(dify_service, "_analyze_metrics", side_effect=analyze) as analyze_mock:
+            leader = asyncio.ensure_future(report("leader"))
+            await started.wait()
+            follower = asyncio.ensure_future(report("follower"))
+            while dify_service.analysis_flights.stats()["coalesced"] == coalesced:
+                await asyncio.sleep(0)
+            joined.set()
+            await asyncio.gather(leader, follower)
+        return analyze_mock
+
+    analyze_mock = asyncio.run(scenario())
+
+    assert analyze_mock.call_count == 1
+    assert chunks == {"leader": ["All good"], "follower": ["All good"]}
+    assert results["leader"]["analysis"] == results["follower"]["analysis"] == "All good"
+    assert dify_service.analysis_listeners == {}
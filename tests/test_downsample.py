@@ -0,0 +1,39 @@
+from webhookservice.utils.downsample import lttb, infer_step, encode_series
+
+
+def test_lttb_keeps_endpoints_and_spike():
+    timestamps = list(range(0, 3000, 15))
+    values = [1.0] * len(timestamps)
+    values[77] = 50.0
+
+    indices = lttb(timestamps, values, 20)
+
+    assert len(indices) == 20
+    assert indices[0] == 0
+    assert indices[-1] == len(values) - 1
+    assert 77 in indices
+
+
+def test_lttb_returns_everything_under_budget():
+    assert lttb([0, 1, 2], [1.0, 2.0, 3.0], 10) == [0, 1, 2]
+
+
+def test_infer_step_ignores_gaps():
+    assert infer_step([0, 60, 120, 600, 660]) == 60
+
+
+def test_encode_series_without_downsampling_omits_offsets():
+    encoded = encode_series([100, 115, 130], [1.234, 2.345, 3.456], max_points=10, precision=1)
+    assert encoded == {"start": 100, "step": 15, "points": 3, "values": [1.2, 2.3, 3.5]}
+
+
+def test_encode_series_with_downsampling_has_grid_offsets():
+    timestamps = [1000 + i * 300 for i in range(2016)]
+    values = [float(i % 100) for i in range(2016)]
+
+    encoded = encode_series(timestamps, values, max_points=100, precision=2)
+
+    assert encoded["points"] == 2016
+    assert len(encoded["values"]) == len(encoded["offsets"]) == 100
+    assert encoded["offsets"][0] == 0
+    assert encoded["offsets"][-1] == 2015
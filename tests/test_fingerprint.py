@@ -0,0 +1,37 @@
+from webhookservice.utils.fingerprint import quantize, metrics_fingerprint
+
+
+def range_metrics(values, start=1620000000):
+    return {
+        "data": {
+            "resultType": "matrix",
+            "result": [{
+                "metric": {"__name__": "todo_process_resident_memory_bytes"},
+                "values": [[start + i * 60, str(v)] for i, v in enumerate(values)],
+            }],
+        }
+    }
+
+
+def test_quantize_significant_digits():
+    assert quantize(35.35, 2) == 35.0
+    assert quantize(68313088.0, 2) == 68000000.0
+    assert quantize(0.01234, 2) == 0.012
+    assert quantize(0.0, 2) == 0.0
+
+
+def test_instant_fingerprint_ignores_server_time_and_noise():
+    a = metrics_fingerprint({"cpu_usage": 35.35, "server_time": "2024-12-24 16:30:12"})
+    b = metrics_fingerprint({"cpu_usage": 35.1, "server_time": "2024-12-24 16:45:00"})
+    c = metrics_fingerprint({"memory_usage": 35.1})
+    assert a == b
+    assert a != c
+
+
+def test_range_fingerprint_depends_on_shape_not_start_time():
+    flat = [100.0] * 60
+    spike = [100.0] * 30 + [400.0] * 5 + [100.0] * 25
+
+    assert metrics_fingerprint(range_metrics(flat)) == metrics_fingerprint(range_metrics(flat, start=1620003600))
+    assert metrics_fingerprint(range_metrics(flat)) != metrics_fingerprint(range_metrics(spike))
+    assert metrics_fingerprint(range_metrics(flat)) != metrics_fingerprint(range_metrics(flat * 2))
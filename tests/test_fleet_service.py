@@ -0,0 +1,145 @@
+from unittest.mock import MagicMock
+
+import pytest
+from webhookservice.services.fleet_service import (
+    FleetService,
+    ServiceHealth,
+    ServiceTarget,
+    assess,
+    group_queries,
+    parse_service_registry,
+)
+from webhookservice.services.prometheus_service import SNAPSHOT_LABEL
+from webhookservice.utils.metrics_formatter import format_sweep_message
+
+MB = 1024 * 1024
+
+
+def vector(samples):
+    """A snapshot query result from (metric key, job, value) triples"""
+    return {
+        "status": "success",
+        "data": {
+            "resultType": "vector",
+            "result": [
+                {"metric": {SNAPSHOT_LABEL: key, "job": job}, "value": [1620000000, str(value)]}
+                for key, job, value in samples
+            ],
+        },
+    }
+
+
+def fleet(count, prefix="process"):
+    return [ServiceTarget(f"svc-{i}", f"job-{i}", prefix) for i in range(count)]
+
+
+def healthy_samples(services, cpu=20.0, memory=200 * MB):
+    samples = []
+    for i, service in enumerate(services):
+        samples += [("up", service.job, 1), ("cpu_usage", service.job, cpu), ("memory_usage", service.job, memory + i * MB)]
+    return samples
+
+
+def test_registry_defaults_to_the_todo_service():
+    todo, = parse_service_registry("")
+    assert (todo.name, todo.job, todo.metric_prefix) == ("todo", "local_service", "todo_process")
+    assert "todo_process_cpu_seconds_total{job=\"local_service\"}" in todo.metric_queries()["cpu_usage"]
+
+    custom, = parse_service_registry('[{"name": "db", "queries": {"up": "pg_up"}}]')
+    assert custom.job == "db" and custom.metric_queries() == {"up": "pg_up"}
+
+
+def test_registry_rejects_services_sharing_a_job():
+    with pytest.raises(ValueError, match="both use job 'api'"):
+        parse_service_registry('[{"name": "api"}, {"name": "api-canary", "job": "api"}]')
+
+    with pytest.raises(ValueError):
+        FleetService([ServiceTarget("a", "api"), ServiceTarget("b", "api")], MagicMock())
+
+    # Different prefixes, or custom queries, read different series
+    parse_service_registry(
+        '[{"name": "api"}, {"name": "api-node", "job": "api", "metric_prefix": "node"},'
+        ' {"name": "api-db", "job": "api", "queries": {"up": "pg_up"}}]'
+    )
+
+
+def test_group_queries_select_every_job_and_group_by_job():
+    queries = group_queries("process", ["api", "web.v2"])
+    assert queries["cpu_usage"] == 'sum by (job) (rate(process_cpu_seconds_total{job=~"api|web\\\\.v2"}[1m]) * 100)'
+    assert queries["up"] == 'min by (job) (up{job=~"api|web\\\\.v2"})'
+
+
+def test_hundreds_of_services_take_one_query_per_prefix():
+    services = fleet(300) + fleet(200, "node_process")
+    prometheus = MagicMock()
+    prometheus.query.side_effect = lambda query, deadline=None: vector(
+        healthy_samples(services[:300] if "node_process" not in query else services[300:])
+    )
+
+    sweep = FleetService(services, prometheus).sweep()
+
+    assert prometheus.query.call_count == sweep.queries == 2
+    assert len(sweep.services) == 500 and not sweep.flagged and not sweep.errors
+
+
+def test_worst_offenders_rank_first():
+    services = fleet(20)
+    samples = healthy_samples(services)
+    samples = [s for s in samples if s[1] != "job-3"]  # Silent
+    samples = [(k, j, 0 if (k, j) == ("up", "job-7") else v) for k, j, v in samples]
+    samples = [(k, j, 95.0 if (k, j) == ("cpu_usage", "job-11") else v) for k, j, v in samples]
+    samples = [(k, j, 900 * MB if (k, j) == ("memory_usage", "job-15") else v) for k, j, v in samples]
+    prometheus = MagicMock()
+    prometheus.query.return_value = vector(samples)
+
+    sweep = FleetService(services, prometheus).sweep()
+
+    assert [(s.name, s.issues) for s in sweep.flagged] == [
+        ("svc-7", ["down"]),
+        ("svc-3", ["no data"]),
+        ("svc-15", ["memory outlier"]),
+        ("svc-11", ["high CPU"]),
+    ]
+    assert len(sweep.services) == 20
+
+
+def test_custom_services_are_queried_alone_and_failures_are_reported():
+    services = fleet(3) + [ServiceTarget("db", "db", queries={"up": "pg_up", "cpu_usage": "db_cpu"})]
+
+    def query(promql, deadline=None):
+        if "pg_up" in promql:
+            return vector([("up", "db", 1), ("cpu_usage", "db", 5.0)])
+        raise RuntimeError("Prometheus unavailable")
+
+    prometheus = MagicMock()
+    prometheus.query.side_effect = query
+
+    sweep = FleetService(services, prometheus).sweep()
+
+    assert sweep.queries == 2
+    assert sweep.errors == ["svc-0, svc-1, svc-2: Prometheus unavailable"]
+    by_name = {s.name: s for s in sweep.services}
+    assert by_name["db"].healthy and by_name["db"].cpu_usage == 5.0
+    assert all(by_name[f"svc-{i}"].issues == ["no data"] for i in range(3))
+
+
+def test_memory_needs_a_fleet_to_compare_against():
+    lone = assess([ServiceHealth("a", "a", up=1, cpu_usage=10.0, memory_usage=4096 * MB)])
+    assert lone[0].healthy and lone[0].memory_z is None
+
+
+def test_sweep_message_is_compact():
+    services = fleet(40)
+    samples = [(k, j, 0 if k == "up" and j in ("job-1", "job-2") else v) for k, j, v in healthy_samples(services)]
+    prometheus = MagicMock()
+    prometheus.query.return_value = vector(samples)
+    sweep = FleetService(services, prometheus).sweep()
+
+    blocks = format_sweep_message(sweep, top=1)
+    text = "\n".join(block["text"]["text"] for block in blocks if block["type"] == "section")
+
+    assert "40 services, 2 down or silent, 0 flagged" in text
+    assert text.count("🔴") == 1 and "… and 1 more flagged" in text
+    assert "✅ 38 others healthy" in text
+    assert format_sweep_message(FleetService(fleet(2), MagicMock(query=MagicMock(
+        return_value=vector(healthy_samples(fleet(2)))))).sweep())[1]["text"]["text"] == "✅ All services healthy"
@@ -0,0 +1,133 @@
+import pytest
+from collections import Counter
+from webhookservice.utils.intent_rules import (
+    match_monitoring_intent,
+    match_deployment_intent,
+    CPU_METRIC,
+    MEMORY_METRIC,
+    HEALTH_METRIC,
+    START_TIME_METRIC,
+)
+
+MIN_CONFIDENCE = 0.9
+FALLBACK = "fallback"
+
+# Labelled examples from prompts/Monitor.md plus common variations.
+# Labels are "help", "sweep", "<query_type>:<metric>:<hours>" or "fallback" (leave it to Dify).
+MONITORING_CASES = [
+    ("show current CPU usage", f"current:{CPU_METRIC}:1"),
+    ("display memory usage trend for the last 24 hours", f"range:{MEMORY_METRIC}:24"),
+    ("show current usage", "current:all:1"),
+    ("show trend for the last week", "range:all:168"),
+    ("hi, who are you?", "help"),
+    ("Show current CPU usage", f"current:{CPU_METRIC}:1"),
+    ("Display memory usage trend for the last 24 hours", f"range:{MEMORY_METRIC}:24"),
+    ("Check application health status", f"current:{HEALTH_METRIC}:1"),
+    ("what is the memory usage right now", f"current:{MEMORY_METRIC}:1"),
+    ("cpu trend over the past 6 hours", f"range:{CPU_METRIC}:6"),
+    ("show cpu and memory for the last day", "range:all:24"),
+    ("memory last 2 days", f"range:{MEMORY_METRIC}:48"),
+    ("show me the application uptime", f"current:{START_TIME_METRIC}:1"),
+    ("help", "help"),
+    ("sweep all services for the worst offenders", "sweep"),
+    ("check the fleet", "sweep"),
+    ("show the health of every service", "sweep"),
+    ("which services in the fleet are leaking file handles", FALLBACK),
+    ("show cpu last 0 hours", FALLBACK),
+    ("show memory for the last 100000 weeks", FALLBACK),
+    ("memory over the last 0 minutes", FALLBACK),
+    ("show disk usage", FALLBACK),
+    ("why is cpu so high compared to yesterday", FALLBACK),
+    ("rate(http_requests_total[5m]) by status code", FALLBACK),
+    ("restart the todo service", FALLBACK),
+    ("hello, can you explain what the memory spike at noon means", FALLBACK),
+]
+
+# Labelled examples from prompts/deploy.md. Labels are "<branch>@<environment>", "help" or "fallback".
+DEPLOYMENT_CASES = [
+    ("deploy test version", "test@staging"),
+    ("部署测试版本", "test@staging"),
+    ("what can you do?", "help"),
+    ("你能做什么?", "help"),
+    ("deploy to production", "main@production"),
+    ("update staging environment", "main@staging"),
+    ("deploy feature/new-login to staging", "feature/new-login@staging"),
+    ("发布到生产环境", "main@production"),
+    ("更新测试环境", "main@staging"),
+    ("部署 feature/new-login 到测试环境", "feature/new-login@staging"),
+    ("Deploy main to prod", "main@production"),
+    ("release branch hotfix-42 to dev", "hotfix-42@dev"),
+    ("deploy production", "main@production"),
+    ("deploy staging", "main@staging"),
+    ("deploy prod", "main@production"),
+    ("deploy it", FALLBACK),
+    ("ship it", FALLBACK),
+    ("deploy now", FALLBACK),
+    ("release the latest", FALLBACK),
+    ("deploy login to staging", FALLBACK),
+    ("deploy staging to production", FALLBACK),
+    ("deploy invalid@branch", FALLBACK),
+    ("部署到无效环境", FALLBACK),
+    ("deploy main to the moon", FALLBACK),
+    ("can you roll back yesterday's release", FALLBACK),
+    ("deploy whatever was merged last and then notify the team", FALLBACK),
+]
+
+
+def monitoring_label(message):
+    intent, confidence = match_monitoring_intent(message)
+    if intent is None or confidence < MIN_CONFIDENCE:
+        return FALLBACK
+    if intent["type"] == "help":
+        return "help"
+    if intent["query_type"] == "sweep":
+        return "sweep"
+    return f"{intent['query_type']}:{intent['metric']}:{intent['hours']}"
+
+
+def deployment_label(message):
+    intent, confidence = match_deployment_intent(message)
+    if intent is None or confidence < MIN_CONFIDENCE:
+        return FALLBACK
+    if "message" in intent:
+        return "help"
+    return f"{intent['branch']}@{intent['environment']}"
+
+
+def confusion_matrix(cases, labeller):
+    return Counter((expected, labeller(message)) for message, expected in cases)
+
+
+@pytest.mark.parametrize("cases,labeller", [
+    (MONITORING_CASES, monitoring_label),
+    (DEPLOYMENT_CASES, deployment_label),
+])
+def test_confusion_matrix_is_diagonal(cases, labeller):
+    matrix = confusion_matrix(cases, labeller)
+    # A wrong confident answer is worse than a Dify round trip, so no off-diagonal entries
+    misses = {pair: count for pair, count in matrix.items() if pair[0] != pair[1]}
+    assert not misses, f"expected -> predicted: {misses}"
+
+
+def test_monitoring_intent_matches_dify_schema():
+    intent, confidence = match_monitoring_intent("display memory usage trend for the last 24 hours")
+    assert confidence == 1.0
+    assert intent == {
+        "type": "monitoring",
+        "query_type": "range",
+        "metric": MEMORY_METRIC,
+        "hours": 24,
+        "original_message": "display memory usage trend for the last 24 hours",
+    }
+
+
+def test_minute_ranges_keep_unit():
+    intent, _ = match_monitoring_intent("memory over the last 30 minutes")
+    assert intent["hours"] == 30
+    assert intent["unit"] == "minutes"
+
+
+def test_deployment_intent_matches_dify_schema():
+    intent, confidence = match_deployment_intent("deploy feature/new-login to staging")
+    assert confidence == 1.0
+    assert intent == {"branch": "feature/new-login", "environment": "staging", "channel": "#chatops"}
@@ -0,0 +1,194 @@
+import socket
+import time
+import threading
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from webhookservice.services import dify_service
+from webhookservice.utils.cache import BoundedTTLCache
+from webhookservice.utils.deadline import DeadlineExceeded
+from webhookservice.utils.llm_router import Backend, BackendUnavailable, CircuitBreaker, LLMRouter, parse_backends
+
+
+def closed_endpoint():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}/v1/chat-messages"
+
+
+def post(backend):
+    return requests.post(backend.endpoint, data=b"{}", timeout=5)
+
+
+def test_parse_backends_defaults_to_single_endpoint():
+    assert parse_backends("", "http://dify/v1") == [Backend("dify", "http://dify/v1")]
+
+    backends = parse_backends(
+        '[{"name": "ollama", "endpoint": "http://a", "deploy_api_key": "k1"}, {"endpoint": "http://b"}]',
+        None,
+    )
+    assert [b.name for b in backends] == ["ollama", "backend-1"]
+    assert backends[0].api_key("deploy", "default") == "k1"
+    assert backends[0].api_key("monitor", "default") == "default"
+
+
+def test_circuit_breaker_opens_and_probes_once():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now[0] = 20.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_probe_cut_short_by_the_deadline_is_released():
+    now = [0.0]
+    router = LLMRouter([Backend("dify", "http://dify/v1")], failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    router.breakers["dify"].record_failure()
+    now[0] = 10.0
+
+    def out_of_time(backend):
+        raise DeadlineExceeded("deadline exceeded")
+
+    with pytest.raises(DeadlineExceeded):
+        router.request(out_of_time)
+
+    # The backend is neither stuck half-open nor blamed for the caller's deadline
+    breaker = router.breakers["dify"]
+    assert breaker.state == CircuitBreaker.HALF_OPEN and breaker.failures == 1
+    assert [b.name for b in router.ranked()] == ["dify"]
+    assert breaker.allow()
+
+
+def test_fails_over_on_server_error(servers):
+    broken = servers(status=500, body=b"upstream error")
+    healthy = servers()
+    router = LLMRouter([Backend("broken", broken.endpoint), Backend("healthy", healthy.endpoint)], failure_threshold=2)
+
+    for _ in range(3):
+        response = router.request(post)
+        assert response.status_code == 200
+
+    # A backend that has only failed is ranked last after its first failure
+    assert len(broken.requests) == 1
+    assert len(healthy.requests) == 3
+    assert [b.name for b in router.ranked()] == ["healthy", "broken"]
+    stats = router.stats()["backends"]
+    assert stats["broken"]["error_rate"] == 1.0
+    assert stats["healthy"]["state"] == CircuitBreaker.CLOSED
+
+
+def test_open_circuit_stops_calls(servers):
+    broken = servers(status=500, body=b"upstream error")
+    router = LLMRouter([Backend("broken", broken.endpoint)], failure_threshold=2, reset_timeout=60)
+
+    assert router.request(post).status_code == 500
+    assert router.request(post).status_code == 500
+    assert router.stats()["backends"]["broken"]["state"] == CircuitBreaker.OPEN
+    with pytest.raises(BackendUnavailable):
+        router.request(post)
+    assert len(broken.requests) == 2
+
+
+def test_fails_over_on_connection_error(servers):
+    healthy = servers()
+    router = LLMRouter([Backend("down", closed_endpoint()), Backend("healthy", healthy.endpoint)])
+
+    assert router.request(post).status_code == 200
+    assert [b.name for b in router.ranked()] == ["healthy", "down"]
+
+
+def test_returns_last_error_response_when_all_backends_fail(servers):
+    first = servers(status=503, body=b"busy")
+    second = servers(status=502, body=b"bad gateway")
+    router = LLMRouter([Backend("first", first.endpoint), Backend("second", second.endpoint)])
+
+    response = router.request(post)
+    assert response.status_code == 502
+    assert response.text == "bad gateway"
+
+
+def test_prefers_the_fastest_backend(servers):
+    slow = servers(delay=0.15)
+    fast = servers()
+    router = LLMRouter([Backend("slow", slow.endpoint), Backend("fast", fast.endpoint)])
+
+    # Untried backends are measured first, then the faster one wins
+    router.request(post)
+    router.request(post)
+    assert [b.name for b in router.ranked()] == ["fast", "slow"]
+    router.request(post)
+    assert len(fast.requests) == 2
+    assert len(slow.requests) == 1
+
+
+def test_hedged_request_takes_the_first_answer(servers):
+    slow = servers(delay=0.5)
+    fast = servers()
+    router = LLMRouter([Backend("slow", slow.endpoint), Backend("fast", fast.endpoint)], hedge_delay=0.05)
+
+    started = time.monotonic()
+    response = router.request(post, hedge=True)
+    assert response.status_code == 200
+    assert time.monotonic() - started < 0.4
+    assert router.hedges_sent == 1
+    assert router.hedges_won == 1
+
+
+def test_hedged_request_not_sent_when_primary_is_fast(servers):
+    first = servers()
+    second = servers()
+    router = LLMRouter([Backend("first", first.endpoint), Backend("second", second.endpoint)], hedge_delay=1.0)
+
+    assert router.request(post, hedge=True).status_code == 200
+    assert router.hedges_sent == 0
+    assert len(second.requests) == 0
+
+
+def test_time_queued_for_a_worker_does_not_set_off_a_hedge(servers):
+    first = servers()
+    second = servers()
+    router = LLMRouter(
+        [Backend("first", first.endpoint), Backend("second", second.endpoint)], hedge_delay=0.05, hedge_workers=1
+    )
+    release = threading.Event()
+    router._get_executor().submit(release.wait, 5)
+    threading.Timer(0.2, release.set).start()
+
+    assert router.request(post, hedge=True).status_code == 200
+    assert router.hedges_sent == 0
+    assert len(second.requests) == 0
+
+
+def test_monitoring_intent_fails_over_to_stand_in_backend(servers):
+    broken = servers(status=500, body=b"upstream error")
+    healthy = servers()
+    router = LLMRouter(
+        [Backend("broken", broken.endpoint), Backend("healthy", healthy.endpoint, {"monitor": "healthy-key"})]
+    )
+
+    with patch.object(dify_service, "dify_router", router), \
+            patch.object(dify_service, "INTENT_FAST_PATH_ENABLED", False), \
+            patch.dict(dify_service.intent_caches, {"monitor": BoundedTTLCache(maxsize=16, ttl=60)}):
+        result = dify_service.parse_monitoring_intent("what is the cpu usage now?")
+
+    assert result["type"] == "monitoring"
+    assert result["metric"] == "cpu"
+    assert healthy.requests[0]["authorization"] == "Bearer healthy-key"
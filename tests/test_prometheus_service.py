@@ -1,10 +1,36 @@
+import json
 import pytest
+from datetime import datetime, timezone
 from unittest.mock import patch, MagicMock
-from webhookservice.services.prometheus_service import PrometheusService
+from webhookservice.services import prometheus_service
+from webhookservice.services.prometheus_service import (
+    PrometheusService,
+    parse_snapshot_metrics,
+    process_metric_queries,
+    range_query,
+)
+from webhookservice.utils.promql_guard import QueryRejected
+
+@pytest.fixture(autouse=True)
+def empty_range_caches():
+    for cache in prometheus_service.range_caches.values():
+        cache.clear()
+    prometheus_service.series_store.clear()
+    yield
+
+
+def prometheus_response(payload, chunk_size=64):
+    """A streamed response whose body is `payload` as JSON, in small chunks"""
+    body = json.dumps(payload).encode("utf-8")
+    response = MagicMock()
+    response.status_code = 200
+    response.iter_content.return_value = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    return response
+
 
 @pytest.fixture
 def mock_prometheus_client():
-    with patch('requests.get') as mock_get:
+    with patch('requests.Session.get') as mock_get:
         yield mock_get
 
 @pytest.fixture
@@ -35,7 +61,7 @@ def test_query(mock_prometheus_client):
             ]
         }
     }
-    mock_prometheus_client.return_value.json.return_value = mock_response
+    mock_prometheus_client.return_value = prometheus_response(mock_response)
     
     result = service.query("cpu_usage")
     
@@ -58,7 +84,7 @@ def test_query_range(mock_prometheus_client):
             ]
         }
     }
-    mock_prometheus_client.return_value.json.return_value = mock_response
+    mock_prometheus_client.return_value = prometheus_response(mock_response)
     
     result = service.query_range(
         query="cpu_usage",
@@ -86,7 +112,7 @@ def test_get_process_metrics(mock_prometheus_client):
             ]
         }
     }
-    mock_prometheus_client.return_value.json.return_value = mock_response
+    mock_prometheus_client.return_value = prometheus_response(mock_response)
     
     result = service.get_process_metrics("cpu")
     
@@ -108,7 +134,7 @@ def test_get_metrics_range(mock_prometheus_client):
             ]
         }
     }
-    mock_prometheus_client.return_value.json.return_value = mock_response
+    mock_prometheus_client.return_value = prometheus_response(mock_response)
     
     result = service.get_metrics_range("cpu_usage", hours=1.0)
     
@@ -124,4 +150,271 @@ def test_query_error_handling(mock_prometheus_client):
     with pytest.raises(Exception) as exc_info:
         service.query("cpu_usage")
     
-    assert "Prometheus API Error" in str(exc_info.value) 
\ No newline at end of file
+    assert "Prometheus API Error" in str(exc_info.value) 
+
+
+def test_all_metrics_snapshot_is_one_request(mock_prometheus_client):
+    """Every snapshot metric comes back from a single combined query"""
+    service = PrometheusService()
+    mock_prometheus_client.return_value = prometheus_response({
+        "status": "success",
+        "data": {
+            "resultType": "vector",
+            "result": [
+                {"metric": {"snapshot_metric": "cpu_usage", "instance": "a:8000"}, "value": [1620000000, "12.5"]},
+                {"metric": {"snapshot_metric": "cpu_usage", "instance": "b:8000"}, "value": [1620000000, "30"]},
+                {"metric": {"__name__": "todo_process_resident_memory_bytes", "snapshot_metric": "memory_usage"},
+                 "value": [1620000000, "1048576"]},
+            ]
+        }
+    })
+
+    snapshot = service.get_snapshot()
+
+    mock_prometheus_client.assert_called_once()
+    query = mock_prometheus_client.call_args[1]["params"]["query"]
+    assert " or " in query
+    assert 'label_replace(rate(todo_process_cpu_seconds_total[1m]) * 100, "snapshot_metric", "cpu_usage", "", "")' in query
+    assert [s.labels["instance"] for s in snapshot.samples["cpu_usage"]] == ["a:8000", "b:8000"]
+    assert snapshot.first("memory_usage") == 1048576.0
+    assert snapshot.as_metrics() == {"cpu_usage": 12.5, "memory_usage": 1048576.0}
+
+
+def test_metric_names_select_configured_queries():
+    """Short names, result fields and raw metric names all resolve"""
+    assert list(process_metric_queries("cpu")) == ["cpu_usage"]
+    assert list(process_metric_queries("todo_process_resident_memory_bytes")) == ["memory_usage"]
+    assert list(process_metric_queries("memory_usage")) == ["memory_usage"]
+    assert list(process_metric_queries("unknown")) == ["cpu_usage", "memory_usage"]
+    assert parse_snapshot_metrics('{"disk_usage": "node_filesystem_avail_bytes"}') == {
+        "disk_usage": "node_filesystem_avail_bytes"
+    }
+
+
+def test_range_params_align_to_step():
+    """Requests within one step interval ask for the same range"""
+    first = range_query("todo_process_resident_memory_bytes", 24, now=1620000010.0, max_points=289).params()
+    second = range_query("todo_process_resident_memory_bytes", 24, now=1620000290.5, max_points=289).params()
+    later = range_query("todo_process_resident_memory_bytes", 24, now=1620000300.0, max_points=289).params()
+
+    assert first == second
+    assert first["step"] == "5m"
+    assert first["end"] == "2021-05-03T00:00:00Z"
+    assert first["start"] == "2021-05-02T00:00:00Z"
+    assert later["end"] == "2021-05-03T00:05:00Z"
+    assert range_query("todo_process_cpu_seconds_total", 1, now=1620000010.0).params()["end"] == "2021-05-03T00:00:00Z"
+
+
+def test_step_follows_point_budget_and_scrape_interval():
+    """The step gives at most max_points points, in whole scrape intervals"""
+    assert prometheus_service.range_step(1, 1000) == 15
+    assert prometheus_service.range_step(1, 121) == 30
+    assert prometheus_service.range_step(168, 300) == 2025
+    assert prometheus_service.range_step(168, 50000) == 60
+    assert prometheus_service.point_budget(None, "summary") == prometheus_service.RANGE_SUMMARY_MAX_POINTS
+    assert prometheus_service.point_budget(500, "summary") == 500
+
+    summary = range_query("todo_process_cpu_seconds_total", 168, now=1620000010.0, max_points=300)
+    assert summary.step == 2025
+    assert round((summary.end - summary.start) / summary.step) + 1 <= 300
+    assert summary.params()["step"] == "2025s"
+    # The rate window covers the whole step, so coarse points skip no samples
+    assert summary.query == "rate(todo_process_cpu_seconds_total[34m]) * 100"
+    assert range_query("todo_process_cpu_seconds_total", 1, max_points=1000).query == "rate(todo_process_cpu_seconds_total[1m]) * 100"
+
+
+def test_purpose_sets_resolution(mock_prometheus_client):
+    mock_prometheus_client.return_value = prometheus_response({"status": "success", "data": {"resultType": "matrix", "result": []}})
+
+    PrometheusService().get_metrics_range("todo_process_resident_memory_bytes", hours=168, purpose="summary")
+    PrometheusService().get_metrics_range("todo_process_resident_memory_bytes", hours=168, purpose="export")
+
+    steps = [call[1]["params"]["step"] for call in mock_prometheus_client.call_args_list]
+    # The week at one-minute resolution is over RANGE_CHUNK_POINTS, so it comes in chunks
+    assert steps == ["2025s"] + ["1m"] * 4
+
+
+def test_repeated_range_requests_share_one_query(mock_prometheus_client):
+    """Range results are cached per aligned range, across service instances"""
+    mock_prometheus_client.return_value = prometheus_response({
+        "status": "success",
+        "data": {"resultType": "matrix", "result": [{"metric": {}, "values": [[1620000000, "0.5"]]}]},
+    })
+
+    with patch.object(prometheus_service.time, "time", return_value=1620000010.0):
+        first = PrometheusService().get_metrics_range("todo_process_resident_memory_bytes", hours=24, max_points=289)
+        second = PrometheusService().get_metrics_range("todo_process_resident_memory_bytes", hours=24, max_points=289)
+    with patch.object(prometheus_service.time, "time", return_value=1620000300.0):
+        PrometheusService().get_metrics_range("todo_process_resident_memory_bytes", hours=24, max_points=289)
+
+    assert first is second
+    assert mock_prometheus_client.call_count == 2
+    assert prometheus_service.get_range_cache_stats()["5m"]["hits"] == 1
+
+
+def test_repeated_trends_fetch_only_the_new_tail(mock_prometheus_client):
+    """A week-long trend asked for again five minutes later re-reads the newest sample and one new step"""
+    def matrix(start, end):
+        points = [[t, str(t % 7)] for t in range(int(start), int(end) + 1, 300)]
+        return {"status": "success", "data": {"resultType": "matrix", "result": [{"metric": {"job": "todo"}, "values": points}]}}
+
+    def respond(url, params=None, timeout=None, stream=False):
+        return prometheus_response(matrix(
+            datetime.strptime(params["start"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp(),
+            datetime.strptime(params["end"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp(),
+        ), chunk_size=4096)
+
+    mock_prometheus_client.side_effect = respond
+    service = PrometheusService()
+    tail_fetches = prometheus_service.get_series_store_stats()["tail_fetches"]
+
+    with patch.object(prometheus_service.time, "time", return_value=1620000010.0):
+        first = service.get_metrics_range("todo_process_resident_memory_bytes", hours=168, max_points=2017)
+    with patch.object(prometheus_service.time, "time", return_value=1620000310.0):
+        second = service.get_metrics_range("todo_process_resident_memory_bytes", hours=168, max_points=2017)
+
+    full, tail = [call[1]["params"] for call in mock_prometheus_client.call_args_list]
+    assert full["start"] == "2021-04-26T00:00:00Z"
+    assert (tail["start"], tail["end"]) == ("2021-05-03T00:00:00Z", "2021-05-03T00:05:00Z")
+
+    first_series, second_series = (r["data"]["result"][0] for r in (first, second))
+    assert len(first_series) == len(second_series) == 168 * 12 + 1
+    # The window slid by one step: the oldest sample fell out, the new one was appended
+    assert second_series.timestamps[:-1].tolist() == first_series.timestamps[1:].tolist()
+    assert second_series.values[:-1].tolist() == first_series.values[1:].tolist()
+    assert prometheus_service.get_series_store_stats()["tail_fetches"] == tail_fetches + 1
+
+
+def test_current_metrics_are_served_from_the_warm_snapshot(mock_prometheus_client):
+    """Repeated requests share one snapshot and say how fresh it is"""
+    mock_prometheus_client.return_value = prometheus_response({
+        "status": "success",
+        "data": {"resultType": "vector", "result": [
+            {"metric": {"snapshot_metric": "cpu_usage"}, "value": [1620000000, "12.5"]},
+            {"metric": {"snapshot_metric": "memory_usage"}, "value": [1620000000, "1048576"]},
+        ]},
+    })
+    refresher = prometheus_service.BackgroundRefresher(interval=15, max_stale=60)
+    refresher.register(prometheus_service.SNAPSHOT_REFRESH_KEY, lambda deadline=None: PrometheusService().get_snapshot())
+
+    with patch.object(prometheus_service, "metrics_refresher", refresher):
+        everything = PrometheusService().get_current_metrics()
+        cpu = PrometheusService().get_current_metrics("cpu")
+
+    mock_prometheus_client.assert_called_once()
+    assert everything["cpu_usage"] == 12.5 and everything["memory_usage"] == 1048576.0
+    assert set(cpu) == {"cpu_usage", "fetched_at", "timestamp"}
+    assert datetime.strptime(cpu["fetched_at"], "%Y-%m-%d %H:%M:%S")
+
+
+def chunked_matrix_responder(series_count=2):
+    """A query_range stub answering any window with deterministic samples"""
+    def parse(value):
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp()
+
+    def respond(url, params=None, timeout=None, stream=False):
+        step = int(params["step"][:-1]) * (60 if params["step"].endswith("m") else 1)
+        timestamps = range(int(parse(params["start"])), int(parse(params["end"])) + 1, step)
+        return prometheus_response({"status": "success", "data": {"resultType": "matrix", "result": [
+            {"metric": {"instance": f"app-{i}"}, "values": [[t, str((t // step) % 97 + i)] for t in timestamps]}
+            for i in range(series_count)
+        ]}}, chunk_size=65536)
+
+    return respond
+
+
+def test_long_ranges_are_fetched_in_contiguous_chunks(mock_prometheus_client):
+    mock_prometheus_client.side_effect = chunked_matrix_responder()
+
+    with patch.object(prometheus_service.time, "time", return_value=1620000010.0):
+        result = PrometheusService().get_metrics_range("todo_process_resident_memory_bytes", hours=168, purpose="export")
+
+    windows = sorted(
+        (call[1]["params"]["start"], call[1]["params"]["end"]) for call in mock_prometheus_client.call_args_list
+    )
+    assert len(windows) == 4
+    for (_, end), (start, _) in zip(windows, windows[1:]):
+        gap = datetime.strptime(start, "%Y-%m-%dT%H:%M:%SZ") - datetime.strptime(end, "%Y-%m-%dT%H:%M:%SZ")
+        assert gap.total_seconds() == 60
+
+    series = result["data"]["result"]
+    assert [s.metric["instance"] for s in series] == ["app-0", "app-1"]
+    assert len(series[0]) == 168 * 60 + 1
+    assert (series[0].timestamps[1:] - series[0].timestamps[:-1] == 60).all()
+
+
+def test_summarize_range_streams_full_resolution_chunks(mock_prometheus_client):
+    mock_prometheus_client.side_effect = chunked_matrix_responder()
+
+    with patch.object(prometheus_service.time, "time", return_value=1620000010.0):
+        summaries = PrometheusService().summarize_range("todo_process_resident_memory_bytes", hours=24)
+
+    # 24h at the 15s scrape interval is 5761 points: three chunks
+    assert mock_prometheus_client.call_count == 3
+    assert [s.metric["instance"] for s in summaries] == ["app-0", "app-1"]
+    assert summaries[0].points == 24 * 240 + 1
+    assert (summaries[0].min, summaries[0].max) == (0.0, 96.0)
+    assert summaries[1].max == 97.0
+    assert summaries[0].p50 == pytest.approx(48, rel=0.02)
+
+
+def test_summarize_range_never_steps_finer_than_the_scrape_interval(mock_prometheus_client):
+    mock_prometheus_client.side_effect = chunked_matrix_responder()
+
+    with patch.object(prometheus_service.time, "time", return_value=1620000010.0):
+        PrometheusService().summarize_range("todo_process_resident_memory_bytes", hours=1, step=1)
+
+    params = mock_prometheus_client.call_args[1]["params"]
+    assert params["step"] == prometheus_service.duration(prometheus_service.PROMETHEUS_SCRAPE_INTERVAL)
+
+
+@pytest.mark.parametrize(
+"hours", [0, -1, prometheus_service.RANGE_STATS_MAX_HOURS + 1])
+def test_summarize_range_rejects_ranges_out_of_bounds(mock_prometheus_client, hours):
+    with pytest.raises(ValueError, match="hours must be"):
+        PrometheusService().summarize_range("up", hours=hours, step=3600)
+
+    mock_prometheus_client.assert_not_called()
+
+
+def test_summarize_range_rejects_too_many_points_or_chunks(mock_prometheus_client):
+    with patch.object(prometheus_service, "RANGE_STATS_MAX_POINTS", 1000):
+        with pytest.raises(ValueError, match="points per series"):
+            PrometheusService().summarize_range("up", hours=24)
+
+    with patch.object(prometheus_service, "RANGE_STATS_MAX_CHUNKS", 2):
+        with pytest.raises(ValueError, match="chunk queries"):
+            PrometheusService().summarize_range("up", hours=24)
+
+    mock_prometheus_client.assert_not_called()
+
+
+def test_guarded_query_runs_the_rewritten_query_with_tight_limits(mock_prometheus_client):
+    vector = {
+        "status": "success",
+        "data": {
+            "resultType": "vector",
+            "result": [{"metric": {"instance": f"app-{i}"}, "value": [1620000000, str(i)]} for i in range(80)],
+        },
+    }
+    mock_prometheus_client.return_value = prometheus_response(vector)
+
+    result = PrometheusService().guarded_query("up")
+
+    params = mock_prometheus_client.call_args[1]["params"]
+    assert params["query"] == f"topk({prometheus_service.PROMQL_MAX_SERIES}, up)"
+    assert params["timeout"] == prometheus_service.PROMQL_EVAL_TIMEOUT
+    assert result["guard"]["rewrites"] == [f"limited to the top {prometheus_service.PROMQL_MAX_SERIES} series"]
+    # A Prometheus that ignored the topk still cannot flood the service
+    assert len(result["data"]["result"]) == prometheus_service.PROMQL_MAX_SERIES
+    assert result["data"]["truncated"]
+
+
+def test_rejected_queries_never_reach_prometheus(mock_prometheus_client):
+    before = dict(prometheus_service.query_guard_stats)
+
+    with pytest.raises(QueryRejected, match="longer than"):
+        PrometheusService().guarded_query('rate(todo_process_cpu_seconds_total{job="local_service"}[90d])')
+
+    mock_prometheus_client.assert_not_called()
+    assert prometheus_service.query_guard_stats["rejected"] == before["rejected"] + 1
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from webhookservice.utils.prometheus_stream import PrometheusStreamDecoder
+from webhookservice.utils.series import TimeSeries
+
+MATRIX = {
+    "status": "success",
+    "data": {
+        "resultType": "matrix",
+        "result": [
+            {"metric": {"__name__": "up", "instance": "a:8000"}, "values": [[1620000000, "1"], [1620000015, "0"]]},
+            {"metric": {"__name__": "up", "instance": "b:8000"}, "values": [[1620000000, "1"], [1620000015, "1"]]},
+            {"metric": {"__name__": "up", "instance": "ü:8000"}, "values": [[1620000000, "0.5"]]},
+        ],
+    },
+}
+
+
+def decode(payload, chunk_size, **limits):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if not isinstance(payload, bytes) else payload
+    decoder = PrometheusStreamDecoder(**limits)
+    chunks = 0
+    for i in range(0, len(body), chunk_size):
+        chunks += 1
+        if not decoder.feed(body[i:i + chunk_size]):
+            break
+    return decoder.finish(), chunks
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 100000])
+def test_matrix_decodes_into_series_at_any_chunking(chunk_size):
+    result, _ = decode(MATRIX, chunk_size)
+
+    assert result["status"] == "success"
+    assert result["data"]["resultType"] == "matrix"
+    series = result["data"]["result"]
+    assert all(isinstance(s, TimeSeries) for s in series)
+    assert [s.metric["instance"] for s in series] == ["a:8000", "b:8000", "ü:8000"]
+    assert series[0].values.tolist() == [1.0, 0.0]
+    assert "truncated" not in result["data"]
+
+
+def test_vector_items_stay_small_dicts():
+    payload = {"status": "success", "data": {"resultType": "vector", "result": [
+        {"metric": {"job": "todo"}, "value": [1620000000, "12.5"]},
+    ]}}
+    result, _ = decode(payload, 5)
+    assert result == payload
+
+
+def test_series_limit_stops_reading_early():
+    result, chunks = decode(MATRIX, 16, max_series=1)
+
+    assert [s.metric["instance"] for s in result["data"]["result"]] == ["a:8000"]
+    assert result["data"]["truncated"] is True
+    assert chunks < len(json.dumps(MATRIX, ensure_ascii=False).encode("utf-8")) // 16
+
+
+def test_series_limit_equal_to_the_result_is_not_truncation():
+    result, _ = decode(MATRIX, 16, max_series=3)
+    assert len(result["data"]["result"]) == 3
+    assert "truncated" not in result["data"]
+
+
+def test_point_limit_keeps_the_newest_points():
+    result, _ = decode(MATRIX, 16, max_points=1)
+
+    assert [s.timestamps.tolist() for s in result["data"]["result"]] == [[1620000015], [1620000015], [1620000000]]
+    assert result["data"]["truncated"] is True
+
+
+@pytest.mark.parametrize("payload", [
+    {"status": "error", "errorType": "bad_data", "error": "parse error at char 1"},
+    {"status": "success", "data": {"resultType": "scalar", "result": [1620000000, "2"]}},
+    {"status": "success", "data": {"resultType": "matrix", "result": []}},
+])
+def test_bodies_without_series_decode_whole(payload):
+    result, _ = decode(payload, 3)
+    assert result == payload
+
+
+def test_truncated_body_is_an_error():
+    body = json.dumps(MATRIX).encode("utf-8")[:-40]
+    with pytest.raises(json.JSONDecodeError):
+        decode(body, 8)
@@ -0,0 +1,109 @@
+import pytest
+from webhookservice.utils.promql_guard import QueryRejected, analyze, guard_query, parse_duration
+
+LIMITS = dict(resolution=15, max_cost=500000, max_range=7 * 86400, max_lookback=30 * 86400, max_series=50)
+
+
+def test_durations():
+    assert parse_duration("5m") == 300
+    assert parse_duration("1h30m") == 5400
+    assert parse_duration("90") == 90
+    with pytest.raises(QueryRejected):
+        parse_duration("5 minutes")
+
+
+def test_selectors_ranges_and_offsets():
+    cost = analyze(
+        'sum by (job) (rate(http_requests_total{job="api", code=~".*"}[5m] offset 1h)) / on(job) group_left up',
+        15,
+    )
+
+    first, second = cost.selectors
+    assert (first.text, first.scoped, first.range, first.offset) == (
+        'http_requests_total{job="api", code=~".*"}', True, 300, 3600
+    )
+    # Label lists after by and on are not selectors; match-all regexes do not scope
+    assert (second.text, second.scoped) == ("up", False)
+    assert analyze('up{job=~".+"}', 15).unscoped == ['up{job=~".+"}']
+    assert cost.max_lookback == 3900 and cost.score == 20 + 20
+
+
+def test_subqueries_multiply_the_inner_cost():
+    cost = analyze('max_over_time(rate(x{job="a"}[5m])[1d:1m] offset 1h)', 15)
+
+    selector, = cost.selectors
+    assert selector.evaluations == 1440
+    assert cost.subquery_range == 86400
+    assert selector.lookback == 300 + 86400 + 3600
+    assert cost.score == 1440 * 20
+
+
+@pytest.mark.parametrize("query,aggregated", [
+    ("sum(rate(x[5m]))", True),
+    ("sum by (job) (rate(x[5m]))", True),
+    ("sum(rate(x[5m])) by (job)", True),
+    ("topk(5, x)", True),
+    ("sum(x) / count(x)", False),
+    ("histogram_quantile(0.9, sum by (le) (rate(h_bucket[5m])))", False),
+])
+def test_whole_query_aggregation(query, aggregated):
+    assert analyze(query, 15).aggregated is aggregated
+
+
+@pytest.mark.parametrize("query,message", [
+    ('{__name__=~".+"}', "does not name a metric"),
+    ('rate(x{job="a"}[30d])', "longer than the 168h allowed"),
+    ('x{job="a"} offset 60d', "looks back 60d"),
+    ("max_over_time(rate(x[5m])[7d:1m])", "add label matchers to x"),
+    ('sum(rate(x{job="a"}[5m])', "Unbalanced"),
+    ('rate(x{job="a"}[5m])[1h]', "use a subquery"),
+    ("sum(x) @ 100", "must follow a selector"),
+    ("x @ start", "@ without a timestamp"),
+    ("", "Empty query"),
+])
+def test_expensive_or_broken_queries_are_rejected(query, message):
+    with pytest.raises(QueryRejected, match=message):
+        guard_query(query, **LIMITS)
+
+
+NOW = 1620000000
+
+
+@pytest.mark.parametrize("query", [
+    "todo_process_resident_memory_bytes @ 100",
+    "rate(todo_process_cpu_seconds_total[5m] @ 0)",
+    f'x{{job="a"}} offset 1h @ {NOW - 31 * 86400}',
+    f"max_over_time(x[5m])[1h:] @ {NOW - 31 * 86400}",
+])
+def test_at_modifiers_count_as_lookback(query):
+    with pytest.raises(QueryRejected, match="looks back"):
+        guard_query(query, now=NOW, **LIMITS)
+
+
+def test_recent_and_relative_at_modifiers_pass():
+    cost = analyze(f'rate(x{{job="a"}}[5m] @ {NOW - 3600} offset 5m)', 15, now=NOW)
+    assert cost.selectors[0].lookback == 300 + 300 + 3600
+
+    for query in ("up @ end()", f"up @ {NOW + 60}", "rate(up[5m] @ start())"):
+        guarded = guard_query(query, now=NOW, **LIMITS)
+        assert guarded.cost.max_lookback <= 300 and guarded.query == f"topk(50, {query})"
+    assert guard_query("up[5m] @ end()", now=NOW, **LIMITS).cost.range_vector
+
+
+def test_unbounded_results_are_wrapped_in_topk():
+    assert guard_query("up", **LIMITS).query == "topk(50, up)"
+    assert guard_query("time() - process_start_time_seconds", **LIMITS).query == (
+        "topk(50, time() - process_start_time_seconds)"
+    )
+    assert guard_query("sum(up) / up", **LIMITS).query == "topk(50, sum(up) / up)"
+    # Scoped, aggregated, scalar and range-vector queries are left as they are
+    for query in (
+        'up{job="local_service"}',
+        "sum by (job) (up)",
+        "histogram_quantile(0.9, sum by (le) (rate(h_bucket[5m])))",
+        "scalar(up)",
+        "up[5m]",
+        "1 + 1",
+    ):
+        guarded = guard_query(query, **LIMITS)
+        assert guarded.query == query and not guarded.rewrites
@@ -0,0 +1,95 @@
+import threading
+import time
+import pytest
+from webhookservice.utils.refresher import BackgroundRefresher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingLoader:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.loaded = threading.Event()
+
+    def __call__(self, deadline=None):
+        self.calls += 1
+        self.loaded.set()
+        if self.fail:
+            raise RuntimeError("prometheus down")
+        return self.calls
+
+
+def test_fresh_values_are_served_from_cache():
+    clock = FakeClock()
+    loader = CountingLoader()
+    refresher = BackgroundRefresher(interval=15, max_stale=60, clock=clock)
+    refresher.register("snapshot", loader)
+
+    assert refresher.get("snapshot")[0] == 1
+    clock.now = 10
+    assert refresher.get("snapshot")[0] == 1
+    assert loader.calls == 1
+    assert refresher.stats()["fresh_hits"] == 1
+
+
+def test_stale_values_are_served_while_revalidating():
+    clock = FakeClock()
+    loader = CountingLoader()
+    refresher = BackgroundRefresher(interval=15, max_stale=60, clock=clock)
+    refresher.register("snapshot", loader)
+    refresher.get("snapshot")
+    loader.loaded.clear()
+
+    clock.now = 30
+    value, fetched_at = refresher.get("snapshot")
+    assert value == 1
+    assert fetched_at <= time.time()
+    assert loader.loaded.wait(2)
+    for _ in range(100):
+        if refresher.stats()["ages"]["snapshot"] == 0:
+            break
+        time.sleep(0.01)
+    assert refresher.get("snapshot")[0] == 2
+
+    # Too old to serve: loaded on the caller's thread
+    clock.now = 200
+    assert refresher.get("snapshot")[0] == 3
+    assert refresher.stats()["misses"] == 2
+
+
+def test_failed_refresh_keeps_the_old_value():
+    loader = CountingLoader()
+    refresher = BackgroundRefresher(interval=15, max_stale=60)
+    refresher.register("snapshot", loader)
+    refresher.get("snapshot")
+
+    loader.fail = True
+    assert refresher.refresh("snapshot") is None
+    assert refresher.get("snapshot")[0] == 1
+    assert refresher.stats()["failures"] == 1
+
+    empty = BackgroundRefresher(interval=15, max_stale=60)
+    empty.register("snapshot", loader)
+    with pytest.raises(RuntimeError):
+        empty.get("snapshot")
+
+
+def test_background_thread_keeps_values_warm():
+    loader = CountingLoader()
+    refresher = BackgroundRefresher(interval=0.05, max_stale=1)
+    refresher.register("snapshot", loader)
+    refresher.start()
+    try:
+        time.sleep(0.3)
+    finally:
+        refresher.stop()
+
+    assert loader.calls >= 3
+    assert refresher.get("snapshot")[0] >= 3
@@ -0,0 +1,166 @@
+from unittest.mock import patch
+
+import pytest
+from webhookservice.routes import slack_monitor_routes
+from webhookservice.routes.slack_monitor_routes import send_health_report
+from webhookservice.utils.metrics_formatter import format_metrics_message
+from webhookservice.utils.report_state import (
+    REFRESH_ACTION_ID,
+    attach_report_state,
+    blocks_hash,
+    describe_changes,
+    digest_changes,
+    is_significant,
+    read_report_state,
+    report_digest,
+    shown_analysis,
+)
+from webhookservice.utils.series import TimeSeries, series_result
+
+REPORT = {"type": "current", "metric": None}
+
+
+def current(cpu, memory=1048576.0):
+    return {"cpu_usage": cpu, "memory_usage": memory, "server_time": "2021-05-03 00:00:00"}
+
+
+def refresh_button(blocks):
+    for block in blocks:
+        if block["type"] == "actions":
+            return block["elements"][0]
+
+
+def test_digest_covers_what_each_report_shows():
+    assert report_digest(current(12.345678)) == {"cpu_usage": 12.35, "memory_usage": 1049000.0}
+
+    series = TimeSeries.from_values({"__name__": "up", "instance": "a"}, [[0, "1"], [60, "3"]])
+    assert report_digest(series_result([series])) == {"instance=a last": 3.0, "instance=a max": 3.0, "instance=a mean": 2.0}
+
+    vector = {"data": {"resultType": "vector", "result": [{"metric": {"job": "todo"}, "value": [0, "7"]}]}}
+    assert report_digest(vector) == {"job=todo": 7.0}
+
+
+def test_changes_are_relative_and_thresholded():
+    changes = digest_changes({"cpu_usage": 10.0, "gone": 1.0}, {"cpu_usage": 10.4, "new": 2.0})
+
+    assert changes["cpu_usage"] == pytest.approx(0.04)
+    assert changes["gone"] is None and changes["new"] is None
+    assert not is_significant({"cpu_usage": 0.04}, 0.05)
+    assert is_significant({"cpu_usage": -0.06}, 0.05)
+    assert is_significant(changes, 0.05)
+    assert describe_changes({"cpu_usage": 10.0}, {"cpu_usage": 10.0}, {"cpu_usage": 0.0}) == "🔁 No change since last analysis"
+    assert "`cpu_usage` `10` → `10.4` (+4.0%)" in describe_changes(
+        {"cpu_usage": 10.0}, {"cpu_usage": 10.4}, {"cpu_usage": 0.04}
+    )
+
+
+def test_state_round_trips_through_the_button():
+    blocks = format_metrics_message(current(12.5), {"analysis": "All good"})
+    state = {"report": {"type": "range", "metric": "up", "hours": 24}, "digest": {"cpu_usage": 12.5}}
+    attach_report_state(blocks, state)
+
+    button = refresh_button(blocks)
+    assert button["action_id"] == REFRESH_ACTION_ID
+    assert read_report_state(button) == state
+    assert shown_analysis(blocks) == "All good"
+    # Reports posted before the button carried state refresh current metrics
+    assert read_report_state({"action_id": REFRESH_ACTION_ID}) == {"report": {"type": "current"}}
+
+
+def test_hash_ignores_timestamps_and_the_button():
+    first = format_metrics_message(current(12.5), {"analysis": "All good"})
+    later = format_metrics_message(dict(current(12.5), server_time="2021-05-03 00:05:00"), {"analysis": "All good"})
+    attach_report_state(later, {"report": REPORT})
+
+    assert blocks_hash(first) == blocks_hash(later)
+    assert blocks_hash(first) != blocks_hash(format_metrics_message(current(13.0), {"analysis": "All good"}))
+
+
+@pytest.fixture
+def slack():
+    with patch.object(slack_monitor_routes, "update_message") as update, \
+            patch.object(slack_monitor_routes, "send_slack_message") as send, \
+            patch.object(slack_monitor_routes, "send_metrics_to_dify") as dify, \
+            patch.object(slack_monitor_routes, "SLACK_STREAMING_ENABLED", False):
+        dify.return_value = {"analysis": "Fresh analysis"}
+        send.return_value = {"ts": "1.0"}
+        yield update, send, dify
+
+
+def posted_state(slack, metrics):
+    """Post a report and return the state a Refresh click would send back"""
+    update, send, _ = slack
+    send_health_report("C1", metrics, 0.0, report=REPORT)
+    blocks = send.call_args[1]["blocks"]
+    state = read_report_state(refresh_button(blocks))
+    state["analysis"] = shown_analysis(blocks)
+    return state
+
+
+def test_unchanged_refresh_skips_dify_and_slack(slack):
+    update, _, dify = slack
+    state = posted_state(slack, current(12.5))
+    before = dict(slack_monitor_routes.refresh_stats)
+
+    send_health_report("C1", current(12.5), 0.0, message_ts="1.0", report=REPORT, previous=state)
+
+    # The first posting differs from a refresh only in its title
+    assert dify.call_count == 1
+    assert slack_monitor_routes.refresh_stats["reused_analysis"] == before["reused_analysis"] + 1
+    refreshed = update.call_args[0][2]
+
+    state = read_report_state(refresh_button(refreshed))
+    state["analysis"] = shown_analysis(refreshed)
+    update.reset_mock()
+    send_health_report("C1", current(12.5), 0.0, message_ts="1.0", report=REPORT, previous=state)
+
+    update.assert_not_called()
+    assert dify.call_count == 1
+    assert slack_monitor_routes.refresh_stats["unchanged"] == before["unchanged"] + 1
+
+
+def test_small_change_keeps_the_analysis_and_says_what_moved(slack):
+    update, _, dify = slack
+    state = posted_state(slack, current(12.5))
+
+    send_health_report("C1", current(12.8), 0.0, message_ts="1.0", report=REPORT, previous=state)
+
+    assert dify.call_count == 1
+    blocks = update.call_args[0][2]
+    assert shown_analysis(blocks) == "Fresh analysis"
+    assert any("`cpu_usage` `12.5` → `12.8`" in str(block) for block in blocks if block["type"] == "context")
+
+
+def refreshed_state(update):
+    blocks = update.call_args[0][2]
+    state = read_report_state(refresh_button(blocks))
+    state["analysis"] = shown_analysis(blocks)
+    return state
+
+
+def test_creeping_change_is_analyzed_once_it_adds_up(slack):
+    update, _, dify = slack
+    state = posted_state(slack, current(10.0))
+
+    # Each refresh moves CPU by 2% of the previous view, under the 5% threshold
+    for cpu in (10.2, 10.4):
+        send_health_report("C1", current(cpu), 0.0, message_ts="1.0", report=REPORT, previous=state)
+        state = refreshed_state(update)
+        assert state["digest"]["cpu_usage"] == 10.0
+    assert dify.call_count == 1
+
+    # 6% above the values the analysis was written for
+    send_health_report("C1", current(10.6), 0.0, message_ts="1.0", report=REPORT, previous=state)
+    assert dify.call_count == 2
+    assert refreshed_state(update)["digest"]["cpu_usage"] == 10.6
+
+
+def test_large_change_is_analyzed_again(slack):
+    update, _, dify = slack
+    dify.return_value = {"analysis": "CPU is climbing"}
+    state = posted_state(slack, current(12.5))
+
+    send_health_report("C1", current(40.0), 0.0, message_ts="1.0", report=REPORT, previous=state)
+
+    assert dify.call_count == 2
+    assert shown_analysis(update.call_args[0][2]) == "CPU is climbing"
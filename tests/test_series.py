@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from webhookservice.services.dify_service import build_analysis_query
+from webhookservice.utils.fingerprint import metrics_fingerprint
+from webhookservice.utils.metrics_formatter import format_timestamp, process_time_series_data
+from webhookservice.utils.series import TimeSeries, as_series, render_series_result, series_result
+
+RAW_SERIES = {
+    "metric": {"__name__": "todo_process_resident_memory_bytes"},
+    "values": [[1620000000, "1048576"], [1620000300, "3145728"], [1620000600, "2097152"]],
+}
+
+
+def test_values_are_parsed_once_into_read_only_columns():
+    series = as_series(RAW_SERIES)
+
+    assert series.timestamps.dtype == np.int64
+    assert series.values.dtype == np.float64
+    assert series.timestamps.tolist() == [1620000000, 1620000300, 1620000600]
+    assert series.values.tolist() == [1048576.0, 3145728.0, 2097152.0]
+    assert series.name == "todo_process_resident_memory_bytes"
+    assert as_series(series) is series
+    with pytest.raises(ValueError):
+        series.values[0] = 0
+
+
+def test_timestamps_are_formatted_only_when_rendered():
+    series = as_series(RAW_SERIES)
+    result = series_result([series])
+
+    rendered = render_series_result(result)
+
+    assert rendered["data"]["result"][0]["values"][0] == [format_timestamp(1620000000), "1048576.0"]
+    # The shared result itself is left untouched
+    assert result["data"]["result"][0] is series
+    assert render_series_result({"cpu_usage": 1.0}) == {"cpu_usage": 1.0}
+
+
+def test_consumers_agree_on_parsed_and_raw_series():
+    raw = {"status": "success", "data": {"resultType": "matrix", "result": [RAW_SERIES]}}
+    parsed = series_result([as_series(RAW_SERIES)])
+
+    summary, metric_name = process_time_series_data(parsed["data"]["result"])
+    assert metric_name == "todo_process_resident_memory_bytes"
+    assert "Maximum: `3.00 MB`" in summary
+    assert (summary, metric_name) == process_time_series_data(raw["data"]["result"])
+    assert build_analysis_query(parsed) == build_analysis_query(raw)
+    assert metrics_fingerprint(parsed) == metrics_fingerprint(raw)
+
+
+def test_empty_series():
+    series = TimeSeries.from_values({}, [])
+    assert len(series) == 0
+    assert process_time_series_data([series]) == (None, None)
+    assert series.to_dict() == {"metric": {}, "values": []}
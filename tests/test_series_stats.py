@@ -0,0 +1,74 @@
+import json
+import numpy as np
+import pytest
+from webhookservice.services.dify_service import build_analysis_query
+from webhookservice.utils.metrics_formatter import process_time_series_data
+from webhookservice.utils.series import TimeSeries, series_result
+from webhookservice.utils.series_stats import rank_by_peak, summarize
+
+
+def make_series(values, start=1620000000, step=60, **labels):
+    timestamps = np.arange(start, start + step * len(values), step, dtype=np.int64)
+    return TimeSeries({"__name__": "todo_process_cpu_seconds_total", **labels}, timestamps, np.asarray(values, dtype=np.float64))
+
+
+def test_matches_per_series_reference_on_ragged_input():
+    rng = np.random.default_rng(7)
+    series = []
+    for i in range(300):
+        values = rng.normal(50, 10, rng.integers(5, 200))
+        values[rng.integers(0, len(values))] = np.nan
+        series.append(make_series(values, instance=f"app-{i}"))
+    series.insert(3, make_series([]))
+    series.insert(5, make_series([np.nan, np.nan]))
+
+    summaries = summarize(series)
+
+    assert len(summaries) == 300
+    assert 3 not in {summary.index for summary in summaries}
+    for summary in summaries:
+        s = series[summary.index]
+        valid = ~np.isnan(s.values)
+        values, timestamps = s.values[valid], s.timestamps[valid]
+        assert summary.points == len(values)
+        assert summary.min == values.min() and summary.max == values.max()
+        assert summary.min_at == timestamps[values.argmin()]
+        assert summary.max_at == timestamps[values.argmax()]
+        assert summary.mean == pytest.approx(values.mean())
+        assert summary.p95 == pytest.approx(np.percentile(values, 95))
+        assert summary.p99 == pytest.approx(np.percentile(values, 99))
+        assert summary.last == values[-1]
+        assert (summary.start, summary.end) == (timestamps[0], timestamps[-1])
+        assert summary.slope == pytest.approx(np.polyfit((timestamps - timestamps[0]) / 3600, values, 1)[0])
+
+
+def test_slope_is_per_hour():
+    # One point per minute, rising by 1 per minute
+    (summary,) = summarize([make_series(np.arange(120.0))])
+    assert summary.slope == pytest.approx(60.0)
+    assert summary.p50 == pytest.approx(59.5)
+
+
+def test_slack_summary_covers_the_highest_series():
+    series = [make_series([1, 2, 3], instance="low"), make_series([5, 90, 7], instance="high")]
+
+    summary_text, metric_name = process_time_series_data(series_result(series)["data"]["result"])
+
+    assert metric_name == "todo_process_cpu_seconds_total"
+    assert summary_text.startswith("*Time Series Summary:* 2 series, top 2 by peak")
+    assert summary_text.index('instance="high"') < summary_text.index('instance="low"')
+    assert "p50 / p95 / p99" in summary_text
+    assert [s.metric["instance"] for s in rank_by_peak(summarize(series))] == ["high", "low"]
+
+
+def test_prompt_describes_every_top_series():
+    series = [make_series(np.full(50, float(i)), instance=f"app-{i}") for i in range(200)]
+
+    query = build_analysis_query(series_result(series))
+    encoded = json.loads(query[query.index("{"):])
+
+    assert encoded["labels"]["instance"] == "app-199"
+    assert encoded["stats"]["max"] == 199.0
+    assert encoded["series_count"] == 200
+    assert [s["labels"]["instance"] for s in encoded["other_series"]] == ["app-198", "app-197", "app-196", "app-195"]
+    assert len(query) < 4000
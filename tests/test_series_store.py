@@ -0,0 +1,66 @@
+from webhookservice.utils.series_store import SeriesStore
+
+
+def matrix(start, end, step=60, metric=None):
+    values = [[t, str(t)] for t in range(start, end + 1, step)]
+    return {"data": {"result": [{"metric": metric or {}, "values": values}]}}
+
+
+def timestamps(result):
+    return [t for series in result["data"]["result"] for t in series.timestamps.tolist()]
+
+
+def test_tail_is_appended_and_old_samples_evicted():
+    store = SeriesStore()
+    assert store.missing_start("up", 60, 0, 600) == 0
+    store.merge("up", 60, matrix(0, 600), 0, 600)
+
+    assert store.missing_start("up", 60, 0, 600) is None
+    # The newest cached sample is fetched again
+    assert store.missing_start("up", 60, 120, 720) == 600
+    store.merge("up", 60, matrix(600, 720), 600, 720)
+
+    assert timestamps(store.slice("up", 60, 120, 720)) == list(range(120, 721, 60))
+    # Nothing older than the 600s window is kept
+    assert store.stats()["samples"] == 11
+
+
+def test_tail_fetch_overwrites_a_boundary_sample_read_before_ingestion():
+    store = SeriesStore(overlap=120)
+    early = matrix(0, 600)
+    early["data"]["result"][0]["values"][-1] = [600, "0"]  # Last scrape not ingested yet
+    store.missing_start("up", 60, 0, 600)
+    store.merge("up", 60, early, 0, 600)
+
+    # An overlap of two steps re-fetches the last two samples
+    assert store.missing_start("up", 60, 60, 660) == 540
+    store.merge("up", 60, matrix(540, 660), 540, 660)
+
+    series, = store.slice("up", 60, 60, 660)["data"]["result"]
+    assert series.timestamps.tolist() == list(range(60, 661, 60))
+    assert series.values.tolist() == [float(t) for t in range(60, 661, 60)]
+
+
+def test_larger_window_or_gap_refetches_everything():
+    store = SeriesStore()
+    store.missing_start("up", 60, 300, 600)
+    store.merge("up", 60, matrix(300, 600), 300, 600)
+
+    assert store.missing_start("up", 60, 0, 600) == 0
+    store.merge("up", 60, matrix(0, 600), 0, 600)
+    assert timestamps(store.slice("up", 60, 0, 600)) == list(range(0, 601, 60))
+
+    assert store.missing_start("up", 60, 3000, 3600) == 3000
+    store.merge("up", 60, matrix(3000, 3600), 3000, 3600)
+    assert timestamps(store.slice("up", 60, 0, 3600)) == list(range(3000, 3601, 60))
+
+
+def test_series_are_kept_apart_by_labels():
+    store = SeriesStore()
+    store.missing_start("up", 60, 0, 120)
+    store.merge("up", 60, matrix(0, 120, metric={"instance": "a"}), 0, 120)
+    store.merge("up", 60, matrix(0, 120, metric={"instance": "b"}), 0, 120)
+
+    result = store.slice("up", 60, 0, 120)["data"]["result"]
+    assert [series.metric["instance"] for series in result] == ["a", "b"]
+    assert all(len(series) == 3 for series in result)
@@ -0,0 +1,112 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from webhookservice.services.prometheus_service import PrometheusService, request_key
+from webhookservice.utils.deadline import Deadline, DeadlineExceeded
+from webhookservice.utils.single_flight import SingleFlight
+
+
+def run_concurrently(count, target):
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flights = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def slow_call():
+        calls.append(1)
+        release.wait(5)
+        return {"answer": 42}
+
+    threads, results = run_concurrently(5, lambda: flights.do("key", slow_call))
+    while flights.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flights.stats() == {
+        "executions": 1, "coalesced": 4, "failures": 0, "in_flight": 0, "coalesced_rate": 0.8,
+    }
+
+
+def test_failures_reach_every_waiter_and_are_not_kept():
+    flights = SingleFlight("test")
+    release = threading.Event()
+
+    def failing_call():
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    threads, results = run_concurrently(3, lambda: flights.do("key", failing_call))
+    while flights.stats()["coalesced"] < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flights.stats()["failures"] == 1
+    # Nothing is cached: the next call runs again
+    assert flights.do("key", lambda: "recovered") == "recovered"
+
+
+def test_waiters_give_up_at_their_deadline():
+    flights = SingleFlight("test")
+    release = threading.Event()
+    leader = threading.Thread(target=flights.do, args=("key", lambda: release.wait(5)))
+    leader.start()
+    while flights.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+
+    with pytest.raises(DeadlineExceeded):
+        flights.do("key", lambda: None, deadline=Deadline(0.05))
+    release.set()
+    leader.join()
+
+
+def test_prometheus_requests_are_keyed_by_normalized_query():
+    assert request_key("query", {"query": "sum( rate(x[1m]) )\n"}) == request_key("query", {"query": "sum( rate(x[1m]) )"})
+    assert request_key("query", {"query": 'x{job="a  b"}'}) != request_key("query", {"query": 'x{job="a b"}'})
+
+
+@patch("requests.Session.get")
+def test_concurrent_prometheus_queries_share_one_request(mock_get):
+    release = threading.Event()
+
+    def respond(url, params=None, timeout=None, stream=False):
+        release.wait(5)
+        response = mock_get.return_value
+        response.iter_content.return_value = [b'{"status": "success", "data": {"resultType": "vector", "result": []}}']
+        return response
+
+    mock_get.side_effect = respond
+    service = PrometheusService()
+    before = service.flights.stats()["coalesced"]
+
+    threads, results = run_concurrently(4, lambda: service.query("up  == 0"))
+    while service.flights.stats()["coalesced"] < before + 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert mock_get.call_count == 1
+    assert all(result["status"] == "success" for result in results)
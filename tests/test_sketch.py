@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from webhookservice.utils.series import TimeSeries
+from webhookservice.utils.series_stats import summarize
+from webhookservice.utils.sketch import QuantileSketch, RunningSummary
+
+
+@pytest.fixture
+def values():
+    rng = np.random.default_rng(42)
+    return np.concatenate([rng.lognormal(17, 0.3, 5000), rng.normal(-5, 2, 500), np.zeros(50)])
+
+
+def test_quantiles_are_within_relative_accuracy(values):
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    sketch.add(values)
+
+    assert sketch.count == len(values)
+    for q in (0.01, 0.05, 0.5, 0.95, 0.99):
+        exact = np.quantile(values, q, method="lower")
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.0101, abs=1e-9)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_merging_matches_one_sketch_of_everything(values):
+    whole = QuantileSketch()
+    whole.add(values)
+    merged = QuantileSketch()
+    for part in np.array_split(values, 7):
+        piece = QuantileSketch()
+        piece.add(part)
+        merged.merge(piece)
+
+    assert merged.positive == whole.positive and merged.negative == whole.negative
+    assert merged.zeros == whole.zeros and merged.count == whole.count
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(relative_accuracy=0.05))
+
+
+def test_bucket_count_stays_bounded():
+    sketch = QuantileSketch(relative_accuracy=0.01, max_buckets=100)
+    sketch.add(np.logspace(-6, 12, 10000))
+
+    assert len(sketch.positive) <= 100
+    # The top of the distribution keeps its accuracy
+    assert sketch.quantile(0.99) == pytest.approx(np.quantile(np.logspace(-6, 12, 10000), 0.99, method="lower"), rel=0.0101)
+
+
+def test_running_summary_matches_summarizing_the_whole_series():
+    rng = np.random.default_rng(7)
+    timestamps = np.arange(1620000000, 1620000000 + 15 * 4000, 15, dtype=np.int64)
+    values = 50 + 0.001 * (timestamps - timestamps[0]) + rng.normal(0, 3, len(timestamps))
+    values[123] = np.nan
+    series = TimeSeries({"job": "todo"}, timestamps, values)
+
+    running = RunningSummary({"job": "todo"})
+    for chunk in np.array_split(np.arange(len(timestamps)), 9):
+        running.add(timestamps[chunk], values[chunk])
+    streamed, = [running.to_summary()]
+    exact, = summarize([series])
+
+    for key in ("points", "start", "end", "min", "max", "min_at", "max_at", "last"):
+        assert getattr(streamed, key) == getattr(exact, key)
+    assert streamed.mean == pytest.approx(exact.mean)
+    assert streamed.slope == pytest.approx(exact.slope)
+    for key in ("p50", "p95", "p99"):
+        assert getattr(streamed, key) == pytest.approx(getattr(exact, key), rel=0.02)
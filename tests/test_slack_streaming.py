@@ -0,0 +1,67 @@
+import pytest
+from slack_sdk.errors import SlackApiError
+from webhookservice.utils.slack_streaming import ThrottledMessageUpdater
+from webhookservice.utils.latency import LatencyTracker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_updates_are_coalesced_within_interval(clock):
+    sent = []
+    updater = ThrottledMessageUpdater(sent.append, min_interval=1.0, clock=clock)
+
+    for i, t in enumerate([0.0, 0.2, 0.4, 0.9, 1.1, 1.5, 2.3]):
+        clock.now = t
+        updater.push(f"chunk {i}")
+    assert updater.finish("final") is True
+
+    assert sent == ["chunk 0", "chunk 4", "chunk 6", "final"]
+    assert updater.updates_coalesced == 4
+
+
+def test_finish_skips_duplicate_text(clock):
+    sent = []
+    updater = ThrottledMessageUpdater(sent.append, min_interval=1.0, clock=clock)
+    updater.push("done")
+    updater.finish("done")
+    assert sent == ["done"]
+
+
+def test_rate_limit_backs_off_and_final_update_retries(clock):
+    calls = []
+
+    def update(text):
+        calls.append(text)
+        if len(calls) == 1:
+            raise SlackApiError("ratelimited", {"ok": False, "error": "ratelimited"})
+
+    sleeps = []
+    updater = ThrottledMessageUpdater(update, min_interval=1.0, clock=clock, sleep=sleeps.append)
+
+    assert updater.finish("final") is True
+    assert calls == ["final", "final"]
+    assert updater.min_interval == 2.0
+    assert sleeps == [2.0]
+
+
+def test_latency_tracker_stats():
+    tracker = LatencyTracker(window=3)
+    for seconds in [1.0, 2.0, 3.0, 4.0]:
+        tracker.record("first_analysis_chunk", seconds)
+
+    stats = tracker.stats()["first_analysis_chunk"]
+    assert stats["count"] == 4
+    assert stats["avg"] == 3.0
+    assert stats["p50"] == 3.0
+    assert stats["p95"] == 4.0
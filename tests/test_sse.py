@@ -0,0 +1,82 @@
+import asyncio
+import os
+from conftest import FakeAsyncResponse
+from webhookservice.utils.sse import (
+    SSEParser,
+    async_stream_dify_events,
+    iter_sse_events,
+    iter_dify_events,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "data")
+
+
+def test_parser_handles_event_and_multiline_data():
+    events = list(iter_sse_events([
+        b"event: ping",
+        b"",
+        b": keep-alive comment",
+        b"event: update",
+        b"id: 7",
+        b"data: first line",
+        b"data:second line",
+        b"",
+    ]))
+
+    assert len(events) == 1
+    assert events[0].event == "update"
+    assert events[0].id == "7"
+    assert events[0].data == "first line\nsecond line"
+
+
+def test_parser_flushes_trailing_event_without_blank_line():
+    parser = SSEParser()
+    assert parser.feed_line("data: {}") is None
+    assert parser.flush().data == "{}"
+    assert parser.flush() is None
+
+
+def test_dify_events_without_blank_line_separators():
+    payloads = list(iter_dify_events([
+        b'data: {"event": "message", "answer": "a"}',
+        b'data: {"event": "end", "answer": "b"}',
+    ]))
+    assert [p["event"] for p in payloads] == ["message", "end"]
+
+
+def test_dify_events_from_recorded_stream():
+    with open(os.path.join(DATA_DIR, "dify_metrics_analysis.sse"), "rb") as f:
+        payloads = list(iter_dify_events(f.read().split(b"\n")))
+
+    assert payloads[-1]["event"] == "end"
+    answer = "".join(p["answer"] for p in payloads if p["event"] == "message")
+    assert answer.startswith("**Metric Descriptions:**")
+
+
+def test_stream_stops_and_closes_on_first_result():
+    lines = [
+        b'data: {"event": "message", "answer": "x"}',
+        b"",
+        b'data: {"event": "agent_thought", "thought": "done"}',
+        b"",
+        b'data: {"event": "message", "answer": "never read"}',
+        b"",
+    ]
+    response = FakeAsyncResponse(lines)
+    messages = []
+
+    result = asyncio.run(async_stream_dify_events(response, {
+        "message": lambda data: messages.append(data["answer"]),
+        "agent_thought": lambda data: data["thought"],
+    }))
+
+    assert result == "done"
+    assert messages == ["x"]
+    assert response.lines_read == 4
+    assert response.closed
+
+
+def test_stream_closes_response_when_exhausted():
+    response = FakeAsyncResponse([b'data: {"event": "message", "answer": "x"}'])
+    assert asyncio.run(async_stream_dify_events(response, {})) is None
+    assert response.closed
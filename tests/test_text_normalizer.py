@@ -0,0 +1,31 @@
+import os
+import pytest
+from webhookservice.utils.text_normalizer import clean_text, dedupe_ordered, split_on_dashes
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "data", "normalizer")
+CORPUS = sorted(
+    name[: -len(".input.txt")] for name in os.listdir(CORPUS_DIR) if name.endswith(".input.txt")
+)
+
+
+def read(name):
+    with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", CORPUS)
+def test_clean_text_matches_golden_output(name):
+    assert clean_text(read(f"{name}.input.txt")) == read(f"{name}.expected.txt")
+
+
+def test_clean_text_empty():
+    assert clean_text("") == ""
+
+
+def test_split_on_dashes_keeps_leading_dashes_on_first_line():
+    assert split_on_dashes("  -a-b") == ["-a", "-b"]
+    assert split_on_dashes("x -y") == ["x", "-y"]
+
+
+def test_dedupe_ordered_keeps_first_seen_order():
+    assert dedupe_ordered(["b", "a", "b", "c", "a"]) == ["b", "a", "c"]
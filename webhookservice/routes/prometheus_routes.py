@@ -1,9 +1,28 @@
 from flask import Blueprint, jsonify, request
-from webhookservice.services.prometheus_service import PrometheusService
+from webhookservice.services.prometheus_service import (
+    PrometheusService,
+    get_prewarm_stats,
+    get_range_cache_stats,
+    get_series_store_stats,
+    query_guard_stats,
+)
 from webhookservice.utils.error_handler import handle_errors
-from webhookservice.services.dify_service import parse_monitoring_intent
+from webhookservice.services.dify_service import (
+    parse_monitoring_intent,
+    get_intent_cache_stats,
+    fast_path_stats,
+    analysis_cache,
+    anomaly_screen,
+    dify_router,
+)
 from webhookservice.services.slack_service import send_slack_message
+from webhookservice.utils.async_http_client import get_pool_stats, run_sync
+from webhookservice.utils.promql_guard import QueryRejected
+from webhookservice.utils.series import render_series_result
+from webhookservice.utils.single_flight import get_single_flight_stats
+from webhookservice.routes.slack_monitor_routes import fleet_service, refresh_stats, report_latency
 import json
+from dataclasses import asdict
 
 prometheus_bp = Blueprint("prometheus", __name__)
 prometheus_service = PrometheusService()
@@ -13,7 +32,7 @@ prometheus_service = PrometheusService()
 @handle_errors
 def get_current_metrics():
     """Get current process metrics"""
-    metrics = prometheus_service.get_process_metrics()
+    metrics = prometheus_service.get_current_metrics()
     return jsonify(metrics)
 
 
@@ -23,9 +42,26 @@ def get_metrics_range():
     """Get metrics over a time range"""
     metric_name = request.args.get("metric", "todo_process_cpu_seconds_total")
     hours = int(request.args.get("hours", "1"))
+    max_points = request.args.get("max_points", type=int)
+    purpose = request.args.get("purpose")
 
-    data = prometheus_service.get_metrics_range(metric_name, hours)
-    return jsonify(data)
+    data = prometheus_service.get_metrics_range(metric_name, hours, max_points=max_points, purpose=purpose)
+    return jsonify(render_series_result(data))
+
+
+@prometheus_bp.route("/metrics/range/summary", methods=["GET"])
+@handle_errors
+def get_metrics_range_summary():
+    """Get full-resolution summary statistics of every series over a time range"""
+    metric_name = request.args.get("metric", "todo_process_cpu_seconds_total")
+    hours = request.args.get("hours", 1, type=int)
+    step = request.args.get("step", type=int)
+
+    try:
+        summaries = prometheus_service.summarize_range(metric_name, hours, step=step)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"metric": metric_name, "hours": hours, "series": [asdict(summary) for summary in summaries]})
 
 
 @prometheus_bp.route("/metrics/query", methods=["GET"])
@@ -36,8 +72,49 @@ def query_metrics():
     if not query:
         return jsonify({"error": "Query parameter is required"}), 400
 
-    result = prometheus_service.query(query)
-    return jsonify(result)
+    try:
+        result = prometheus_service.guarded_query(query)
+    except QueryRejected as e:
+        return jsonify({"error": str(e), "query": query}), 400
+    return jsonify(render_series_result(result))
+
+
+@prometheus_bp.route("/metrics/sweep", methods=["GET"])
+@handle_errors
+def sweep_fleet():
+    """Check every registered service and rank them worst first"""
+    top = request.args.get("top", type=int)
+    sweep = run_sync(fleet_service.sweep())
+    return jsonify({
+        "services": len(sweep.services),
+        "flagged": len(sweep.flagged),
+        "queries": sweep.queries,
+        "errors": sweep.errors,
+        "ranking": [asdict(service) for service in sweep.services[:top]],
+    })
+
+
+@prometheus_bp.route("/metrics/service-stats", methods=["GET"])
+@handle_errors
+def get_service_stats():
+    """Get internal client statistics such as connection reuse"""
+    return jsonify(
+        {
+            "http_pools": get_pool_stats(),
+            "intent_cache": get_intent_cache_stats(),
+            "intent_fast_path": fast_path_stats,
+            "analysis_cache": analysis_cache.stats(),
+            "anomaly_screen": anomaly_screen.stats(),
+            "range_cache": get_range_cache_stats(),
+            "series_store": get_series_store_stats(),
+            "prewarm": get_prewarm_stats(),
+            "single_flight": get_single_flight_stats(),
+            "query_guard": query_guard_stats,
+            "health_report_latency": report_latency.stats(),
+            "report_refreshes": refresh_stats,
+            "llm_backends": dify_router.stats(),
+        }
+    )
 
 
 @prometheus_bp.route("/monitor-chat", methods=["POST"])
@@ -79,7 +156,7 @@ def handle_natural_language_monitor():
 
         # Get the metrics based on the query type
         if monitoring_params.get("query_type") == "current":
-            result = prometheus_service.get_process_metrics()
+            result = prometheus_service.get_current_metrics()
         elif monitoring_params.get("query_type") == "range":
             result = prometheus_service.get_metrics_range(
                 metric_name=monitoring_params.get(
@@ -87,8 +164,13 @@ def handle_natural_language_monitor():
                 ),
                 hours=int(monitoring_params.get("time_range", 1)),
             )
+            result = render_series_result(result)
         else:  # custom query
-            result = prometheus_service.query(monitoring_params.get("query", ""))
+            try:
+                result = prometheus_service.guarded_query(monitoring_params.get("query", ""))
+            except QueryRejected as e:
+                return jsonify({"error": f"Query rejected: {str(e)}"}), 400
+            result = render_series_result(result)
 
         # Format the response for Slack
         if request_data.get("channel_id"):
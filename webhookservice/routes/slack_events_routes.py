@@ -1,10 +1,31 @@
 import logging
+from concurrent.futures import Future
+from typing import Awaitable
 from flask import Blueprint
+from webhookservice.utils.async_http_client import spawn
 
 slack_events_bp = Blueprint("slack_events", __name__)
 logger = logging.getLogger(__name__)
 processed_events = set()
 
 
+def run_in_background(coro: Awaitable, description: str) -> Future:
+    """
+    Run a Slack handler on the shared event loop and return at once
+
+    Slack wants its request acknowledged within three seconds, so the view
+    answers straight away and the handler posts its results when done.
+    Failures are logged, since no one is waiting on the result.
+    """
+    def log_failure(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            error = future.exception()
+            logger.error(f"Error {description}: {str(error)}", exc_info=error)
+
+    future = spawn(coro)
+    future.add_done_callback(log_failure)
+    return future
+
+
 from .slack_deploy_routes import *
-from .slack_monitor_routes import * 
\ No newline at end of file
+from .slack_monitor_routes import * 
@@ -1,18 +1,241 @@
 from flask import request, jsonify
 import re
 import json
+import time
 from datetime import datetime
-from .slack_events_routes import slack_events_bp, logger, processed_events
-from webhookservice.services.dify_service import parse_monitoring_intent, send_metrics_to_dify
-from webhookservice.services.slack_service import send_slack_message, update_message
-from webhookservice.services.prometheus_service import PrometheusService
-from webhookservice.utils.metrics_formatter import format_metrics_message
+from .slack_events_routes import slack_events_bp, logger, processed_events, run_in_background
+from webhookservice.services.dify_service import async_parse_monitoring_intent, async_send_metrics_to_dify
+from webhookservice.services.slack_service import async_send_slack_message, async_update_message
+from webhookservice.services.prometheus_service import AsyncPrometheusService
+from webhookservice.services.fleet_service import FleetService
+from webhookservice.utils.metrics_formatter import format_metrics_message, format_sweep_message
+from webhookservice.utils.latency import LatencyTracker
+from webhookservice.utils.slack_streaming import ThrottledMessageUpdater
+from webhookservice.utils.deadline import Deadline
+from webhookservice.utils.report_state import (
+    REFRESH_ACTION_ID,
+    attach_report_state,
+    blocks_hash,
+    describe_changes,
+    digest_changes,
+    is_significant,
+    read_report_state,
+    report_digest,
+    shown_analysis,
+)
+from config.settings import (
+    REFRESH_REANALYZE_THRESHOLD,
+    SLACK_STREAMING_ENABLED,
+    SLACK_UPDATE_MIN_INTERVAL,
+    SLACK_REQUEST_DEADLINE,
+)
+
+prometheus_service = AsyncPrometheusService()
+fleet_service = FleetService(prometheus=prometheus_service)
+
+# Time from receiving a request to metrics, first analysis chunk and full analysis in Slack
+report_latency = LatencyTracker()
+
+# What Refresh clicks did: left the message alone, kept the analysis, or asked Dify again
+refresh_stats = {"unchanged": 0, "reused_analysis": 0, "reanalyzed": 0}
+
+ANALYSIS_PLACEHOLDER = "⏳ _Analyzing metrics..._"
+STREAMING_CURSOR = " ▌"
+PARTIAL_ANALYSIS_NOTE = "\n_(Analysis cut short: the request ran out of time)_"
+
+
+def final_analysis(dify_response: dict) -> str:
+    analysis = dify_response.get("analysis", "No analysis available")
+    if dify_response.get("partial"):
+        analysis += PARTIAL_ANALYSIS_NOTE
+    return analysis
+
+
+async def fetch_report_metrics(report: dict, deadline: Deadline = None) -> dict:
+    """
+    Metrics for a report request
+
+    Args:
+        report: {"type": "current", "metric"}, {"type": "range", "metric",
+                "hours"} or {"type": "query", "query"}
+    """
+    if report.get("type") == "range":
+        return await prometheus_service.get_metrics_range(
+            metric_name=report.get("metric") or "todo_process_cpu_seconds_total",
+            hours=report.get("hours", 1),
+            deadline=deadline,
+            purpose="summary",
+        )
+    if report.get("type") == "query":
+        return await prometheus_service.guarded_query(report.get("query", ""), deadline=deadline)
+    metrics = await prometheus_service.get_current_metrics(report.get("metric"), deadline=deadline)
+    metrics["server_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return metrics
+
+
+def report_request(result: dict) -> dict:
+    """The report request behind a parsed monitoring intent"""
+    query_type = result.get("query_type")
+    if query_type == "sweep":
+        return {"type": "sweep"}
+    if query_type == "current":
+        return {"type": "current", "metric": result.get("metric")}
+    if query_type == "range":
+        logger.debug(f"Querying time series data with parameters: metric={result.get('metric')}, time_range={result.get('hours')} {result.get('unit', 'hours')}")
+        time_value = int(result.get("hours", 1))
+        hours = time_value / 60 if result.get("unit", "hours") == "minutes" else time_value
+        return {"type": "range", "metric": result.get("metric", "todo_process_cpu_seconds_total"), "hours": hours}
+    return {"type": "query", "query": result.get("query", result.get("metric", ""))}
+
+
+async def send_report(channel_id: str, report: dict, started: float, deadline: Deadline = None):
+    """Fetch the metrics for a report request and post the report, or the fleet sweep"""
+    if report.get("type") == "sweep":
+        sweep = await fleet_service.sweep(deadline=deadline)
+        logger.debug(f"Sweep of {len(sweep.services)} services took {sweep.queries} queries")
+        await async_send_slack_message(channel_id, "Fleet Health Sweep", blocks=format_sweep_message(sweep), is_monitor=True)
+        report_latency.record("sweep_posted", time.monotonic() - started)
+        return
+    metrics = await fetch_report_metrics(report, deadline=deadline)
+    logger.debug(f"Metrics for {report}: {metrics}")
+    await send_health_report(channel_id, metrics, started, deadline=deadline, report=report)
+
+
+async def send_health_report(
+    channel_id: str,
+    metrics: dict,
+    started: float,
+    message_ts: str = None,
+    deadline: Deadline = None,
+    report: dict = None,
+    previous: dict = None,
+):
+    """
+    Post a System Health Report and fill in the Dify analysis as it streams
+
+    The metrics blocks go out immediately with a placeholder analysis, then
+    the same message is updated (throttled) while Dify chunks arrive. Pass
+    message_ts to update an existing report instead of posting a new one.
+    If the deadline runs out mid-analysis, the part received so far is kept.
+
+    `report` (the request behind the metrics) and a digest of the values
+    the analysis was written for are stored in the Refresh button. A refresh
+    passes that state back as `previous`, with the analysis shown: the
+    report then says what changed since those values, keeps the analysis
+    unless a value moved by more than REFRESH_REANALYZE_THRESHOLD, and
+    leaves the message alone if it would look the same. A kept analysis
+    keeps its digest, so a metric creeping up a little on every refresh is
+    re-analyzed once it has moved far enough in total.
+    """
+    is_refresh = message_ts is not None
+    title = "System Health Report (Refreshed)" if is_refresh else "System Health Report"
+    previous = previous or {}
+
+    digest = report_digest(metrics)
+    changes = moved = None
+    if "digest" in previous:
+        moved = digest_changes(previous["digest"], digest)
+        changes = describe_changes(previous["digest"], digest, moved)
+
+    def report_blocks(analysis: str, raw_metrics: dict = metrics, analyzed: dict = digest):
+        blocks = format_metrics_message(raw_metrics, {"analysis": analysis}, is_refresh=is_refresh, changes=changes)
+        return attach_report_state(blocks, {"report": report, "digest": analyzed, "hash": blocks_hash(blocks)})
+
+    if previous.get("analysis") and moved is not None and not is_significant(moved, REFRESH_REANALYZE_THRESHOLD):
+        blocks = report_blocks(previous["analysis"], analyzed=previous["digest"])
+        if blocks_hash(blocks) == previous.get("hash"):
+            refresh_stats["unchanged"] += 1
+            logger.info("Refreshed report is unchanged; not updating the message")
+        else:
+            refresh_stats["reused_analysis"] += 1
+            await async_update_message(channel_id, message_ts, blocks, title, is_monitor=True)
+        report_latency.record("analysis_complete", time.monotonic() - started)
+        return
+    if is_refresh:
+        refresh_stats["reanalyzed"] += 1
+
+    if not SLACK_STREAMING_ENABLED:
+        logger.debug("Sending metrics to Dify for analysis")
+        dify_response = await async_send_metrics_to_dify(metrics, deadline=deadline)
+        formatted_message = report_blocks(final_analysis(dify_response), dify_response.get("raw_metrics", metrics))
+        if is_refresh:
+            await async_update_message(channel_id, message_ts, formatted_message, title, is_monitor=True)
+        else:
+            await async_send_slack_message(channel_id, title, blocks=formatted_message, is_monitor=True)
+        report_latency.record("analysis_complete", time.monotonic() - started)
+        return
+
+    placeholder = report_blocks(ANALYSIS_PLACEHOLDER)
+    if is_refresh:
+        await async_update_message(channel_id, message_ts, placeholder, title, is_monitor=True)
+    else:
+        response = await async_send_slack_message(channel_id, title, blocks=placeholder, is_monitor=True)
+        message_ts = response["ts"]
+    report_latency.record("metrics_posted", time.monotonic() - started)
+
+    async def render(analysis: str):
+        await async_update_message(channel_id, message_ts, report_blocks(analysis), title, is_monitor=True)
+
+    updater = ThrottledMessageUpdater(render, SLACK_UPDATE_MIN_INTERVAL)
+    first_chunk = True
+
+    def on_chunk(analysis: str):
+        nonlocal first_chunk
+        if first_chunk:
+            first_chunk = False
+            report_latency.record("first_analysis_chunk", time.monotonic() - started)
+        updater.push(analysis + STREAMING_CURSOR)
+
+    logger.debug("Streaming metrics analysis from Dify")
+    dify_response = await async_send_metrics_to_dify(metrics, on_chunk=on_chunk, deadline=deadline) or {}
+    await updater.finish(final_analysis(dify_response))
+    report_latency.record("analysis_complete", time.monotonic() - started)
+    logger.debug(
+        f"Analysis streamed with {updater.updates_sent} updates, {updater.updates_coalesced} coalesced"
+    )
+
+
+async def handle_monitoring_request(channel_id: str, message: str, started: float, deadline: Deadline = None):
+    """Parse a monitoring request and post the report, help or answer it asks for"""
+    result = await async_parse_monitoring_intent(message, deadline=deadline)
+    if not result:
+        logger.warning("Failed to parse monitoring intent")
+        await async_send_slack_message(
+            channel_id,
+            "❌ Sorry, I couldn't understand your request. Try asking for specific metrics like CPU usage, memory usage, or custom queries.",
+        )
+        return
+    if "type" in result:
+        if result["type"] == "help":
+            logger.info(f"Sending help message: {result.get('message', '')}")
+            await async_send_slack_message(channel_id, result.get("message", ""))
+        elif result["type"] == "monitoring":
+            # Handle monitoring type response
+            try:
+                await send_report(channel_id, report_request(result), started, deadline=deadline)
+            except Exception as e:
+                error_msg = f"Error fetching metrics: {str(e)}"
+                logger.error(error_msg)
+                await async_send_slack_message(channel_id, f"❌ {error_msg}", is_monitor=True)
+        else:
+            # Handle other types of responses
+            response_message = result.get("message", str(result))
+            logger.info(f"Received non-monitoring response: {response_message}")
+            await async_send_slack_message(channel_id, response_message)
+        return
+    try:
+        await send_report(channel_id, report_request(result), started, deadline=deadline)
+    except Exception as e:
+        error_msg = f"Error fetching metrics: {str(e)}"
+        logger.error(error_msg)
+        await async_send_slack_message(channel_id, f"❌ {error_msg}", is_monitor=True)
 
-prometheus_service = PrometheusService()
 
 @slack_events_bp.route("/monitor/events", methods=["POST"])
 def handle_monitor_events():
     """Handle Slack events for monitoring requests"""
+    started = time.monotonic()
+    deadline = Deadline(SLACK_REQUEST_DEADLINE)
     try:
         data = request.json
         if data.get("type") == "url_verification":
@@ -31,112 +254,55 @@ def handle_monitor_events():
             text = event.get("text")
             message = re.sub(r"<@[A-Za-z0-9]+>", "", text).strip()
             logger.info(f"Processing monitoring request: {message}")
-            result = parse_monitoring_intent(message)
-            if not result:
-                logger.warning("Failed to parse monitoring intent")
-                send_slack_message(
-                    channel_id,
-                    "❌ Sorry, I couldn't understand your request. Try asking for specific metrics like CPU usage, memory usage, or custom queries.",
-                )
-                return jsonify({"ok": True}), 200
-            if "type" in result:
-                if result["type"] == "help":
-                    logger.info(f"Sending help message: {result.get('message', '')}")
-                    send_slack_message(channel_id, result.get("message", ""))
-                elif result["type"] == "monitoring":
-                    # Handle monitoring type response
-                    try:
-                        if result.get("query_type") == "current":
-                            metric_name = result.get("metric")
-                            metrics = prometheus_service.get_process_metrics(metric_name)
-                            metrics["server_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        elif result.get("query_type") == "range":
-                            logger.debug(f"Querying time series data with parameters: metric={result.get('metric')}, time_range={result.get('hours')} {result.get('unit', 'hours')}")
-                            time_value = int(result.get("hours", 1))
-                            time_unit = result.get("unit", "hours")
-                            if time_unit == "minutes":
-                                hours = time_value / 60
-                            else:
-                                hours = time_value
-                            metrics = prometheus_service.get_metrics_range(
-                                metric_name=result.get("metric", "todo_process_cpu_seconds_total"),
-                                hours=hours,
-                            )
-                            logger.debug(f"Raw metrics response from Prometheus: {metrics}")
-                        else:
-                            query = result.get("query", result.get("metric", ""))
-                            metrics = prometheus_service.query(query)
-                        logger.debug("Sending metrics to Dify for analysis")
-                        dify_response = send_metrics_to_dify(metrics)
-                        logger.debug(f"Response from Dify: {dify_response}")
-                        raw_metrics = dify_response["raw_metrics"]
-                        logger.debug(f"Processing raw metrics for display: {raw_metrics}")
-                        
-                        formatted_message = format_metrics_message(raw_metrics, dify_response)
-                        send_slack_message(
-                            channel_id,
-                            "System Health Report",
-                            blocks=formatted_message,
-                            is_monitor=True,
-                        )
-                    except Exception as e:
-                        error_msg = f"Error fetching metrics: {str(e)}"
-                        logger.error(error_msg)
-                        send_slack_message(channel_id, f"❌ {error_msg}", is_monitor=True)
-                else:
-                    # Handle other types of responses
-                    response_message = result.get("message", str(result))
-                    logger.info(f"Received non-monitoring response: {response_message}")
-                    send_slack_message(channel_id, response_message)
-                return jsonify({"ok": True}), 200
-            try:
-                if result.get("query_type") == "current":
-                    metric_name = result.get("metric")
-                    metrics = prometheus_service.get_process_metrics(metric_name)
-                    metrics["server_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                elif result.get("query_type") == "range":
-                    logger.debug(f"Querying time series data with parameters: metric={result.get('metric')}, time_range={result.get('hours')} {result.get('unit', 'hours')}")
-                    time_value = int(result.get("hours", 1))
-                    time_unit = result.get("unit", "hours")
-                    if time_unit == "minutes":
-                        hours = time_value / 60
-                    else:
-                        hours = time_value
-                    metrics = prometheus_service.get_metrics_range(
-                        metric_name=result.get("metric", "todo_process_cpu_seconds_total"),
-                        hours=hours,
-                    )
-                    logger.debug(f"Raw metrics response from Prometheus: {metrics}")
-                else:
-                    query = result.get("query", result.get("metric", ""))
-                    metrics = prometheus_service.query(query)
-                logger.debug("Sending metrics to Dify for analysis")
-                dify_response = send_metrics_to_dify(metrics)
-                logger.debug(f"Response from Dify: {dify_response}")
-                raw_metrics = dify_response["raw_metrics"]
-                logger.debug(f"Processing raw metrics for display: {raw_metrics}")
-                
-                formatted_message = format_metrics_message(raw_metrics, dify_response)
-                send_slack_message(
-                    channel_id,
-                    "System Health Report",
-                    blocks=formatted_message,
-                    is_monitor=True,
-                )
-                return jsonify({"ok": True}), 200
-            except Exception as e:
-                error_msg = f"Error fetching metrics: {str(e)}"
-                logger.error(error_msg)
-                send_slack_message(channel_id, f"❌ {error_msg}", is_monitor=True)
-                return jsonify({"ok": True}), 200
+            run_in_background(
+                handle_monitoring_request(channel_id, message, started, deadline), "handling monitoring request"
+            )
+            return jsonify({"ok": True}), 200
         return jsonify({"ok": True}), 200
     except Exception as e:
         logger.error(f"Error handling monitor event: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+
+async def refresh_report(
+    action: dict, message: dict, channel_id: str, message_ts: str, started: float, deadline: Deadline = None
+):
+    """Refresh the report in `message` from the state stored in its Refresh button"""
+    try:
+        state = read_report_state(action)
+        analysis = shown_analysis(message.get("blocks"))
+        if analysis and not analysis.startswith(ANALYSIS_PLACEHOLDER) and not analysis.endswith(STREAMING_CURSOR):
+            state["analysis"] = analysis
+        metrics = await fetch_report_metrics(state["report"], deadline=deadline)
+        await send_health_report(
+            channel_id, metrics, started, message_ts=message_ts, deadline=deadline,
+            report=state["report"], previous=state,
+        )
+    except Exception as e:
+        error_msg = f"Error refreshing metrics: {str(e)}"
+        logger.error(error_msg)
+        await async_update_message(
+            channel_id,
+            message_ts,
+            [
+                {
+                    "type": "section",
+                    "text": {
+                        "type": "mrkdwn",
+                        "text": f"❌ *Error*\n{error_msg}",
+                    },
+                }
+            ],
+            error_msg,
+            is_monitor=True,
+        )
+
+
 @slack_events_bp.route("/monitor/actions", methods=["POST"])
 def handle_monitor_actions():
     """Handle interactive component actions for monitoring"""
+    started = time.monotonic()
+    deadline = Deadline(SLACK_REQUEST_DEADLINE)
     try:
         payload = json.loads(request.form.get("payload"))
         action = payload["actions"][0]
@@ -144,41 +310,11 @@ def handle_monitor_actions():
         channel_id = payload["channel"]["id"]
         message_ts = payload["message"]["ts"]
         logger.info(f"Processing monitoring action: {action_id}")
-        if action_id == "refresh_metrics":
-            try:
-                metrics = prometheus_service.get_process_metrics()
-                metrics["server_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                dify_response = send_metrics_to_dify(metrics)
-                raw_metrics = dify_response["raw_metrics"]
-                
-                formatted_message = format_metrics_message(raw_metrics, dify_response, is_refresh=True)
-                update_message(
-                    channel_id,
-                    message_ts,
-                    formatted_message,
-                    "System Health Report (Refreshed)",
-                    is_monitor=True,
-                )
-                return jsonify({"ok": True})
-            except Exception as e:
-                error_msg = f"Error refreshing metrics: {str(e)}"
-                logger.error(error_msg)
-                update_message(
-                    channel_id,
-                    message_ts,
-                    [
-                        {
-                            "type": "section",
-                            "text": {
-                                "type": "mrkdwn",
-                                "text": f"❌ *Error*\n{error_msg}",
-                            },
-                        }
-                    ],
-                    error_msg,
-                    is_monitor=True,
-                )
-                return jsonify({"ok": True})
+        if action_id == REFRESH_ACTION_ID:
+            run_in_background(
+                refresh_report(action, payload["message"], channel_id, message_ts, started, deadline),
+                "refreshing report",
+            )
         return jsonify({"ok": True})
     except Exception as e:
         logger.error(f"Error handling monitoring action: {str(e)}", exc_info=True)
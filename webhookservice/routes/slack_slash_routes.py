@@ -1,39 +1,60 @@
 from flask import Blueprint, request, jsonify
 import logging
-from webhookservice.services.jenkins_service import trigger_jenkins_build
+from webhookservice.services.jenkins_service import async_trigger_jenkins_build
+from webhookservice.utils.async_http_client import async_request
+from webhookservice.utils.deadline import Deadline
+from config.settings import SLACK_REQUEST_DEADLINE
+from .slack_events_routes import run_in_background
 
 logger = logging.getLogger(__name__)
 slack_slash_bp = Blueprint("slack_slash", __name__)
 
 
+async def run_slash_deploy(branch: str, channel: str, response_url: str, deadline: Deadline = None):
+    """Trigger the build for a slash command and post the outcome to its response_url"""
+    environment = "staging"  # Default to staging for now
+    try:
+        # Trigger Jenkins build
+        response = await async_trigger_jenkins_build(
+            branch=branch, environment=environment, channel=f"#{channel}", deadline=deadline
+        )
+
+        if response.success:
+            reply = {
+                "response_type": "in_channel",
+                "text": f"🚀 Deployment started for branch `{branch}` to `{environment}`\nBuild number: {response.build_number}",
+            }
+        else:
+            reply = {
+                "response_type": "in_channel",
+                "text": f"❌ Deployment failed: {response.message}",
+            }
+
+    except Exception as e:
+        logger.error(f"Error handling slash command: {str(e)}", exc_info=True)
+        reply = {
+            "response_type": "in_channel",
+            "text": f"❌ Error processing command: {str(e)}",
+        }
+
+    # Posted even when the deadline has run out, so the user hears about it
+    posted = await async_request("slack", "POST", response_url, json=reply, timeout=SLACK_REQUEST_DEADLINE)
+    posted.close()
+
+
 @slack_slash_bp.route("/command", methods=["POST"])
 def handle_slash_command():
     """Handle Slack slash commands"""
+    deadline = Deadline(SLACK_REQUEST_DEADLINE)
     try:
         # Extract command parameters
         branch = request.form.get("text", "main")
         channel = request.form.get("channel_name")
-        environment = "staging"  # Default to staging for now
+        response_url = request.form.get("response_url")
 
-        # Trigger Jenkins build
-        response = trigger_jenkins_build(
-            branch=branch, environment=environment, channel=f"#{channel}"
-        )
-
-        if response.success:
-            return jsonify(
-                {
-                    "response_type": "in_channel",
-                    "text": f"🚀 Deployment started for branch `{branch}` to `{environment}`\nBuild number: {response.build_number}",
-                }
-            )
-        else:
-            return jsonify(
-                {
-                    "response_type": "in_channel",
-                    "text": f"❌ Deployment failed: {response.message}",
-                }
-            )
+        # The build is reported through response_url once Jenkins answers
+        run_in_background(run_slash_deploy(branch, channel, response_url, deadline), "handling slash command")
+        return "", 200
 
     except Exception as e:
         logger.error(f"Error handling slash command: {str(e)}", exc_info=True)
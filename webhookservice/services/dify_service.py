@@ -1,46 +1,219 @@
+import re
+import copy
+import asyncio
 import json
 import requests
 import logging
-from typing import Dict, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Tuple
 from functools import wraps
 from config.settings import (
     DIFY_DEPLOY_BOT_API_KEY,
     DIFY_MONITOR_BOT_API_KEY,
     DIFY_API_ENDPOINT,
+    INTENT_CACHE_MAXSIZE,
+    INTENT_CACHE_TTL,
+    INTENT_FAST_PATH_ENABLED,
+    INTENT_FAST_PATH_MIN_CONFIDENCE,
+    METRICS_PROMPT_MAX_POINTS,
+    METRICS_PROMPT_PRECISION,
+    METRICS_PROMPT_MAX_SERIES,
+    ANALYSIS_CACHE_MAXSIZE,
+    ANALYSIS_CACHE_TTL,
+    ANALYSIS_CACHE_SIGNIFICANT_DIGITS,
+    DIFY_BACKENDS,
+    LLM_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_RESET_TIMEOUT,
+    LLM_ERROR_WINDOW,
+    LLM_HEDGE_INTENTS,
+    LLM_HEDGE_DELAY,
+    DIFY_REQUEST_TIMEOUT,
+    ANOMALY_SCREEN_ENABLED,
+    ANOMALY_Z_THRESHOLD,
+    ANOMALY_MIN_BASELINE,
+    ANOMALY_MIN_SPREAD,
+    ANOMALY_RECENT_FRACTION,
+    ANOMALY_CPU_MAX_PERCENT,
+    ANOMALY_MEMORY_MAX_MB,
 )
+from webhookservice.utils.anomaly import AnomalyScreen, metric_baselines, nominal_analysis
+from webhookservice.utils.cache import BoundedTTLCache
+from webhookservice.utils.deadline import Deadline, DeadlineExceeded, deadline_expired, hop_timeout
+from webhookservice.utils.downsample import encode_series
+from webhookservice.utils.fingerprint import metrics_fingerprint
+from webhookservice.utils.intent_rules import match_deployment_intent, match_monitoring_intent
+from webhookservice.utils.async_http_client import AsyncResponse, async_request, run_sync
+from webhookservice.utils.llm_router import LLMRouter, parse_backends
+from webhookservice.utils.series import as_series, render_series_result
+from webhookservice.utils.series_stats import display_unit, rank_by_peak, summarize
+from webhookservice.utils.single_flight import get_single_flight
+from webhookservice.utils.sse import async_stream_dify_events
+from webhookservice.utils.text_normalizer import clean_text, dedupe_ordered
 
 logger = logging.getLogger(__name__)
 
+def _dify_error_result(func: Callable, e: Exception) -> Optional[Dict]:
+    if isinstance(e, requests.Timeout):
+        logger.error(f"Request to Dify API timed out: {str(e)}")
+        return {"error": "Request timed out"}
+    if isinstance(e, requests.RequestException):
+        logger.error(f"Request error in {func.__name__}: {str(e)}")
+        return {"error": f"Request error: {str(e)}"}
+    logger.error(f"Error in {func.__name__}: {str(e)}", exc_info=True)
+    return None
+
+
 def handle_dify_api_errors(func: Callable) -> Callable:
     """Decorator to handle common Dify API errors"""
     @wraps(func)
-    def wrapper(*args, **kwargs):
+    async def wrapper(*args, **kwargs):
         try:
-            return func(*args, **kwargs)
-        except requests.Timeout:
-            logger.error("Request to Dify API timed out after 30 seconds")
-            return {"error": "Request timed out"}
-        except requests.RequestException as e:
-            logger.error(f"Request error in {func.__name__}: {str(e)}")
-            return {"error": f"Request error: {str(e)}"}
+            return await func(*args, **kwargs)
         except Exception as e:
-            logger.error(f"Error in {func.__name__}: {str(e)}", exc_info=True)
-            return None
+            return _dify_error_result(func, e)
     return wrapper
 
-def make_dify_request(
-    api_key: str,
-    message: str,
-    stream: bool = True,
-    timeout: int = 30
-) -> requests.Response:
-    """Make a request to Dify API with common parameters"""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    }
+# One namespace per bot so identical phrases never cross between bots
+intent_caches = {
+    "deploy": BoundedTTLCache(maxsize=INTENT_CACHE_MAXSIZE, ttl=INTENT_CACHE_TTL),
+    "monitor": BoundedTTLCache(maxsize=INTENT_CACHE_MAXSIZE, ttl=INTENT_CACHE_TTL),
+}
+
+MENTION_PATTERN = re.compile(r"<[@!#][^>]*>")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Phrases whose meaning depends on when they are asked ("since 9am", "yesterday")
+TIME_DEPENDENT_PATTERN = re.compile(
+    r"\b(today|tonight|yesterday|tomorrow|this (morning|afternoon|evening)|last night"
+    r"|since|until|till|before|after|ago|at \d"
+    r"|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b"
+    r"|\d{1,2}:\d{2}|\d{1,2}\s*(am|pm)\b|\d{4}-\d{2}-\d{2}"
+)
+
+# Result keys holding times that were resolved against the clock
+RESOLVED_TIME_KEYS = {"start", "end", "time", "start_time", "end_time", "timestamp"}
+
+
+def normalize_message(message: str) -> str:
+    """Normalize a chat message for cache lookups: drop mentions, collapse whitespace, lowercase"""
+    if not message:
+        return ""
+    message = MENTION_PATTERN.sub(" ", message)
+    return WHITESPACE_PATTERN.sub(" ", message).strip().lower()
+
+
+def is_cacheable_intent(normalized_message: str, result: Any) -> bool:
+    """Only cache successful parses that don't depend on the time they were made"""
+    if not normalized_message or TIME_DEPENDENT_PATTERN.search(normalized_message):
+        return False
+    if not isinstance(result, dict) or not result or "error" in result:
+        return False
+    return not RESOLVED_TIME_KEYS & result.keys()
+
+
+def _cached_intent_lookup(bot: str, key: str, message: str) -> Optional[Dict]:
+    if not key or TIME_DEPENDENT_PATTERN.search(key):
+        return None
+    cached = intent_caches[bot].get(key)
+    if cached is None:
+        return None
+    logger.info(f"Intent cache hit for {bot} bot: {key}")
+    result = copy.deepcopy(cached)
+    if "original_message" in result:
+        result["original_message"] = message
+    return result
+
+
+def _cache_intent(bot: str, key: str, result: Any):
+    if is_cacheable_intent(key, result):
+        intent_caches[bot].set(key, copy.deepcopy(result))
+
+
+def cached_intent(bot: str) -> Callable:
+    """Decorator serving repeated intent lookups from the bot's intent cache"""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(message: str, *args, **kwargs):
+            key = normalize_message(message)
+            cached = _cached_intent_lookup(bot, key, message)
+            if cached is not None:
+                return cached
+            result = await func(message, *args, **kwargs)
+            _cache_intent(bot, key, result)
+            return result
+        return wrapper
+    return decorator
+
+
+# LLM analyses keyed by a quantized fingerprint of the metrics they describe
+analysis_cache = BoundedTTLCache(maxsize=ANALYSIS_CACHE_MAXSIZE, ttl=ANALYSIS_CACHE_TTL)
+# Keyed by the same metrics fingerprint as analysis_cache
+analysis_flights = get_single_flight("dify")
+# on_chunk callbacks of every caller sharing an in-flight analysis, by fingerprint
+analysis_listeners: Dict[str, List[Callable[[str], None]]] = {}
+
+# Decides which health reports need an LLM analysis at all
+anomaly_screen = AnomalyScreen(
+    metric_baselines,
+    threshold=ANOMALY_Z_THRESHOLD,
+    min_baseline=ANOMALY_MIN_BASELINE,
+    min_spread=ANOMALY_MIN_SPREAD,
+    recent_fraction=ANOMALY_RECENT_FRACTION,
+    bands={
+        "cpu_usage": (None, ANOMALY_CPU_MAX_PERCENT),
+        "memory_usage": (None, ANOMALY_MEMORY_MAX_MB * 1024 * 1024),
+        "up": (1, None),
+    },
+)
+
+
+def get_intent_cache_stats() -> Dict[str, Dict]:
+    """Hit/miss/eviction counters for every bot's intent cache"""
+    return {bot: cache.stats() for bot, cache in intent_caches.items()}
 
-    payload = json.dumps({
+
+fast_path_stats = {
+    "deploy": {"matched": 0, "fallbacks": 0},
+    "monitor": {"matched": 0, "fallbacks": 0},
+}
+
+
+def _fast_path_lookup(bot: str, matcher: Callable, message: str) -> Optional[Dict]:
+    if not INTENT_FAST_PATH_ENABLED:
+        return None
+    intent, confidence = matcher(message)
+    if intent is not None and confidence >= INTENT_FAST_PATH_MIN_CONFIDENCE:
+        fast_path_stats[bot]["matched"] += 1
+        logger.info(f"Fast-path {bot} intent (confidence {confidence:.2f}): {intent}")
+        return intent
+    fast_path_stats[bot]["fallbacks"] += 1
+    logger.debug(f"Fast-path confidence {confidence:.2f} too low, falling back to Dify")
+    return None
+
+
+def fast_path_intent(bot: str, matcher: Callable) -> Callable:
+    """Decorator answering common commands with a local grammar before calling Dify"""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(message: str, *args, **kwargs):
+            intent = _fast_path_lookup(bot, matcher, message)
+            if intent is not None:
+                return intent
+            return await func(message, *args, **kwargs)
+        return wrapper
+    return decorator
+
+# Dify-compatible backends (e.g. Dify apps on Ollama, DeepSeek or Mistral) behind one router
+dify_router = LLMRouter(
+    parse_backends(DIFY_BACKENDS, DIFY_API_ENDPOINT),
+    failure_threshold=LLM_FAILURE_THRESHOLD,
+    reset_timeout=LLM_CIRCUIT_RESET_TIMEOUT,
+    error_window=LLM_ERROR_WINDOW,
+    hedge_delay=LLM_HEDGE_DELAY,
+)
+
+
+def _dify_payload(message: str, stream: bool) -> str:
+    return json.dumps({
         "inputs": {},
         "query": message,
         "response_mode": "streaming" if stream else "blocking",
@@ -49,29 +222,64 @@ def make_dify_request(
         "files": [],
     })
 
-    return requests.post(
-        DIFY_API_ENDPOINT,
-        headers=headers,
-        data=payload,
-        stream=stream,
-        timeout=timeout,
-    )
 
-def parse_deployment_intent(message: str) -> Optional[Dict]:
-    """Parse deployment intent from natural language using Dify API"""
-    logger.info(f"Processing deployment request: {message}")
-    
-    response = make_dify_request(DIFY_DEPLOY_BOT_API_KEY, message)
-    
-    if response.status_code != 200:
-        logger.error(f"Error response from Dify API: {response.text}")
-        return {"error": response.text}
+def _dify_headers(backend, bot: Optional[str], api_key: str) -> Dict[str, str]:
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {backend.api_key(bot, api_key)}",
+    }
+
 
+async def async_make_dify_request(
+    api_key: str,
+    message: str,
+    stream: bool = True,
+    timeout: float = DIFY_REQUEST_TIMEOUT,
+    bot: Optional[str] = None,
+    hedge: bool = False,
+    deadline: Optional[Deadline] = None,
+) -> AsyncResponse:
+    """
+    Make a request to Dify API with common parameters
+
+    The call goes to the fastest healthy backend and fails over to the next
+    one on errors. `bot` selects the backend's own app key when it has one.
+    Each attempt's timeout is cut to what is left of `deadline`. The
+    response is streamed; read it with async_stream_dify_events.
+    """
+    payload = _dify_payload(message, stream)
+
+    async def send(backend) -> AsyncResponse:
+        call_timeout = hop_timeout(deadline, timeout)
+        try:
+            return await async_request(
+                "dify",
+                "POST",
+                backend.endpoint,
+                headers=_dify_headers(backend, bot, api_key),
+                data=payload,
+                timeout=call_timeout,
+            )
+        except requests.Timeout as e:
+            if call_timeout < timeout:
+                raise DeadlineExceeded(str(e)) from e
+            raise
+
+    return await dify_router.request(send, hedge=hedge)
+
+
+async def _async_error_text(response: AsyncResponse) -> str:
+    try:
+        return await response.text()
+    finally:
+        response.close()
+
+def _deployment_intent_reader() -> Tuple[Dict[str, Callable], Callable[[], Optional[Dict]]]:
+    """Stream handlers for the deploy bot, and a function giving the result once the stream ends"""
+    # Repeats are kept here and dropped when the message is assembled
     message_content = []
     final_message = None
 
-    logger.info("Starting to process Dify API response stream")
-    
     def handle_thought_content(thought_content: str) -> Optional[Dict]:
         if not thought_content:
             return None
@@ -95,121 +303,76 @@ def parse_deployment_intent(message: str) -> Optional[Dict]:
                 return deployment_params
                 
         except json.JSONDecodeError:
-            if thought_content not in message_content:
-                logger.debug(f"Adding thought content to message_content: {thought_content}")
-                message_content.append(thought_content)
+            logger.debug(f"Adding thought content to message_content: {thought_content}")
+            message_content.append(thought_content)
                 
         return None
         
-    def clean_text(text: str) -> str:
-        if not text:
-            return ""
-            
-        # Find the well-formatted version of the text
-        formatted_text = None
-        for possible_text in text.split("I can help you"):
-            if "deploy applications" in possible_text and "Try commands like:" in possible_text:
-                formatted_text = "I can help you" + possible_text
-                break
-
-        if not formatted_text:
-            # If we couldn't find a well-formatted version, clean up the text as best we can
-            lines = text.split("\n")
-            cleaned_lines = []
-            for line in lines:
-                line = line.strip()
-                if not line or line in cleaned_lines:
-                    continue
-                if line.startswith("-"):
-                    if not line.startswith("- "):
-                        line = "- " + line[1:].strip()
-                cleaned_lines.append(line)
-            return "\n".join(cleaned_lines)
-
-        # Clean up the formatted text
-        lines = []
-        current_line = ""
-        for char in formatted_text:
-            if char == "-" and current_line.strip():
-                if current_line.strip():
-                    lines.append(current_line.strip())
-                current_line = "-"
-            else:
-                current_line += char
-        if current_line.strip():
-            lines.append(current_line.strip())
-
-        # Clean up each line
-        cleaned_lines = []
-        for line in lines:
-            line = line.strip()
-            if not line or line in cleaned_lines:
-                continue
-            if line.startswith("-"):
-                if not line.startswith("- "):
-                    line = "- " + line[1:].strip()
-            cleaned_lines.append(line)
-
-        return "\n".join(cleaned_lines)
-
-    for line in response.iter_lines():
-        if not line:
-            continue
-
-        line = line.decode("utf-8")
-        logger.debug(f"Raw response line: {line}")
-
-        # Handle ping events
-        if line.startswith("event: ping"):
-            continue
-
-        # Remove "data: " prefix if present
-        if line.startswith("data: "):
-            line = line.replace("data: ", "")
+    def on_agent_thought(data: Dict) -> Optional[Dict]:
+        return handle_thought_content(data.get("thought", ""))
+
+    def on_agent_message(data: Dict) -> None:
+        answer = data.get("answer", "").strip()
+        logger.debug(f"Received agent message: {answer}")
+        if answer:
+            logger.debug(f"Adding agent message to message_content: {answer}")
+            message_content.append(answer)
+
+    def on_end(data: Dict) -> None:
+        nonlocal final_message
+        final_message = data.get("answer", "").strip()
+        logger.debug(f"Received end message: {final_message}")
+
+    def finish() -> Optional[Dict]:
+        # Process final message
+        if message_content or final_message:
+            text = final_message if final_message else "".join(dedupe_ordered(message_content)).strip()
+            logger.debug(f"Combined raw text before cleaning: {text}")
+
+            if text:
+                try:
+                    json_content = json.loads(text)
+                    logger.info(f"Returning JSON message: {json_content}")
+                    return json_content
+                except json.JSONDecodeError:
+                    cleaned_text = clean_text(text)
+                    logger.debug(f"Final cleaned text: {cleaned_text}")
+                    logger.info(f"Returning plain text message: {cleaned_text}")
+                    return {"message": cleaned_text}
 
-        try:
-            data = json.loads(line)
-            event_type = data.get("event")
-            logger.debug(f"Processing event type: {event_type}")
-
-            if event_type == "agent_thought":
-                result = handle_thought_content(data.get("thought", ""))
-                if result:
-                    return result
-                    
-            elif event_type == "agent_message":
-                answer = data.get("answer", "").strip()
-                logger.debug(f"Received agent message: {answer}")
-                if answer and answer not in message_content:
-                    logger.debug(f"Adding agent message to message_content: {answer}")
-                    message_content.append(answer)
-                    
-            elif event_type == "end":
-                final_message = data.get("answer", "").strip()
-                logger.debug(f"Received end message: {final_message}")
-
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON from line: {line}, error: {str(e)}")
-            continue
-
-    # Process final message
-    if message_content or final_message:
-        text = final_message if final_message else "".join(message_content).strip()
-        logger.debug(f"Combined raw text before cleaning: {text}")
-
-        if text:
-            try:
-                json_content = json.loads(text)
-                logger.info(f"Returning JSON message: {json_content}")
-                return json_content
-            except json.JSONDecodeError:
-                cleaned_text = clean_text(text)
-                logger.debug(f"Final cleaned text: {cleaned_text}")
-                logger.info(f"Returning plain text message: {cleaned_text}")
-                return {"message": cleaned_text}
-
-    logger.warning("No valid content found in response")
-    return None
+        logger.warning("No valid content found in response")
+        return None
+
+    return {
+        "agent_thought": on_agent_thought,
+        "agent_message": on_agent_message,
+        "end": on_end,
+    }, finish
+
+
+@fast_path_intent("deploy", match_deployment_intent)
+@cached_intent("deploy")
+async def async_parse_deployment_intent(message: str, deadline: Optional[Deadline] = None) -> Optional[Dict]:
+    """Parse deployment intent from natural language using Dify API"""
+    logger.info(f"Processing deployment request: {message}")
+
+    response = await async_make_dify_request(
+        DIFY_DEPLOY_BOT_API_KEY, message, bot="deploy", hedge=LLM_HEDGE_INTENTS, deadline=deadline
+    )
+
+    if response.status_code != 200:
+        error_text = await _async_error_text(response)
+        logger.error(f"Error response from Dify API: {error_text}")
+        return {"error": error_text}
+
+    logger.info("Starting to process Dify API response stream")
+    handlers, finish = _deployment_intent_reader()
+    return await async_stream_dify_events(response, handlers, deadline) or finish()
+
+
+def parse_deployment_intent(message: str, deadline: Optional[Deadline] = None) -> Optional[Dict]:
+    """Blocking form of async_parse_deployment_intent, for worker threads"""
+    return run_sync(async_parse_deployment_intent(message, deadline))
 
 
 def extract_json_from_markdown(text: str) -> Optional[Dict]:
@@ -242,24 +405,8 @@ def extract_json_from_markdown(text: str) -> Optional[Dict]:
         return None
 
 
-@handle_dify_api_errors
-def parse_monitoring_intent(message: str) -> Dict[str, Any]:
-    """
-    Parse monitoring requests using Dify API
-    Returns a dictionary containing:
-    - metric: The name of the metric to query
-    - hours: Time range for the query (in hours)
-    - query_type: 'current', 'range', or 'custom'
-    Or for non-monitoring queries:
-    - type: 'help' or other type
-    - message: The response message
-    """
-    response = make_dify_request(DIFY_MONITOR_BOT_API_KEY, message)
-    
-    if response.status_code != 200:
-        logger.error(f"Error from Dify API: {response.text}")
-        return {"error": response.text}
-
+def _monitoring_intent_reader(message: str) -> Tuple[Dict[str, Callable], Callable[[], Optional[Dict]]]:
+    """Stream handlers for the monitor bot, and a function giving the result once the stream ends"""
     message_content = []
     
     def handle_thought_content(thought_content: str) -> Optional[Dict]:
@@ -309,129 +456,282 @@ def parse_monitoring_intent(message: str) -> Dict[str, Any]:
             
         return None
 
-    for line in response.iter_lines():
-        if not line:
-            continue
-            
-        line_str = line.decode("utf-8").replace("data: ", "")
-        try:
-            data = json.loads(line_str)
-            event_type = data.get("event")
-            
-            if event_type == "agent_thought":
-                result = handle_thought_content(data.get("thought", ""))
-                if result:
-                    return result
-                    
-            elif event_type == "message":
-                message_content.append(data.get("answer", ""))
-                
-            elif event_type == "end":
-                result = handle_final_message(data.get("answer", ""))
-                if result:
-                    return result
-                message_content.append(data.get("answer", ""))
-                
-        except json.JSONDecodeError:
-            continue
+    def on_agent_thought(data: Dict) -> Optional[Dict]:
+        return handle_thought_content(data.get("thought", ""))
 
-    # If we have message content but no JSON was found
-    if message_content:
-        return {"type": "text", "message": "".join(message_content)}
+    def on_message(data: Dict) -> None:
+        message_content.append(data.get("answer", ""))
 
-    return None
+    def on_end(data: Dict) -> Optional[Dict]:
+        result = handle_final_message(data.get("answer", ""))
+        if result:
+            return result
+        message_content.append(data.get("answer", ""))
+        return None
 
+    def finish() -> Optional[Dict]:
+        # If we have message content but no JSON was found
+        if message_content:
+            return {"type": "text", "message": "".join(message_content)}
 
+        return None
+
+    return {
+        "agent_thought": on_agent_thought,
+        "message": on_message,
+        "end": on_end,
+    }, finish
+
+
+@fast_path_intent("monitor", match_monitoring_intent)
+@cached_intent("monitor")
 @handle_dify_api_errors
-def send_metrics_to_dify(metrics: dict) -> dict:
+async def async_parse_monitoring_intent(message: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
     """
-    Send monitoring metrics to Dify's MonitorBot API for analysis
+    Parse monitoring requests using Dify API
+    Returns a dictionary containing:
+    - metric: The name of the metric to query
+    - hours: Time range for the query (in hours)
+    - query_type: 'current', 'range', or 'custom'
+    Or for non-monitoring queries:
+    - type: 'help' or other type
+    - message: The response message
+    """
+    response = await async_make_dify_request(
+        DIFY_MONITOR_BOT_API_KEY, message, bot="monitor", hedge=LLM_HEDGE_INTENTS, deadline=deadline
+    )
 
-    Args:
-        metrics (dict): The metrics data from Prometheus
+    if response.status_code != 200:
+        error_text = await _async_error_text(response)
+        logger.error(f"Error from Dify API: {error_text}")
+        return {"error": error_text}
 
-    Returns:
-        dict: The analyzed response from Dify's MonitorBot
-    """
-    try:
-        def format_range_metrics(metrics_data: dict) -> tuple[str, str]:
-            series = metrics_data["data"]["result"][0]
-            metric_name = series["metric"].get("__name__", "unknown")
-            values = series["values"]
-
-            formatted_metrics = {
-                "metric_name": metric_name,
-                "values": [
-                    {
-                        "timestamp": value[0],
-                        "value": (
-                            float(value[1]) / 1024 / 1024
-                            if "bytes" in metric_name.lower()
-                            else float(value[1])
-                        ),
-                    }
-                    for value in values
-                ],
-            }
-            metrics_json = json.dumps(formatted_metrics)
-            query = f"Please analyze these monitoring metrics over time and provide insights: {metrics_json}"
-            return metrics_json, query
-
-        def format_instant_metrics(metrics_data: dict) -> tuple[str, str]:
-            metrics_json = json.dumps(metrics_data)
-            query = f"Please analyze these monitoring metrics and provide insights: {metrics_json}"
-            return metrics_json, query
-
-        def process_dify_response(response) -> list:
-            analysis = []
-            for line in response.iter_lines():
-                if not line:
-                    continue
-                    
-                line_str = line.decode("utf-8").replace("data: ", "")
-                try:
-                    data = json.loads(line_str)
-                    event_type = data.get("event")
-                    
-                    if event_type == "message":
-                        current = data.get("answer", "")
-                        if current:
-                            analysis.append(current)
-                    elif event_type == "agent_thought":
-                        thought = data.get("thought", "")
-                        if thought:
-                            analysis.append(thought)
-                    elif event_type == "end":
-                        final_answer = data.get("answer", "")
-                        if final_answer:
-                            analysis.append(final_answer)
-                except json.JSONDecodeError:
-                    continue
-            return analysis
+    handlers, finish = _monitoring_intent_reader(message)
+    return await async_stream_dify_events(response, handlers, deadline) or finish()
 
-        # Format metrics based on type
-        if metrics.get("data", {}).get("resultType") == "matrix" and metrics.get("data", {}).get("result"):
-            metrics_json, query = format_range_metrics(metrics)
-        else:
-            metrics_json, query = format_instant_metrics(metrics)
 
-        response = make_dify_request(DIFY_MONITOR_BOT_API_KEY, query)
-        
-        if response.status_code != 200:
-            logger.error(f"Error from Dify API: {response.text}")
-            return {
-                "analysis": f"Error from Dify API: {response.text}",
+def parse_monitoring_intent(message: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """Blocking form of async_parse_monitoring_intent, for worker threads"""
+    return run_sync(async_parse_monitoring_intent(message, deadline))
+
+
+def build_analysis_query(metrics: dict) -> str:
+    """
+    Build the analysis prompt sent to Dify's MonitorBot
+
+    Range results are downsampled and compactly encoded so long windows
+    don't blow up the prompt; instant results are sent as-is.
+    """
+    def format_range_metrics(metrics_data: dict) -> str:
+        series = [as_series(item) for item in metrics_data["data"]["result"]]
+        summaries = rank_by_peak(summarize(series))[:METRICS_PROMPT_MAX_SERIES]
+        if not summaries:
+            return format_instant_metrics(metrics_data)
+
+        primary = series[summaries[0].index]
+        metric_name = primary.name
+        unit, divisor = display_unit(metric_name)
+
+        formatted_metrics = {
+            "metric_name": metric_name,
+            "unit": unit,
+            **encode_series(
+                primary.timestamps.tolist(),
+                (primary.values / divisor).tolist(),
+                max_points=METRICS_PROMPT_MAX_POINTS,
+                precision=METRICS_PROMPT_PRECISION,
+            ),
+            "stats": summaries[0].scaled(divisor).rounded(METRICS_PROMPT_PRECISION),
+        }
+        if len(series) > 1:
+            formatted_metrics["labels"] = primary.metric
+            formatted_metrics["series_count"] = len(series)
+            formatted_metrics["other_series"] = [
+                {"labels": summary.metric, "stats": summary.scaled(divisor).rounded(METRICS_PROMPT_PRECISION)}
+                for summary in summaries[1:]
+            ]
+        metrics_json = json.dumps(formatted_metrics, separators=(",", ":"))
+        return (
+            "Please analyze these monitoring metrics over time and provide insights. "
+            "Sample i was taken at start + offsets[i] * step seconds (Unix time), "
+            "or start + i * step when offsets is absent; the series was downsampled "
+            "from `points` samples keeping its shape. stats summarise the full series "
+            "(slope_per_hour is the linear trend); other_series are the next series "
+            f"by peak value: {metrics_json}"
+        )
+
+    def format_instant_metrics(metrics_data: dict) -> str:
+        metrics_json = json.dumps(render_series_result(metrics_data))
+        return f"Please analyze these monitoring metrics and provide insights: {metrics_json}"
+
+    if metrics.get("data", {}).get("resultType") == "matrix" and metrics.get("data", {}).get("result"):
+        return format_range_metrics(metrics)
+    return format_instant_metrics(metrics)
+
+
+def _analysis_reader(
+    on_chunk: Optional[Callable[[str], None]]
+) -> Tuple[Dict[str, Callable], list]:
+    """Stream handlers collecting analysis chunks into the returned list"""
+    analysis = []
+
+    def collect(field: str) -> Callable[[Dict], None]:
+        def handler(data: Dict) -> None:
+            content = data.get(field, "")
+            if content:
+                analysis.append(content)
+                if on_chunk:
+                    on_chunk("\n".join(analysis))
+        return handler
+
+    return {
+        "message": collect("answer"),
+        "agent_thought": collect("thought"),
+        "end": collect("answer"),
+    }, analysis
+
+
+def _cached_analysis(metrics: dict) -> Tuple[Optional[str], Optional[dict]]:
+    """The metrics fingerprint, and the cached result for it if there is one"""
+    fingerprint = metrics_fingerprint(metrics, ANALYSIS_CACHE_SIGNIFICANT_DIGITS)
+    if fingerprint:
+        cached_analysis = analysis_cache.get(fingerprint)
+        if cached_analysis is not None:
+            logger.info(f"Reusing cached analysis for metrics fingerprint {fingerprint[:12]}")
+            return fingerprint, {
+                "analysis": cached_analysis,
                 "raw_metrics": metrics,
+                "cached": True,
             }
+    return fingerprint, None
+
+
+def _screened_analysis(metrics: dict) -> Optional[dict]:
+    """A templated analysis if the local pre-screen finds the metrics nominal"""
+    if not ANOMALY_SCREEN_ENABLED:
+        return None
+    result = anomaly_screen.screen(metrics)
+    if not result.nominal:
+        logger.debug(f"Anomaly pre-screen: {result.outcome} {result.breaches}, sending metrics to Dify")
+        return None
+    logger.info("Anomaly pre-screen found metrics nominal; skipping Dify")
+    return {
+        "analysis": nominal_analysis(result),
+        "raw_metrics": metrics,
+        "screened": True,
+    }
 
-        # Process streaming response
-        analysis = process_dify_response(response)
-        final_analysis = "\n".join(analysis) if analysis else "No analysis available"
 
+def _analysis_result(
+    metrics: dict, analysis: list, fingerprint: Optional[str], partial: bool = False
+) -> dict:
+    final_analysis = "\n".join(analysis) if analysis else "No analysis available"
+    if partial:
+        # Cut short by the request deadline; don't serve it to later requests
         return {
             "analysis": final_analysis,
             "raw_metrics": metrics,
+            "partial": True,
         }
+    if analysis and fingerprint:
+        analysis_cache.set(fingerprint, final_analysis)
+
+    return {
+        "analysis": final_analysis,
+        "raw_metrics": metrics,
+    }
+
+
+async def _analyze_metrics(
+    metrics: dict,
+    fingerprint: Optional[str],
+    on_chunk: Optional[Callable[[str], None]] = None,
+    deadline: Optional[Deadline] = None,
+) -> dict:
+    query = build_analysis_query(metrics)
+    response = await async_make_dify_request(
+        DIFY_MONITOR_BOT_API_KEY, query, bot="monitor", deadline=deadline
+    )
+
+    if response.status_code != 200:
+        error_text = await _async_error_text(response)
+        logger.error(f"Error from Dify API: {error_text}")
+        return {
+            "analysis": f"Error from Dify API: {error_text}",
+            "raw_metrics": metrics,
+        }
+
+    # Process streaming response
+    handlers, analysis = _analysis_reader(on_chunk)
+    await async_stream_dify_events(response, handlers, deadline)
+    return _analysis_result(metrics, analysis, fingerprint, partial=deadline_expired(deadline))
+
+
+async def _shared_analysis(
+    metrics: dict, fingerprint: str, on_chunk: Optional[Callable[[str], None]], deadline: Optional[Deadline]
+) -> dict:
+    """
+    Analyze the metrics, sharing one Dify call with callers asking about the same metrics at once
+
+    Every caller's on_chunk gets the streamed analysis, whichever caller
+    runs the call. A caller that joins late misses no text, since each
+    chunk carries the analysis so far. The shared call runs on the first
+    caller's deadline, so later callers get what it received in that time,
+    or give up at their own deadline if that comes first.
+    """
+    listeners = analysis_listeners.setdefault(fingerprint, [])
+    if on_chunk:
+        listeners.append(on_chunk)
+
+    def broadcast(analysis: str):
+        for listener in list(listeners):
+            try:
+                listener(analysis)
+            except Exception as e:
+                logger.warning(f"Analysis chunk listener failed: {str(e)}")
+
+    try:
+        return await analysis_flights.do(
+            fingerprint, lambda: _analyze_metrics(metrics, fingerprint, broadcast, deadline), deadline
+        )
+    finally:
+        if on_chunk:
+            listeners.remove(on_chunk)
+        if not listeners and analysis_listeners.get(fingerprint) is listeners:
+            del analysis_listeners[fingerprint]
+
+
+@handle_dify_api_errors
+async def async_send_metrics_to_dify(
+    metrics: dict,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    deadline: Optional[Deadline] = None,
+) -> dict:
+    """
+    Send monitoring metrics to Dify's MonitorBot API for analysis
+
+    Args:
+        metrics (dict): The metrics data from Prometheus
+        on_chunk (Callable, optional): Called with the analysis so far each
+            time a new chunk arrives, for progressive display; it runs on
+            the event loop and must not block
+        deadline (Deadline, optional): Budget for the request; when it runs
+            out the analysis so far is returned with "partial": True
+
+    Returns:
+        dict: The analyzed response from Dify's MonitorBot
+    """
+    try:
+        fingerprint, cached = _cached_analysis(metrics)
+        if cached is not None:
+            return cached
+        screened = _screened_analysis(metrics)
+        if screened is not None:
+            return screened
+        if not fingerprint:
+            return await _analyze_metrics(metrics, fingerprint, on_chunk, deadline)
+
+        return await _shared_analysis(metrics, fingerprint, on_chunk, deadline)
 
     except Exception as e:
         logger.error(f"Error sending metrics to Dify: {str(e)}")
@@ -439,3 +739,8 @@ def send_metrics_to_dify(metrics: dict) -> dict:
             "analysis": f"Error analyzing metrics: {str(e)}",
             "raw_metrics": metrics,
         }
+
+
+def send_metrics_to_dify(metrics: dict, deadline: Optional[Deadline] = None) -> dict:
+    """Blocking form of async_send_metrics_to_dify, for worker threads"""
+    return run_sync(async_send_metrics_to_dify(metrics, deadline=deadline))
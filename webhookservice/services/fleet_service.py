@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import re
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config.settings import (
+    ANOMALY_MIN_SPREAD,
+    ANOMALY_Z_THRESHOLD,
+    FLEET_CPU_WARN_PERCENT,
+    FLEET_SERVICES,
+    FLEET_SWEEP_WORKERS,
+    PROMETHEUS_SCRAPE_INTERVAL,
+)
+from webhookservice.services.prometheus_service import (
+    AsyncPrometheusService,
+    MetricsSnapshot,
+    duration,
+    rate_window,
+    snapshot_query,
+)
+from webhookservice.utils.anomaly import robust_z
+from webhookservice.utils.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+# Per-service metrics, for services exporting the standard process_* collectors under a prefix
+METRIC_TEMPLATES = {
+    "cpu_usage": "rate({prefix}_cpu_seconds_total{{{selector}}}[{window}]) * 100",
+    "memory_usage": "{prefix}_resident_memory_bytes{{{selector}}}",
+    "up": "up{{{selector}}}",
+}
+
+# Issues that rank a service above any amount of load, most severe first
+OUTAGE_ISSUES = ("down", "no data")
+
+# How each metric is combined across the targets of one job
+METRIC_AGGREGATIONS = {"cpu_usage": "sum", "memory_usage": "sum", "up": "min"}
+
+DEFAULT_SERVICES = [{"name": "todo", "job": "local_service", "metric_prefix": "todo_process"}]
+
+# A sweep is an instant query, so its rate() window is the one for a scrape-interval step
+RATE_WINDOW = duration(rate_window(PROMETHEUS_SCRAPE_INTERVAL))
+
+
+@dataclass
+class ServiceTarget:
+    """A service in the sweep registry"""
+
+    name: str
+    job: str
+    metric_prefix: str = "process"
+    # PromQL keyed by metric, replacing the templates; such services are queried on their own
+    queries: Dict[str, str] = field(default_factory=dict)
+
+    def metric_queries(self) -> Dict[str, str]:
+        if self.queries:
+            return dict(self.queries)
+        selector = f"job={json.dumps(self.job)}"
+        return {
+            key: template.format(prefix=self.metric_prefix, selector=selector, window=RATE_WINDOW)
+            for key, template in METRIC_TEMPLATES.items()
+        }
+
+
+def check_registry(services: List[ServiceTarget]):
+    """
+    Reject template services sharing a job and metric prefix
+
+    They read the same series, and a grouped query returns one row per
+    job, so all but one of them would silently drop out of the sweep.
+    """
+    seen: Dict[tuple, str] = {}
+    for service in services:
+        if service.queries:
+            continue
+        key = (service.job, service.metric_prefix)
+        if key in seen:
+            raise ValueError(
+                f"Services {seen[key]!r} and {service.name!r} both use job {service.job!r} "
+                f"with metric prefix {service.metric_prefix!r}"
+            )
+        seen[key] = service.name
+
+
+def parse_service_registry(config: str) -> List[ServiceTarget]:
+    """Services from a JSON list of {"name", "job", "metric_prefix", "queries"}, or the defaults"""
+    entries = json.loads(config) if config else DEFAULT_SERVICES
+    services = [
+        ServiceTarget(
+            name=entry["name"],
+            job=entry.get("job", entry["name"]),
+            metric_prefix=entry.get("metric_prefix", "process"),
+            queries=entry.get("queries", {}),
+        )
+        for entry in entries
+    ]
+    check_registry(services)
+    return services
+
+
+SERVICE_REGISTRY = parse_service_registry(FLEET_SERVICES)
+
+# Shared by every sweep, so however large the fleet, Prometheus sees at most
+# FLEET_SWEEP_WORKERS sweep queries at once; one per event loop
+_sweep_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def sweep_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = _sweep_slots.get(loop)
+    if slots is None:
+        slots = _sweep_slots[loop] = asyncio.Semaphore(FLEET_SWEEP_WORKERS)
+    return slots
+
+
+def group_queries(prefix: str, jobs: List[str]) -> Dict[str, str]:
+    """One query per metric covering every job with the same metric prefix, grouped by job"""
+    selector = f"job=~{json.dumps('|'.join(re.escape(job) for job in jobs))}"
+    return {
+        key: f"{METRIC_AGGREGATIONS[key]} by (job) ({template.format(prefix=prefix, selector=selector, window=RATE_WINDOW)})"
+        for key, template in METRIC_TEMPLATES.items()
+    }
+
+
+@dataclass
+class ServiceHealth:
+    """One service's metrics in a sweep and how bad they look"""
+
+    name: str
+    job: str
+    up: Optional[float] = None
+    cpu_usage: Optional[float] = None
+    memory_usage: Optional[float] = None
+    memory_z: Optional[float] = None  # Against the rest of the fleet
+    issues: List[str] = field(default_factory=list)
+    badness: float = 0.0  # Load score, 1.0 and above is flagged
+
+    @property
+    def healthy(self) -> bool:
+        return not self.issues
+
+    @property
+    def outage(self) -> bool:
+        """Down or silent, rather than just under load"""
+        return any(issue in OUTAGE_ISSUES for issue in self.issues)
+
+
+@dataclass
+class SweepResult:
+    services: List[ServiceHealth]  # Worst first
+    queries: int  # Prometheus requests the sweep took
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def flagged(self) -> List[ServiceHealth]:
+        return [service for service in self.services if not service.healthy]
+
+
+def assess(services: List[ServiceHealth]) -> List[ServiceHealth]:
+    """
+    Flag and rank services, worst first
+
+    A service that is down or reports nothing ranks above any other. CPU
+    is judged against FLEET_CPU_WARN_PERCENT, and memory against the rest
+    of the fleet, as a robust z-score, since services have no common memory
+    limit.
+    """
+    memory = np.array([s.memory_usage for s in services if s.memory_usage is not None], dtype=np.float64)
+    if len(memory) >= 3:
+        scores = robust_z(memory, memory, ANOMALY_MIN_SPREAD)
+        for service, z in zip((s for s in services if s.memory_usage is not None), scores.tolist()):
+            service.memory_z = z
+
+    for service in services:
+        if service.up is None and service.cpu_usage is None and service.memory_usage is None:
+            service.issues.append("no data")
+            continue
+        if service.up is not None and service.up < 1:
+            service.issues.append("down")
+            continue
+        cpu = (service.cpu_usage or 0.0) / FLEET_CPU_WARN_PERCENT
+        memory_score = (service.memory_z or 0.0) / ANOMALY_Z_THRESHOLD
+        service.badness = max(cpu, memory_score, 0.0)
+        if cpu >= 1:
+            service.issues.append("high CPU")
+        if memory_score >= 1:
+            service.issues.append("memory outlier")
+
+    def rank(service: ServiceHealth):
+        outage = next((i for i, issue in enumerate(OUTAGE_ISSUES) if issue in service.issues), len(OUTAGE_ISSUES))
+        return outage, -service.badness
+
+    return sorted(services, key=rank)
+
+
+class FleetService:
+    """
+    Health sweep across every service in the registry
+
+    Services using the metric templates are grouped by metric prefix and
+    each group is read with a single instant query, whatever its size;
+    services with their own queries are read one query each. All of these
+    run concurrently, up to FLEET_SWEEP_WORKERS at a time.
+    """
+
+    def __init__(
+        self, registry: Optional[List[ServiceTarget]] = None, prometheus: Optional[AsyncPrometheusService] = None
+    ):
+        if registry is not None:
+            check_registry(registry)
+        self.registry = SERVICE_REGISTRY if registry is None else registry
+        self.prometheus = prometheus or AsyncPrometheusService()
+
+    async def _read(self, queries: Dict[str, str], deadline: Optional[Deadline]) -> MetricsSnapshot:
+        async with sweep_slots():
+            result = await self.prometheus.query(snapshot_query(queries), deadline=deadline)
+        return MetricsSnapshot.from_result(result, list(queries))
+
+    async def _read_group(
+        self, prefix: str, services: List[ServiceTarget], deadline: Optional[Deadline]
+    ) -> List[ServiceHealth]:
+        snapshot = await self._read(group_queries(prefix, [s.job for s in services]), deadline)
+        by_job = {s.job: ServiceHealth(s.name, s.job) for s in services}
+        for key, samples in snapshot.samples.items():
+            for sample in samples:
+                health = by_job.get(sample.labels.get("job"))
+                if health is not None:
+                    setattr(health, key, sample.value)
+        return list(by_job.values())
+
+    async def _read_service(self, service: ServiceTarget, deadline: Optional[Deadline]) -> List[ServiceHealth]:
+        snapshot = await self._read(service.metric_queries(), deadline)
+        health = ServiceHealth(service.name, service.job)
+        for key in ("up", "cpu_usage", "memory_usage"):
+            setattr(health, key, snapshot.first(key))
+        return [health]
+
+    async def sweep(self, deadline: Optional[Deadline] = None) -> SweepResult:
+        groups: Dict[str, List[ServiceTarget]] = {}
+        custom = []
+        for service in self.registry:
+            if service.queries:
+                custom.append(service)
+            else:
+                groups.setdefault(service.metric_prefix, []).append(service)
+
+        tasks = [(services, self._read_group, (prefix, services)) for prefix, services in groups.items()]
+        tasks += [([service], self._read_service, (service,)) for service in custom]
+
+        healths, errors = [], []
+        results = await asyncio.gather(*(read(*args, deadline) for _, read, args in tasks), return_exceptions=True)
+        for (services, _, _), result in zip(tasks, results):
+            if isinstance(result, BaseException):
+                names = ", ".join(s.name for s in services)
+                logger.error(f"Sweep query for {names} failed: {str(result)}")
+                errors.append(f"{names}: {str(result)}")
+                # Reported as having no data, rather than dropped from the sweep
+                healths.extend(ServiceHealth(s.name, s.job) for s in services)
+            else:
+                healths.extend(result)
+
+        return SweepResult(assess(healths), queries=len(tasks), errors=errors)
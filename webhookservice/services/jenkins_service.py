@@ -1,7 +1,10 @@
-import requests
-from config.settings import JENKINS_URL, JENKINS_USER, JENKINS_TOKEN
+from config.settings import JENKINS_URL, JENKINS_USER, JENKINS_TOKEN, JENKINS_REQUEST_TIMEOUT
+from webhookservice.utils.async_http_client import async_request, run_sync
+from webhookservice.utils.deadline import Deadline, hop_timeout
+from webhookservice.utils.single_flight import get_single_flight
 from dataclasses import dataclass
 from typing import Optional, Dict, Any
+import base64
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -16,13 +19,29 @@ class BuildResponse:
     data: Optional[Dict[str, Any]] = None
 
 
-class JenkinsService:
+def build_params(branch: str, environment: str, channel: str) -> Dict[str, str]:
+    return {
+        "branch": branch,
+        "environment": environment,
+        "SLACK_CHANNEL": channel,
+    }
+
+
+class AsyncJenkinsService:
+    """Jenkins remote access API client on the pooled aiohttp session"""
+
     def __init__(self, url: str, user: str, token: str):
         self.url = url.rstrip("/")
-        self.auth = (user, token)
-
-    def trigger_build(
-        self, branch: str, environment: str, channel: str = "#chatops"
+        credentials = base64.b64encode(f"{user}:{token}".encode("utf-8")).decode("ascii")
+        self.headers = {"Authorization": f"Basic {credentials}"}
+        self.flights = get_single_flight("jenkins")
+
+    async def trigger_build(
+        self,
+        branch: str,
+        environment: str,
+        channel: str = "#chatops",
+        deadline: Optional[Deadline] = None,
     ) -> BuildResponse:
         try:
             logger.info(f"Attempting to trigger Jenkins build with parameters:")
@@ -31,24 +50,29 @@ class JenkinsService:
             logger.info(f"- Channel: {channel}")
             logger.info(f"- Jenkins URL: {self.url}")
 
-            params = {
-                "branch": branch,
-                "environment": environment,
-                "SLACK_CHANNEL": channel,
-            }
+            params = build_params(branch, environment, channel)
 
             logger.info(
                 f"Sending POST request to {self.url}/buildWithParameters with params: {params}"
             )
-            response = requests.post(
-                f"{self.url}/buildWithParameters", params=params, auth=self.auth
+            response = await async_request(
+                "jenkins",
+                "POST",
+                f"{self.url}/buildWithParameters",
+                params=params,
+                headers=self.headers,
+                timeout=hop_timeout(deadline, JENKINS_REQUEST_TIMEOUT),
             )
+            try:
+                response_text = await response.text()
+            finally:
+                response.close()
 
             logger.info(f"Jenkins API response status code: {response.status_code}")
-            logger.info(f"Jenkins API response text: {response.text}")
+            logger.info(f"Jenkins API response text: {response_text}")
 
             if response.status_code in (200, 201):
-                build_number = self.get_last_build_number()
+                build_number = await self.get_last_build_number(deadline)
                 logger.info(
                     f"Build triggered successfully. Build number: {build_number}"
                 )
@@ -71,42 +95,89 @@ class JenkinsService:
             logger.error(error_msg, exc_info=True)
             return BuildResponse(success=False, build_number=None, message=error_msg)
 
-    def get_last_build_number(self):
+    async def _get_json(
+        self, api_url: str, deadline: Optional[Deadline] = None, coalesce: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        GET a Jenkins JSON API
+
+        Concurrent polls of the same URL share one request, unless
+        `coalesce` is False: a read that must see the caller's own write
+        cannot join a request that started before it.
+        """
+
+        async def fetch():
+            response = await async_request(
+                "jenkins", "GET", api_url, headers=self.headers, timeout=hop_timeout(deadline, JENKINS_REQUEST_TIMEOUT)
+            )
+            try:
+                return await response.json() if response.status_code == 200 else None
+            finally:
+                response.close()
+
+        return await self.flights.do(api_url, fetch, deadline) if coalesce else await fetch()
+
+    async def get_last_build_number(self, deadline: Optional[Deadline] = None):
         """Get the last build number from Jenkins"""
         try:
-            api_url = f"{self.url}/lastBuild/api/json"
-            response = requests.get(api_url, auth=self.auth)
-            if response.status_code == 200:
-                return response.json().get("number")
-            return None
+            # Read right after our own buildWithParameters POST; a shared
+            # in-flight read could predate it and return someone else's build
+            build_info = await self._get_json(f"{self.url}/lastBuild/api/json", deadline, coalesce=False)
+            return build_info.get("number") if build_info is not None else None
         except Exception as e:
             logger.error(f"Error getting last build number: {e}")
             return None
 
-    def monitor_build_status(self, build_number, channel_id, branch, environment):
+    async def monitor_build_status(self, build_number, channel_id, branch, environment):
         """Monitor build status"""
         try:
-            api_url = f"{self.url}/{build_number}/api/json"
-            response = requests.get(api_url, auth=self.auth)
-            if response.status_code == 200:
-                build_info = response.json()
-                return build_info.get("result")
-            return None
+            build_info = await self._get_json(f"{self.url}/{build_number}/api/json")
+            return build_info.get("result") if build_info is not None else None
         except Exception as e:
             logger.error(f"Error monitoring build status: {e}")
             return None
 
 
+class JenkinsService:
+    """Blocking interface to AsyncJenkinsService, for worker threads"""
+
+    def __init__(self, url: str, user: str, token: str):
+        self.service = AsyncJenkinsService(url, user, token)
+
+    def trigger_build(
+        self,
+        branch: str,
+        environment: str,
+        channel: str = "#chatops",
+        deadline: Optional[Deadline] = None,
+    ) -> BuildResponse:
+        return run_sync(self.service.trigger_build(branch, environment, channel, deadline))
+
+    def get_last_build_number(self, deadline: Optional[Deadline] = None):
+        return run_sync(self.service.get_last_build_number(deadline))
+
+    def monitor_build_status(self, build_number, channel_id, branch, environment):
+        return run_sync(self.service.monitor_build_status(build_number, channel_id, branch, environment))
+
+
 # Create a singleton instance for global use
+async_jenkins_service = AsyncJenkinsService(JENKINS_URL, JENKINS_USER, JENKINS_TOKEN)
 jenkins_service = JenkinsService(JENKINS_URL, JENKINS_USER, JENKINS_TOKEN)
 
 
 # Function-based interface for backward compatibility
-def trigger_jenkins_build(
-    branch: str, environment: str, channel: str = "#chatops"
+async def async_trigger_jenkins_build(
+    branch: str, environment: str, channel: str = "#chatops", deadline: Optional[Deadline] = None
 ) -> BuildResponse:
     """Trigger Jenkins build with parameters"""
-    return jenkins_service.trigger_build(branch, environment, channel)
+    return await async_jenkins_service.trigger_build(branch, environment, channel, deadline)
+
+
+def trigger_jenkins_build(
+    branch: str, environment: str, channel: str = "#chatops", deadline: Optional[Deadline] = None
+) -> BuildResponse:
+    """Blocking form of async_trigger_jenkins_build"""
+    return run_sync(async_trigger_jenkins_build(branch, environment, channel, deadline))
 
 
 def get_last_build_number():
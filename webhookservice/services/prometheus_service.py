@@ -1,198 +1,801 @@
-import requests
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
-from config.settings import PROMETHEUS_BASE_URL
+import asyncio
+import json
+import math
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+from config.settings import (
+    PROMETHEUS_BASE_URL,
+    PROMETHEUS_MAX_POINTS_PER_SERIES,
+    PROMETHEUS_MAX_SERIES,
+    PROMETHEUS_REQUEST_TIMEOUT,
+    PROMETHEUS_SCRAPE_INTERVAL,
+    PROMETHEUS_SNAPSHOT_METRICS,
+    PROMETHEUS_STREAM_CHUNK_SIZE,
+    PROMQL_EVAL_TIMEOUT,
+    PROMQL_MAX_COST,
+    PROMQL_MAX_LOOKBACK_DAYS,
+    PROMQL_MAX_POINTS_PER_SERIES,
+    PROMQL_MAX_RANGE_HOURS,
+    PROMQL_MAX_SERIES,
+    PREWARM_MAX_STALENESS,
+    PREWARM_RANGE_QUERIES,
+    RANGE_CACHE_MAXSIZE,
+    RANGE_CHUNK_POINTS,
+    RANGE_CHUNK_WORKERS,
+    RANGE_DEFAULT_MAX_POINTS,
+    RANGE_EXPORT_MAX_POINTS,
+    RANGE_STATS_MAX_CHUNKS,
+    RANGE_STATS_MAX_HOURS,
+    RANGE_STATS_MAX_POINTS,
+    RANGE_SUMMARY_MAX_POINTS,
+    SERIES_STORE_MAXSIZE,
+    SKETCH_RELATIVE_ACCURACY,
+)
+from webhookservice.utils.anomaly import metric_baselines
+from webhookservice.utils.cache import BoundedTTLCache
+from webhookservice.utils.async_http_client import async_request, run_sync
+from webhookservice.utils.deadline import Deadline, hop_timeout
+from webhookservice.utils.prometheus_stream import PrometheusStreamDecoder
+from webhookservice.utils.promql_guard import GuardedQuery, QueryRejected, guard_query
+from webhookservice.utils.refresher import BackgroundRefresher
+from webhookservice.utils.series import TimeSeries, as_series
+from webhookservice.utils.series_stats import SeriesSummary
+from webhookservice.utils.sketch import RunningSummary
+from webhookservice.utils.series_store import SeriesStore
+from webhookservice.utils.single_flight import get_single_flight
 import logging
 
+# Metrics in a process snapshot, keyed by the result field they fill
+DEFAULT_SNAPSHOT_METRICS = {
+    # Calculate rate over 1 minute and convert to percentage
+    "cpu_usage": "rate(todo_process_cpu_seconds_total[1m]) * 100",
+    "memory_usage": "todo_process_resident_memory_bytes",
+}
+
+# Label that tells the series of a combined snapshot query apart
+SNAPSHOT_LABEL = "snapshot_metric"
+
+
+def parse_snapshot_metrics(config: str) -> Dict[str, str]:
+    """Snapshot metrics from a JSON object of result field to PromQL, or the defaults"""
+    if not config:
+        return dict(DEFAULT_SNAPSHOT_METRICS)
+    return dict(json.loads(config))
+
+
+SNAPSHOT_METRICS = parse_snapshot_metrics(PROMETHEUS_SNAPSHOT_METRICS)
+
+
+def process_metric_queries(metric_name: Optional[str]) -> Dict[str, str]:
+    """
+    PromQL queries behind get_process_metrics, keyed by the result field they fill
+
+    A name selects the snapshot metrics whose field starts with it ("cpu"
+    for "cpu_usage") or whose query uses it as the raw metric name. 'all',
+    'up', None and unknown names query every metric.
+    """
+    logger = logging.getLogger(__name__)
+    name = (metric_name or "").lower()
+    if name and name not in ["all", "up"]:
+        selected = {
+            key: query
+            for key, query in SNAPSHOT_METRICS.items()
+            if key == name or key.split("_")[0] == name or name in query
+        }
+        if selected:
+            logger.debug(f"Resolved metric name {metric_name} to {list(selected)}")
+            return selected
+
+    logger.debug("Querying all metrics")
+    return dict(SNAPSHOT_METRICS)
+
+
+def snapshot_query(queries: Dict[str, str]) -> str:
+    """
+    Combine several queries into one instant query
+
+    Each query's series are tagged with SNAPSHOT_LABEL, so `or` keeps them
+    all and the results can be split apart again. A single query is sent
+    as it is.
+    """
+    if len(queries) == 1:
+        return next(iter(queries.values()))
+    return " or ".join(
+        f"label_replace({query}, {json.dumps(SNAPSHOT_LABEL)}, {json.dumps(key)}, \"\", \"\")"
+        for key, query in queries.items()
+    )
+
+
+@dataclass
+class MetricSample:
+    """One series of a snapshot"""
+
+    labels: Dict[str, str]
+    timestamp: float
+    value: float
+
+
+@dataclass
+class MetricsSnapshot:
+    """Every series of every snapshot metric at one point in time"""
+
+    samples: Dict[str, List[MetricSample]] = field(default_factory=dict)
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any], keys: List[str]) -> "MetricsSnapshot":
+        """Split a combined snapshot query result back into its metrics"""
+        snapshot = cls({key: [] for key in keys})
+        for series in result["data"]["result"]:
+            labels = dict(series.get("metric", {}))
+            key = labels.pop(SNAPSHOT_LABEL, keys[0] if len(keys) == 1 else None)
+            if key in snapshot.samples:
+                timestamp, value = series["value"]
+                snapshot.samples[key].append(MetricSample(labels, float(timestamp), float(value)))
+        return snapshot
+
+    def first(self, key: str) -> Optional[float]:
+        """Value of the metric's first series, if it has one"""
+        samples = self.samples.get(key)
+        return samples[0].value if samples else None
+
+    @property
+    def timestamp(self) -> Optional[float]:
+        """When the newest sample was taken"""
+        timestamps = [samples[0].timestamp for samples in self.samples.values() if samples]
+        return max(timestamps) if timestamps else None
+
+    def as_metrics(self) -> Dict[str, float]:
+        """The flat {field: value} form returned by get_process_metrics"""
+        return {key: samples[0].value for key, samples in self.samples.items() if samples}
+
+
+# Points returned per series when the caller gives no max_points, by purpose
+RANGE_POINT_BUDGETS = {
+    "summary": RANGE_SUMMARY_MAX_POINTS,  # Slack summary and Dify prompt
+    "default": RANGE_DEFAULT_MAX_POINTS,
+    "export": RANGE_EXPORT_MAX_POINTS,
+}
+
+# Prometheus rejects range queries returning more points than this per series
+PROMETHEUS_MAX_POINTS = 11000
+
+# One cache per step, so a result lives for one step interval: after that
+# the aligned end moves on and the key changes anyway
+range_caches: Dict[int, BoundedTTLCache] = {}
+_range_caches_lock = threading.Lock()
+
+# Samples kept between range queries, so repeated trends only fetch the new tail,
+# re-fetching the last scrape interval in case it was read before ingestion
+series_store = SeriesStore(maxsize=SERIES_STORE_MAXSIZE, overlap=PROMETHEUS_SCRAPE_INTERVAL)
+
+# Shared by every request, so long ranges never put more than RANGE_CHUNK_WORKERS
+# queries on Prometheus at once; one per event loop, as semaphores belong to one
+_chunk_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def chunk_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = _chunk_slots.get(loop)
+    if slots is None:
+        slots = _chunk_slots[loop] = asyncio.Semaphore(RANGE_CHUNK_WORKERS)
+    return slots
+
+
+def range_cache(step: int) -> BoundedTTLCache:
+    with _range_caches_lock:
+        cache = range_caches.get(step)
+        if cache is None:
+            cache = range_caches[step] = BoundedTTLCache(maxsize=RANGE_CACHE_MAXSIZE, ttl=step)
+        return cache
+
+
+def duration(seconds: int) -> str:
+    """PromQL duration for a whole number of seconds, e.g. 60 -> 1m"""
+    return f"{seconds // 60}m" if seconds % 60 == 0 else f"{seconds}s"
+
+
+def range_step(hours: float, max_points: int) -> int:
+    """
+    Step in seconds returning at most `max_points` points over `hours`
+
+    Snapped up to a multiple of the scrape interval; a finer step would
+    only repeat samples.
+    """
+    max_points = min(max(max_points, 2), PROMETHEUS_MAX_POINTS)
+    intervals = math.ceil(hours * 3600 / (max_points - 1) / PROMETHEUS_SCRAPE_INTERVAL)
+    return max(1, intervals) * PROMETHEUS_SCRAPE_INTERVAL
+
+
+def rate_window(step: int) -> int:
+    """
+    rate() window for a step
+
+    At least four scrapes, so there are always enough samples for a rate,
+    and at least a step plus a scrape, so no sample between two points is
+    skipped at coarse steps.
+    """
+    return max(4 * PROMETHEUS_SCRAPE_INTERVAL, step + PROMETHEUS_SCRAPE_INTERVAL)
+
+
+def point_budget(max_points: Optional[int] = None, purpose: Optional[str] = None) -> int:
+    """The caller's max_points, or the budget for its purpose"""
+    if max_points:
+        return max_points
+    return RANGE_POINT_BUDGETS.get(purpose or "default", RANGE_DEFAULT_MAX_POINTS)
+
+
+def _rfc3339(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+@dataclass(frozen=True)
+class RangeQuery:
+    """A query_range request aligned to its step (in seconds)"""
+
+    query: str
+    start: float
+    end: float
+    step: int
+
+    def params(self, start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, str]:
+        """query_range arguments, optionally for only part of the full range"""
+        return {
+            "query": self.query,
+            "start": _rfc3339(self.start if start is None else start),
+            "end": _rfc3339(self.end if end is None else end),
+            "step": duration(self.step),
+        }
+
+    def chunks(self, start: Optional[float] = None, points: int = RANGE_CHUNK_POINTS) -> List[Tuple[float, float]]:
+        """
+        [start, end] pieces of at most `points` samples each
+
+        Pieces are step-aligned and do not overlap, so they return exactly
+        the samples one query over the whole range would.
+        """
+        start = self.start if start is None else start
+        span = max(points - 1, 0) * self.step
+        chunks = []
+        while start <= self.end:
+            end = min(start + span, self.end)
+            chunks.append((start, end))
+            start = end + self.step
+        return chunks
+
+
+def range_query(
+    metric_name: str,
+    hours: float,
+    now: Optional[float] = None,
+    max_points: int = RANGE_DEFAULT_MAX_POINTS,
+    step: Optional[int] = None,
+) -> RangeQuery:
+    """
+    The query_range request behind get_metrics_range
+
+    The step is derived from the point budget, unless given, and the end is
+    aligned down to a step boundary, so every request within the same step
+    interval asks for exactly the same range, and sample timestamps line up
+    between requests.
+    """
+    logger = logging.getLogger(__name__)
+    step = step or range_step(hours, max_points)
+    logger.debug(f"Using step size: {duration(step)}")
+
+    now = time.time() if now is None else now
+    end = now - now % step
+    start = end - round(hours * 3600 / step) * step
+    logger.debug(f"Time range: start={_rfc3339(start)}, end={_rfc3339(end)}")
+
+    # If it's a CPU metric, use rate function
+    if "cpu" in metric_name.lower():
+        query = f"rate({metric_name}[{duration(rate_window(step))}]) * 100"
+    else:
+        query = metric_name
+    logger.debug(f"Prometheus query: {query}")
+
+    return RangeQuery(query, start, end, step)
+
+
+def get_range_cache_stats() -> Dict[str, Dict]:
+    """Hit/miss/eviction counters for every step's range cache"""
+    with _range_caches_lock:
+        caches = dict(range_caches)
+    return {duration(step): cache.stats() for step, cache in sorted(caches.items())}
+
+
+def get_series_store_stats() -> Dict[str, int]:
+    return series_store.stats()
+
+
+def observe_snapshot(snapshot: MetricsSnapshot):
+    """Add a snapshot's values to the metric baselines"""
+    for key, samples in snapshot.samples.items():
+        if samples:
+            metric_baselines.observe(key, samples[0].value, samples[0].timestamp)
+
+
+# The current snapshot and hot range queries, kept warm at the scrape interval
+metrics_refresher = BackgroundRefresher(interval=PROMETHEUS_SCRAPE_INTERVAL, max_stale=PREWARM_MAX_STALENESS)
+SNAPSHOT_REFRESH_KEY = "snapshot"
+
+
+# A quoted PromQL string, or a run of whitespace outside one
+_PROMQL_SPACING = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|\s+')
+
+
+def normalize_promql(query: str) -> str:
+    """The query with whitespace outside string literals collapsed"""
+    return _PROMQL_SPACING.sub(lambda m: m.group(1) or " ", query).strip()
+
+
+def request_key(path: str, params: Dict[str, str]) -> tuple:
+    """What identifies an API request, for sharing identical in-flight ones"""
+    normalized = dict(params)
+    if "query" in normalized:
+        normalized["query"] = normalize_promql(normalized["query"])
+    return (path, tuple(sorted(normalized.items())))
+
+
+def response_summary(result: Dict[str, Any]) -> str:
+    """A one-line description of a decoded response, for logs"""
+    data = result.get("data") or {}
+    series = data.get("result")
+    if not isinstance(series, list):
+        return f"status={result.get('status')} result={series!r}"
+    points = sum(len(item) for item in series if isinstance(item, TimeSeries))
+    summary = f"status={result.get('status')} type={data.get('resultType')} series={len(series)}"
+    if points:
+        summary += f" points={points}"
+    if data.get("truncated"):
+        summary += " truncated"
+    return summary
+
+
+# Series and points per series decoded from the response to an ad-hoc query
+GUARDED_LIMITS = (PROMQL_MAX_SERIES, PROMQL_MAX_POINTS_PER_SERIES)
+DEFAULT_LIMITS = (PROMETHEUS_MAX_SERIES, PROMETHEUS_MAX_POINTS_PER_SERIES)
+
+# What the guard did with ad-hoc queries
+query_guard_stats = {"checked": 0, "rewritten": 0, "rejected": 0}
+
+
+def guard(query: str) -> GuardedQuery:
+    """Check an ad-hoc query against the PROMQL_* limits; raises QueryRejected"""
+    logger = logging.getLogger(__name__)
+    query_guard_stats["checked"] += 1
+    try:
+        guarded = guard_query(
+            query,
+            resolution=PROMETHEUS_SCRAPE_INTERVAL,
+            max_cost=PROMQL_MAX_COST,
+            max_range=PROMQL_MAX_RANGE_HOURS * 3600,
+            max_lookback=PROMQL_MAX_LOOKBACK_DAYS * 86400,
+            max_series=PROMQL_MAX_SERIES,
+        )
+    except QueryRejected as e:
+        query_guard_stats["rejected"] += 1
+        logger.warning(f"Rejected query {query!r}: {str(e)}")
+        raise
+    if guarded.rewrites:
+        query_guard_stats["rewritten"] += 1
+        logger.info(f"Rewrote query {query!r} to {guarded.query!r}")
+    return guarded
+
+
+def guarded_params(guarded: GuardedQuery, time: Optional[str]) -> Dict[str, str]:
+    params = {"query": guarded.query, "timeout": PROMQL_EVAL_TIMEOUT}
+    if time:
+        params["time"] = time
+    return params
+
+
+def annotate(result: Dict[str, Any], guarded: GuardedQuery) -> Dict[str, Any]:
+    """The result with what the guard changed; copied, as coalesced callers share it"""
+    result = dict(result)
+    result["guard"] = {"query": guarded.query, "rewrites": guarded.rewrites, "cost": round(guarded.cost.score)}
+    return result
+
+
+def parse_hot_ranges(config: str) -> List[Dict[str, Any]]:
+    """Hot range queries from a JSON list of {"metric", "hours"[, "purpose"][, "max_points"]}"""
+    if not config:
+        return []
+    return list(json.loads(config))
+
+
+class AsyncPrometheusService:
+    """Prometheus HTTP API client on the pooled aiohttp session"""
 
-class PrometheusService:
     def __init__(self):
         self.base_url = PROMETHEUS_BASE_URL
         self.api_url = f"{self.base_url}/api/v1"
+        self.flights = get_single_flight("prometheus")
+
+    async def _get(
+        self,
+        path: str,
+        params: Dict[str, str],
+        deadline: Optional[Deadline] = None,
+        limits: Tuple[int, int] = DEFAULT_LIMITS,
+    ) -> Dict[str, Any]:
+        """GET an API endpoint; identical concurrent requests share one call"""
+        return await self.flights.do(
+            request_key(path, params) + (limits,), lambda: self._fetch(path, params, deadline, limits), deadline
+        )
+
+    async def _fetch(
+        self,
+        path: str,
+        params: Dict[str, str],
+        deadline: Optional[Deadline] = None,
+        limits: Tuple[int, int] = DEFAULT_LIMITS,
+    ) -> Dict[str, Any]:
+        """GET an API endpoint, decoding the body series by series as it arrives"""
+        logger = logging.getLogger(__name__)
+        logger.debug(f"Querying Prometheus - URL: {self.api_url}/{path}, Params: {params}")
+
+        response = await async_request(
+            "prometheus",
+            "GET",
+            f"{self.api_url}/{path}",
+            params=params,
+            timeout=hop_timeout(deadline, PROMETHEUS_REQUEST_TIMEOUT),
+        )
+        try:
+            logger.debug(f"Prometheus response status: {response.status_code}")
+            response.raise_for_status()
+            decoder = PrometheusStreamDecoder(*limits)
+            async for chunk in response.iter_chunked(PROMETHEUS_STREAM_CHUNK_SIZE):
+                if not decoder.feed(chunk):
+                    break
+            result = decoder.finish()
+        finally:
+            response.close()
+        logger.debug(f"Prometheus response: {response_summary(result)}")
+        return result
 
-    def query(self, query: str, time: Optional[str] = None) -> Dict[str, Any]:
+    async def query(
+        self, query: str, time: Optional[str] = None, deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
         """
         Execute an instant query at a single point in time
         """
         params = {"query": query}
         if time:
             params["time"] = time
+        return await self._get("query", params, deadline)
 
-        logger = logging.getLogger(__name__)
-        logger.debug(
-            f"Querying Prometheus - URL: {self.api_url}/query, Params: {params}"
-        )
-
-        response = requests.get(f"{self.api_url}/query", params=params)
-        logger.debug(f"Prometheus response status: {response.status_code}")
-        logger.debug(f"Prometheus response: {response.text}")
+    async def guarded_query(
+        self, query: str, time: Optional[str] = None, deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute an ad-hoc instant query from a user or the LLM
 
-        response.raise_for_status()
-        return response.json()
+        The query is checked first and may be rejected (QueryRejected) or
+        rewritten; the response is cut to PROMQL_MAX_SERIES series of
+        PROMQL_MAX_POINTS_PER_SERIES points, and Prometheus gives up on it
+        after PROMQL_EVAL_TIMEOUT. The result's "guard" says what was run.
+        """
+        guarded = guard(query)
+        result = await self._get("query", guarded_params(guarded, time), deadline, GUARDED_LIMITS)
+        return annotate(result, guarded)
 
-    def query_range(
-        self, query: str, start: str, end: str, step: str
+    async def query_range(
+        self, query: str, start: str, end: str, step: str, deadline: Optional[Deadline] = None
     ) -> Dict[str, Any]:
         """
         Execute a query over a range of time
         """
-        logger = logging.getLogger(__name__)
         params = {"query": query, "start": start, "end": end, "step": step}
-        logger.debug(
-            f"Querying Prometheus range - URL: {self.api_url}/query_range, Params: {params}"
-        )
+        return await self._get("query_range", params, deadline)
 
-        response = requests.get(f"{self.api_url}/query_range", params=params)
-        logger.debug(f"Prometheus range query response status: {response.status_code}")
-        logger.debug(f"Prometheus range query response: {response.text}")
+    async def get_snapshot(
+        self, queries: Optional[Dict[str, str]] = None, deadline: Optional[Deadline] = None
+    ) -> MetricsSnapshot:
+        """
+        Fetch several metrics with a single instant query
 
-        response.raise_for_status()
-        return response.json()
+        Args:
+            queries: PromQL keyed by result field; defaults to every
+                     configured snapshot metric
+            deadline: Optional request budget
+
+        Returns:
+            MetricsSnapshot: Every series returned for each metric
+        """
+        queries = queries or SNAPSHOT_METRICS
+        result = await self.query(snapshot_query(queries), deadline=deadline)
+        snapshot = MetricsSnapshot.from_result(result, list(queries))
+        observe_snapshot(snapshot)
+        return snapshot
+
+    async def get_current_metrics(
+        self, metric_name: str = None, deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """
+        Current process metrics, served from the pre-warmed snapshot
+
+        The snapshot is at most one scrape interval old, or up to
+        PREWARM_MAX_STALENESS while a refresh runs; it is only fetched for
+        the caller when there is nothing usable cached.
 
-    def get_process_metrics(self, metric_name: str = None) -> Dict[str, Any]:
+        Returns:
+            Dict[str, Any]: The requested metrics plus "fetched_at", the time
+                            the snapshot was taken, and "timestamp", the
+                            Unix time of its samples
+        """
+        logger = logging.getLogger(__name__)
+        try:
+            snapshot, fetched_at = await metrics_refresher.get(SNAPSHOT_REFRESH_KEY, deadline)
+        except Exception as e:
+            logger.error(f"Error getting process metrics: {str(e)}", exc_info=True)
+            return {}
+
+        wanted = process_metric_queries(metric_name)
+        metrics = {key: value for key, value in snapshot.as_metrics().items() if key in wanted}
+        metrics["fetched_at"] = datetime.fromtimestamp(fetched_at).strftime("%Y-%m-%d %H:%M:%S")
+        if snapshot.timestamp is not None:
+            # Lets the anomaly pre-screen leave this sample out of its own baseline
+            metrics["timestamp"] = snapshot.timestamp
+        return metrics
+
+    async def get_process_metrics(
+        self, metric_name: str = None, deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
         """
         Get basic process metrics for the application
 
         Args:
             metric_name: Optional specific metric to query
                         Use 'all' to get all metrics
+            deadline: Optional request budget
 
         Returns:
             Dict[str, Any]: The requested metrics
         """
-        metrics = {}
         logger = logging.getLogger(__name__)
         logger.debug(f"Getting process metrics for: {metric_name}")
 
         try:
-            # Map common metric names to actual Prometheus metrics
-            metric_mapping = {
-                "cpu": "todo_process_cpu_seconds_total",
-                "memory": "todo_process_resident_memory_bytes",
-                "todo_process_cpu_seconds_total": "todo_process_cpu_seconds_total",
-                "todo_process_resident_memory_bytes": "todo_process_resident_memory_bytes",
-            }
-            logger.debug(f"Metric mapping: {metric_mapping}")
-
-            # If metric_name is 'all', 'up', None, or not in our mapping, query all metrics
-            if (
-                not metric_name
-                or metric_name.lower() in ["all", "up"]
-                or metric_name.lower() not in metric_mapping
-            ):
-                logger.debug("Querying all metrics")
-
-                # CPU Usage
-                logger.debug("Querying CPU metric")
-                cpu_query = f'rate({metric_mapping["cpu"]}[1m]) * 100'  # Calculate rate over 1 minute and convert to percentage
-                cpu_result = self.query(cpu_query)
-                logger.debug(f"CPU query result: {cpu_result}")
-
-                if cpu_result["data"]["result"]:
-                    cpu_value = float(cpu_result["data"]["result"][0]["value"][1])
-                    metrics["cpu_usage"] = cpu_value
-                    logger.debug(f"CPU usage: {cpu_value}%")
-                else:
-                    logger.debug("No CPU data found in response")
-
-                # Memory Usage
-                logger.debug("Querying Memory metric")
-                memory_result = self.query(metric_mapping["memory"])
-                logger.debug(f"Memory query result: {memory_result}")
-
-                if memory_result["data"]["result"]:
-                    memory_value = float(memory_result["data"]["result"][0]["value"][1])
-                    metrics["memory_usage"] = memory_value
-                    logger.debug(f"Memory usage: {memory_value} bytes")
-                else:
-                    logger.debug("No memory data found in response")
-
-            else:
-                logger.debug(f"Querying specific metric: {metric_name}")
-                # Convert common names to actual metrics
-                actual_metric = metric_mapping.get(metric_name.lower())
-                logger.debug(f"Resolved metric name: {actual_metric}")
-
-                if actual_metric:
-                    if "cpu" in actual_metric.lower():
-                        query = f"rate({actual_metric}[1m]) * 100"  # Calculate rate over 1 minute and convert to percentage
-                    else:
-                        query = actual_metric
-
-                    result = self.query(query)
-                    logger.debug(f"Query result for {actual_metric}: {result}")
-
-                    if result["data"]["result"]:
-                        value = float(result["data"]["result"][0]["value"][1])
-                        if "cpu" in actual_metric.lower():
-                            metrics["cpu_usage"] = (
-                                value  # Value is already a percentage
-                            )
-                            logger.debug(f"CPU usage: {value}%")
-                        elif "memory" in actual_metric.lower():
-                            metrics["memory_usage"] = value
-                            logger.debug(f"Memory usage: {value} bytes")
-                    else:
-                        logger.debug(f"No data found for metric: {actual_metric}")
-
+            snapshot = await self.get_snapshot(process_metric_queries(metric_name), deadline)
+            metrics = snapshot.as_metrics()
             logger.debug(f"Final metrics: {metrics}")
             return metrics
 
         except Exception as e:
             logger.error(f"Error getting process metrics: {str(e)}", exc_info=True)
-            return metrics
+            return {}
 
-    def get_metrics_range(self, metric_name: str, hours: float = 1.0) -> Dict[str, Any]:
+    async def _query_chunk(self, params: Dict[str, str], deadline: Optional[Deadline]) -> Dict[str, Any]:
+        async with chunk_slots():
+            return await self.query_range(**params, deadline=deadline)
+
+    async def _fetch_chunks(
+        self, request: RangeQuery, start: float, deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[Tuple[float, float, Dict[str, Any]]]:
+        """
+        (chunk start, chunk end, result) for every chunk of the range from `start`, in order
+
+        Up to RANGE_CHUNK_WORKERS chunks are fetched concurrently, and no
+        more than that across all requests; only those are held in memory
+        while the caller consumes the results.
+        """
+        chunks = request.chunks(start)
+        if len(chunks) == 1:
+            yield chunks[0] + (await self.query_range(**request.params(*chunks[0]), deadline=deadline),)
+            return
+
+        chunks = iter(chunks)
+        pending = deque()
+
+        def submit():
+            for chunk_start, chunk_end in chunks:
+                params = request.params(chunk_start, chunk_end)
+                task = asyncio.ensure_future(self._query_chunk(params, deadline))
+                pending.append((chunk_start, chunk_end, task))
+                return
+
+        for _ in range(RANGE_CHUNK_WORKERS):
+            submit()
+        try:
+            while pending:
+                chunk_start, chunk_end, task = pending.popleft()
+                result = await task
+                submit()
+                yield chunk_start, chunk_end, result
+        finally:
+            for _, _, task in pending:
+                task.cancel()
+
+    async def _query_series(self, request: RangeQuery, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Range query result, fetching only what the series store does not hold yet"""
+        step = request.step
+        fetch_start = series_store.missing_start(request.query, step, request.start, request.end)
+        if fetch_start is not None:
+            async for chunk_start, chunk_end, fetched in self._fetch_chunks(request, fetch_start, deadline):
+                series_store.merge(request.query, step, fetched, chunk_start, chunk_end)
+        return series_store.slice(request.query, step, request.start, request.end)
+
+    async def get_metrics_range(
+        self,
+        metric_name: str,
+        hours: float = 1.0,
+        deadline: Optional[Deadline] = None,
+        max_points: Optional[int] = None,
+        purpose: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         Get metric values over a time range
 
         Args:
             metric_name: The name of the metric to query
             hours: Number of hours to look back (can be fractional for minutes)
+            deadline: Optional request budget
+            max_points: Most points wanted per series; the step is derived from it
+            purpose: Used for the point budget when max_points is not given:
+                     'summary', 'default' or 'export'
+
+        Returns:
+            Dict[str, Any]: A query_range style response whose result entries
+                            are TimeSeries; use render_series_result for JSON
         """
         logger = logging.getLogger(__name__)
         logger.debug(f"Getting metrics range for {metric_name} over {hours} hours")
 
-        end = datetime.now()
-        start = end - timedelta(hours=hours)
-        logger.debug(f"Time range: start={start.isoformat()}, end={end.isoformat()}")
-
-        # Adjust step size based on time range
-        if hours <= 1:  # For ranges up to 1 hour
-            step = "15s"  # Use 15-second intervals
-        elif hours <= 6:  # For ranges up to 6 hours
-            step = "1m"  # Use 1-minute intervals
+        request = range_query(metric_name, hours, max_points=point_budget(max_points, purpose))
+        cache = range_cache(request.step)
+        result = cache.get(request)
+        if result is None:
+            result = await self._query_series(request, deadline)
+            cache.set(request, result)
         else:
-            step = "5m"  # Use 5-minute intervals for longer ranges
+            logger.debug(f"Range cache hit: {request}")
+        logger.debug(f"Range result: {result}")
 
-        logger.debug(f"Using step size: {step}")
+        return result
 
-        # If it's a CPU metric, use rate function
-        if "cpu" in metric_name.lower():
-            query = f"rate({metric_name}[1m]) * 100"
-        else:
-            query = metric_name
-        logger.debug(f"Prometheus query: {query}")
-
-        result = self.query_range(
-            query=query,
-            start=start.isoformat("T") + "Z",
-            end=end.isoformat("T") + "Z",
-            step=step,
+    async def summarize_range(
+        self,
+        metric_name: str,
+        hours: float = 1.0,
+        step: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[SeriesSummary]:
+        """
+        Summary statistics of every series over a time range, at full resolution
+
+        The range is fetched in chunks that are folded into running summaries
+        and dropped, so memory does not grow with the length of the range;
+        percentiles come from a mergeable sketch, within
+        SKETCH_RELATIVE_ACCURACY of the exact value.
+
+        Args:
+            metric_name: The name of the metric to query
+            hours: Number of hours to look back, up to RANGE_STATS_MAX_HOURS
+            step: Seconds between samples; defaults to, and is never finer
+                  than, the scrape interval
+            deadline: Optional request budget
+
+        Returns:
+            List[SeriesSummary]: One per series, in the order Prometheus returned them
+
+        Raises:
+            ValueError: If the range is empty, too long, or would take more
+                        than RANGE_STATS_MAX_POINTS points per series or
+                        RANGE_STATS_MAX_CHUNKS chunk queries
+        """
+        if not 0 < hours <= RANGE_STATS_MAX_HOURS:
+            raise ValueError(f"hours must be more than 0 and at most {RANGE_STATS_MAX_HOURS:g}")
+        step = max(step or PROMETHEUS_SCRAPE_INTERVAL, PROMETHEUS_SCRAPE_INTERVAL)
+        request = range_query(metric_name, hours, step=step)
+        points = int((request.end - request.start) // step) + 1
+        if points > RANGE_STATS_MAX_POINTS:
+            raise ValueError(
+                f"{points} points per series is more than the {RANGE_STATS_MAX_POINTS} allowed; use a larger step"
+            )
+        chunks = len(request.chunks())
+        if chunks > RANGE_STATS_MAX_CHUNKS:
+            raise ValueError(
+                f"{chunks} chunk queries is more than the {RANGE_STATS_MAX_CHUNKS} allowed; use a larger step"
+            )
+
+        summaries: Dict[tuple, RunningSummary] = {}
+        async for _, _, fetched in self._fetch_chunks(request, request.start, deadline):
+            for item in fetched.get("data", {}).get("result", []):
+                series = as_series(item)
+                key = tuple(sorted(series.metric.items()))
+                if key not in summaries:
+                    summaries[key] = RunningSummary(series.metric, SKETCH_RELATIVE_ACCURACY)
+                summaries[key].add(series.timestamps, series.values)
+        return [summary.to_summary(index) for index, summary in enumerate(summaries.values()) if summary.count]
+
+
+class PrometheusService:
+    """
+    Blocking interface to AsyncPrometheusService, for worker threads
+
+    Each call runs on the shared event loop, so it shares connections,
+    caches and in-flight requests with the async callers.
+    """
+
+    def __init__(self, service: Optional[AsyncPrometheusService] = None):
+        self.service = service or AsyncPrometheusService()
+
+    def query(self, query: str, time: Optional[str] = None, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        return run_sync(self.service.query(query, time, deadline))
+
+    def guarded_query(
+        self, query: str, time: Optional[str] = None, deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        return run_sync(self.service.guarded_query(query, time, deadline))
+
+    def query_range(
+        self, query: str, start: str, end: str, step: str, deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        return run_sync(self.service.query_range(query, start, end, step, deadline))
+
+    def get_snapshot(
+        self, queries: Optional[Dict[str, str]] = None, deadline: Optional[Deadline] = None
+    ) -> MetricsSnapshot:
+        return run_sync(self.service.get_snapshot(queries, deadline))
+
+    def get_current_metrics(self, metric_name: str = None, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        return run_sync(self.service.get_current_metrics(metric_name, deadline))
+
+    def get_process_metrics(self, metric_name: str = None, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        return run_sync(self.service.get_process_metrics(metric_name, deadline))
+
+    def get_metrics_range(
+        self,
+        metric_name: str,
+        hours: float = 1.0,
+        deadline: Optional[Deadline] = None,
+        max_points: Optional[int] = None,
+        purpose: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        return run_sync(self.service.get_metrics_range(metric_name, hours, deadline, max_points, purpose))
+
+    def summarize_range(
+        self,
+        metric_name: str,
+        hours: float = 1.0,
+        step: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[SeriesSummary]:
+        return run_sync(self.service.summarize_range(metric_name, hours, step, deadline))
+
+
+def _hot_range_loader(entry: Dict[str, Any]) -> Callable[[Optional[Deadline]], Awaitable[Any]]:
+    def load(deadline: Optional[Deadline] = None):
+        return AsyncPrometheusService().get_metrics_range(
+            entry["metric"],
+            entry.get("hours", 1),
+            deadline=deadline,
+            max_points=entry.get("max_points"),
+            purpose=entry.get("purpose", "summary"),
         )
-        logger.debug(f"Raw query_range result: {result}")
-
-        # Convert timestamps in the response
-        if result.get("data", {}).get("result"):
-            logger.debug("Processing time series data")
-            for series in result["data"]["result"]:
-                if "values" in series:
-                    for value in series["values"]:
-                        # Convert timestamp to datetime
-                        timestamp = datetime.fromtimestamp(value[0])
-                        value[0] = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-            logger.debug(f"Processed result: {result}")
-        else:
-            logger.debug("No time series data found in the response")
+    return load
 
-        return result
+
+metrics_refresher.register(
+    SNAPSHOT_REFRESH_KEY, lambda deadline=None: AsyncPrometheusService().get_snapshot(deadline=deadline)
+)
+for hot_range in parse_hot_ranges(PREWARM_RANGE_QUERIES):
+    # Reloading these keeps their range cache entries and series store windows warm
+    metrics_refresher.register(f"range:{hot_range['metric']}:{hot_range.get('hours', 1)}h", _hot_range_loader(hot_range))
+
+
+def start_prewarming():
+    """Start refreshing the snapshot and hot range queries in the background"""
+    metrics_refresher.start()
+
+
+def get_prewarm_stats() -> Dict[str, Any]:
+    return metrics_refresher.stats()
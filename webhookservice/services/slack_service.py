@@ -1,62 +1,80 @@
-from slack_sdk import WebClient
+from slack_sdk.web.async_client import AsyncWebClient
 from slack_sdk.errors import SlackApiError
 import logging
 from config.settings import SLACK_BOT_DEPLOY_TOKEN, SLACK_BOT_MONITOR_TOKEN
+from webhookservice.utils.async_http_client import get_async_session, run_sync
 
 logger = logging.getLogger(__name__)
 
 
-def send_slack_message(
+def _async_client(is_monitor: bool) -> AsyncWebClient:
+    token = SLACK_BOT_MONITOR_TOKEN if is_monitor else SLACK_BOT_DEPLOY_TOKEN
+    return AsyncWebClient(token=token, session=get_async_session("slack"))
+
+
+async def async_send_slack_message(
     channel_id: str, message: str, blocks: list = None, is_monitor: bool = False
 ):
     """Send a message to a Slack channel"""
     try:
-        token = SLACK_BOT_MONITOR_TOKEN if is_monitor else SLACK_BOT_DEPLOY_TOKEN
-        client = WebClient(token=token)
-        response = client.chat_postMessage(
+        return await _async_client(is_monitor).chat_postMessage(
             channel=channel_id,
             text=message,
             blocks=blocks,
         )
-        return response
     except SlackApiError as e:
         logger.error(f"Error sending message to Slack: {str(e)}")
         raise
 
 
-def send_interactive_message(
+async def async_send_interactive_message(
     channel_id: str, blocks: list, fallback_text: str, is_monitor: bool = False
 ):
     """Send an interactive message to a Slack channel"""
     try:
-        token = SLACK_BOT_MONITOR_TOKEN if is_monitor else SLACK_BOT_DEPLOY_TOKEN
-        client = WebClient(token=token)
-        response = client.chat_postMessage(
+        return await _async_client(is_monitor).chat_postMessage(
             channel=channel_id,
             blocks=blocks,
             text=fallback_text,
         )
-        return response
     except SlackApiError as e:
         logger.error(f"Error sending interactive message to Slack: {str(e)}")
         raise
 
 
-def update_message(
+async def async_update_message(
     channel_id: str, ts: str, blocks: list, text: str, is_monitor: bool = False
 ):
     """Update an existing Slack message"""
     try:
-        token = SLACK_BOT_MONITOR_TOKEN if is_monitor else SLACK_BOT_DEPLOY_TOKEN
-        client = WebClient(token=token)
-        response = client.chat_update(
+        return await _async_client(is_monitor).chat_update(
             channel=channel_id,
             ts=ts,
             blocks=blocks,
             text=text,
             replace_original=True,
         )
-        return response
     except SlackApiError as e:
         logger.error(f"Error updating Slack message: {str(e)}")
         raise
+
+
+def send_slack_message(
+    channel_id: str, message: str, blocks: list = None, is_monitor: bool = False
+):
+    """Blocking form of async_send_slack_message, for worker threads"""
+    return run_sync(async_send_slack_message(channel_id, message, blocks, is_monitor))
+
+
+def send_interactive_message(
+    channel_id: str, blocks: list, fallback_text: str, is_monitor: bool = False
+):
+    """Blocking form of async_send_interactive_message, for worker threads"""
+    return run_sync(async_send_interactive_message(channel_id, blocks, fallback_text, is_monitor))
+
+
+def update_message(
+    channel_id: str, ts: str, blocks: list, text: str, is_monitor: bool = False
+):
+    """Blocking form of async_update_message, for worker threads"""
+    return run_sync(async_update_message(channel_id, ts, blocks, text, is_monitor))
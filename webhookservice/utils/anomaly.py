@@ -0,0 +1,236 @@
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import ANOMALY_BASELINE_WINDOW
+from webhookservice.utils.series import as_series
+from webhookservice.utils.series_stats import display_unit
+
+# Scales a median absolute deviation to a standard deviation for normal data
+MAD_TO_SIGMA = 1.4826
+
+# Display units of the current-metrics fields
+CURRENT_METRIC_UNITS = {"cpu_usage": ("%", 1.0), "memory_usage": ("MB", 1024 * 1024)}
+
+# Current-metrics field judged by a band, for range series of these metric names
+RANGE_BAND_KEYS = {"up": "up", "todo_process_resident_memory_bytes": "memory_usage"}
+
+
+class MetricBaselines:
+    """The most recent `window` samples of every metric, oldest first"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._values: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._last_timestamp: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, value: float, timestamp: float):
+        """Record a sample; one already seen (same or older timestamp) is ignored"""
+        with self._lock:
+            if timestamp <= self._last_timestamp.get(key, float("-inf")):
+                return
+            self._last_timestamp[key] = timestamp
+            self._values.setdefault(key, deque(maxlen=self.window)).append((timestamp, value))
+
+    def values(self, key: str, before: Optional[float] = None) -> np.ndarray:
+        """Values of the metric, only those sampled before `before` if given"""
+        with self._lock:
+            samples = self._values.get(key, ())
+            return np.array(
+                [value for timestamp, value in samples if before is None or timestamp < before], dtype=np.float64
+            )
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._last_timestamp.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {key: len(values) for key, values in self._values.items()}
+
+
+# Recent snapshot values, the baseline the anomaly pre-screen compares reports with
+metric_baselines = MetricBaselines(window=ANOMALY_BASELINE_WINDOW)
+
+
+def robust_z(values: np.ndarray, reference: np.ndarray, min_spread: float) -> np.ndarray:
+    """
+    How many robust standard deviations each value is from the reference median
+
+    The spread is the scaled MAD of the reference, but never less than
+    `min_spread` times the median, so a flat metric does not turn tiny
+    wobbles into huge scores.
+    """
+    median = np.median(reference)
+    mad = np.median(np.abs(reference - median))
+    spread = max(MAD_TO_SIGMA * mad, min_spread * abs(median), 1e-12)
+    return (values - median) / spread
+
+
+@dataclass
+class MetricScore:
+    """How far one metric's most deviant recent value is from its baseline"""
+
+    value: float
+    median: float  # Of the baseline
+    z: float
+    unit: Tuple[str, float]  # Display unit and divisor
+
+    def describe(self, key: str) -> str:
+        label, divisor = self.unit
+        suffix = label if label in ("", "%") else f" {label}"
+        return (
+            f"• `{key}`: `{self.value / divisor:.2f}{suffix}` "
+            f"(usual `{self.median / divisor:.2f}{suffix}`, {self.z:+.1f}σ)"
+        )
+
+
+@dataclass
+class ScreenResult:
+    """The verdict on one metrics payload"""
+
+    outcome: str  # 'nominal', 'anomalous', 'out_of_band', 'no_baseline' or 'unsupported'
+    scores: Dict[str, MetricScore] = field(default_factory=dict)
+    breaches: List[str] = field(default_factory=list)  # Values outside their absolute band
+
+    @property
+    def nominal(self) -> bool:
+        return self.outcome == "nominal"
+
+
+class AnomalyScreen:
+    """
+    Local statistical check that decides whether metrics need the LLM at all
+
+    Current metrics are scored against the rolling baseline of recent
+    snapshots; range results against their own history, by comparing their
+    most recent `recent_fraction` of points with the rest. Metrics are
+    nominal when every score is within `threshold` robust standard
+    deviations. Without enough history to judge, metrics are never nominal.
+
+    Deviation alone misses a metric that has been bad all along, so any
+    value outside its absolute band in `bands` ({field: (low, high)}, either
+    bound optional) always goes to the LLM, whatever its baseline.
+
+    A current value is only compared with samples taken before it, and is
+    added to the baseline once screened.
+    """
+
+    def __init__(
+        self,
+        baselines: MetricBaselines,
+        threshold: float = 3.5,
+        min_baseline: int = 20,
+        min_spread: float = 0.05,
+        recent_fraction: float = 0.1,
+        bands: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+    ):
+        self.baselines = baselines
+        self.threshold = threshold
+        self.min_baseline = min_baseline
+        self.min_spread = min_spread
+        self.recent_fraction = recent_fraction
+        self.bands = bands or {}
+        self._lock = threading.Lock()
+        self.outcomes = {"nominal": 0, "anomalous": 0, "out_of_band": 0, "no_baseline": 0, "unsupported": 0}
+
+    def _breaches(self, key: str, values: np.ndarray) -> List[str]:
+        low, high = self.bands.get(key, (None, None))
+        breaches = []
+        if low is not None and (values < low).any():
+            breaches.append(f"{key} below {low:g}")
+        if high is not None and (values > high).any():
+            breaches.append(f"{key} above {high:g}")
+        return breaches
+
+    def _score_current(self, metrics: Dict[str, Any]) -> ScreenResult:
+        breaches = []
+        for key in self.bands:
+            if isinstance(metrics.get(key), (int, float)):
+                breaches += self._breaches(key, np.array([float(metrics[key])]))
+        if breaches:
+            return ScreenResult("out_of_band", breaches=breaches)
+
+        sampled_at = metrics.get("timestamp")
+        scores = {}
+        for key in CURRENT_METRIC_UNITS:
+            if not isinstance(metrics.get(key), (int, float)):
+                continue
+            reference = self.baselines.values(key, before=sampled_at)
+            if len(reference) < self.min_baseline:
+                return ScreenResult("no_baseline")
+            z = robust_z(np.array([float(metrics[key])]), reference, self.min_spread)[0]
+            scores[key] = MetricScore(
+                float(metrics[key]), float(np.median(reference)), float(z), CURRENT_METRIC_UNITS[key]
+            )
+        return ScreenResult("nominal" if scores else "unsupported", scores)
+
+    def _score_range(self, results: List[Any]) -> ScreenResult:
+        scores = {}
+        breaches = []
+        for item in results:
+            series = as_series(item)
+            values = series.values[~np.isnan(series.values)]
+            band_key = RANGE_BAND_KEYS.get(series.name)
+            if band_key:
+                breaches += self._breaches(band_key, values[-max(1, int(len(values) * self.recent_fraction)):])
+            if breaches:
+                continue
+            recent = max(1, int(len(values) * self.recent_fraction))
+            if len(values) - recent < self.min_baseline:
+                return ScreenResult("no_baseline")
+            reference, latest = values[:-recent], values[-recent:]
+            z = robust_z(latest, reference, self.min_spread)
+            worst = int(np.argmax(np.abs(z)))
+            labels = ",".join(f"{k}={v}" for k, v in sorted(series.metric.items()) if k != "__name__")
+            scores[labels or series.name] = MetricScore(
+                float(latest[worst]), float(np.median(reference)), float(z[worst]), display_unit(series.name)
+            )
+        if breaches:
+            return ScreenResult("out_of_band", breaches=breaches)
+        return ScreenResult("nominal" if scores else "unsupported", scores)
+
+    def _observe(self, metrics: Dict[str, Any]):
+        timestamp = metrics.get("timestamp")
+        if timestamp is None:
+            return
+        for key in CURRENT_METRIC_UNITS:
+            if isinstance(metrics.get(key), (int, float)):
+                self.baselines.observe(key, float(metrics[key]), timestamp)
+
+    def screen(self, metrics: Dict[str, Any]) -> ScreenResult:
+        data = metrics.get("data") or {}
+        if data.get("resultType") == "matrix":
+            result = self._score_range(data.get("result", []))
+        elif "data" in metrics:
+            result = ScreenResult("unsupported")
+        else:
+            result = self._score_current(metrics)
+            self._observe(metrics)
+        if result.outcome == "nominal" and any(abs(score.z) > self.threshold for score in result.scores.values()):
+            result.outcome = "anomalous"
+        with self._lock:
+            self.outcomes[result.outcome] += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            screened = sum(self.outcomes.values())
+            return {
+                **self.outcomes,
+                "llm_calls_avoided": self.outcomes["nominal"],
+                "llm_calls_avoided_rate": round(self.outcomes["nominal"] / screened, 4) if screened else None,
+                "baseline_sizes": self.baselines.stats(),
+            }
+
+
+def nominal_analysis(result: ScreenResult) -> str:
+    """The templated analysis for metrics the screen found nominal"""
+    lines = ["✅ *All metrics nominal*: every value is within its usual range, so no AI analysis was needed."]
+    lines.extend(score.describe(key) for key, score in result.scores.items())
+    return "\n".join(lines)
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional
+import aiohttp
+import requests
+from config.settings import ASYNC_HTTP_LIMIT, ASYNC_HTTP_LIMIT_PER_HOST, HTTP_KEEPALIVE_IDLE
+
+logger = logging.getLogger(__name__)
+
+
+def _translate_error(e: Exception) -> requests.RequestException:
+    """Map aiohttp errors onto the requests exceptions the sync stack raises"""
+    if isinstance(e, asyncio.TimeoutError):
+        return requests.Timeout(str(e) or "Request timed out")
+    return requests.ConnectionError(str(e))
+
+
+class AsyncResponse:
+    """
+    An aiohttp response exposing the parts of requests.Response our callers use
+
+    status_code and close() behave as in requests; text(), json(),
+    iter_lines() and iter_chunked() are coroutines / async iterators.
+    """
+
+    def __init__(self, response: aiohttp.ClientResponse):
+        self._response = response
+        self.status_code = response.status
+        self.headers = response.headers
+        self.url = str(response.url)
+
+    async def text(self) -> str:
+        try:
+            return await self._response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise _translate_error(e) from e
+
+    async def json(self) -> Any:
+        try:
+            return await self._response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise _translate_error(e) from e
+
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        try:
+            async for line in self._response.content:
+                yield line
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise _translate_error(e) from e
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._response.content.iter_chunked(size):
+                yield chunk
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise _translate_error(e) from e
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error: {self._response.reason} for url: {self.url}")
+
+    def close(self):
+        self._response.release()
+
+
+# Sessions belong to the event loop they were created on
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, aiohttp.ClientSession]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+# Requests sent and connections opened per upstream, over every loop's session
+_pool_counters: Dict[str, Dict[str, int]] = {}
+
+
+def _counting_trace(name: str) -> aiohttp.TraceConfig:
+    """Trace hooks counting requests and new connections for an upstream's session"""
+    counters = _pool_counters.setdefault(name, {"requests": 0, "new_connections": 0})
+
+    async def on_request_start(session, context, params):
+        counters["requests"] += 1
+
+    async def on_connection_create_end(session, context, params):
+        counters["new_connections"] += 1
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    return trace
+
+
+def get_async_session(name: str) -> aiohttp.ClientSession:
+    """
+    Get the pooled aiohttp session for an upstream service on the running loop
+
+    Args:
+        name: Upstream name, e.g. 'dify', 'prometheus', 'jenkins' or 'slack'
+
+    Returns:
+        aiohttp.ClientSession: A session shared by every coroutine on this loop
+    """
+    loop = asyncio.get_running_loop()
+    sessions = _sessions.setdefault(loop, {})
+    session = sessions.get(name)
+    if session is None or session.closed:
+        logger.debug(f"Creating pooled async HTTP session for upstream: {name}")
+        connector = aiohttp.TCPConnector(
+            limit=ASYNC_HTTP_LIMIT,
+            limit_per_host=ASYNC_HTTP_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_IDLE,
+        )
+        session = sessions[name] = aiohttp.ClientSession(connector=connector, trace_configs=[_counting_trace(name)])
+    return session
+
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    """Connection reuse counters for every upstream"""
+    stats = {}
+    for name, counters in list(_pool_counters.items()):
+        requests_sent, new_connections = counters["requests"], counters["new_connections"]
+        stats[name] = {
+            "requests": requests_sent,
+            "new_connections": new_connections,
+            "reused_connections": max(0, requests_sent - new_connections),
+        }
+    return stats
+
+
+async def async_request(
+    name: str, method: str, url: str, timeout: Optional[float] = None, **kwargs
+) -> AsyncResponse:
+    """
+    Send a request through the upstream's pooled session
+
+    `timeout` applies to connecting and to each read, like requests, so a
+    long stream isn't cut off while it keeps producing data. aiohttp errors
+    are raised as the matching requests exceptions.
+    """
+    if timeout is not None:
+        kwargs["timeout"] = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+    try:
+        response = await get_async_session(name).request(method, url, **kwargs)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise _translate_error(e) from e
+    return AsyncResponse(response)
+
+
+async def close_async_sessions():
+    """Close every pooled session created on the running loop"""
+    sessions = _sessions.pop(asyncio.get_running_loop(), {})
+    for session in sessions.values():
+        await session.close()
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """The process-wide event loop the async clients run on, started on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-clients", daemon=True).start()
+        return _loop
+
+
+def spawn(coro: Awaitable) -> Future:
+    """Schedule a coroutine on the shared loop from any thread"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_sync(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """
+    Run a coroutine on the shared loop and wait for its result from a worker thread
+
+    Raises:
+        RuntimeError: If called from a coroutine, whose loop it would block
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return spawn(coro).result(timeout)
+    coro.close()
+    raise RuntimeError("run_sync() called from a running event loop; await the coroutine instead")
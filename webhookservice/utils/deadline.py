@@ -0,0 +1,51 @@
+import time
+from typing import Callable, Optional
+import requests
+
+
+class DeadlineExceeded(requests.Timeout):
+    """Raised when a request's overall time budget has run out"""
+
+
+class Deadline:
+    """
+    Overall time budget for one incoming request
+
+    Created by the route handler and passed down to every service call, so
+    each hop gets whatever is left of the budget instead of its own fixed
+    timeout.
+    """
+
+    def __init__(self, budget: float, clock: Callable[[], float] = time.monotonic):
+        self.budget = budget
+        self.clock = clock
+        self.expires_at = clock() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self) -> bool:
+        return self.clock() >= self.expires_at
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """
+        Timeout for the next hop: the remaining budget, capped at `cap`
+
+        Raises:
+            DeadlineExceeded: If no budget is left
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.budget}s exceeded")
+        return remaining if cap is None else min(cap, remaining)
+
+
+def hop_timeout(deadline: Optional[Deadline], default: Optional[float]) -> Optional[float]:
+    """The timeout for one call: `default`, shortened to what is left of the deadline"""
+    if deadline is None:
+        return default
+    return deadline.timeout(default)
+
+
+def deadline_expired(deadline: Optional[Deadline]) -> bool:
+    return deadline is not None and deadline.expired()
@@ -0,0 +1,89 @@
+from typing import Dict, List, Sequence, Any
+
+
+def lttb(timestamps: Sequence[float], values: Sequence[float], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Picks `threshold` points that preserve the visual shape of the series,
+    keeping spikes and dips that plain averaging would smooth away.
+
+    Args:
+        timestamps: Sample times, ascending
+        values: Sample values, same length as timestamps
+        threshold: Maximum number of points to keep
+
+    Returns:
+        List[int]: Indices of the kept points, ascending
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    sampled = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_count = avg_end - avg_start
+        avg_x = sum(timestamps[avg_start:avg_end]) / avg_count
+        avg_y = sum(values[avg_start:avg_end]) / avg_count
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        ax, ay = timestamps[a], values[a]
+
+        max_area = -1.0
+        next_a = range_start
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (values[j] - ay) - (ax - timestamps[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                next_a = j
+        sampled.append(next_a)
+        a = next_a
+
+    sampled.append(n - 1)
+    return sampled
+
+
+def infer_step(timestamps: Sequence[float]) -> int:
+    """Most common spacing between samples, in whole seconds"""
+    if len(timestamps) < 2:
+        return 0
+    deltas = sorted(timestamps[i + 1] - timestamps[i] for i in range(len(timestamps) - 1))
+    return max(1, int(round(deltas[len(deltas) // 2])))
+
+
+def encode_series(
+    timestamps: Sequence[float], values: Sequence[float], max_points: int, precision: int
+) -> Dict[str, Any]:
+    """
+    Downsample a series and encode it as base timestamp + step + value array
+
+    Sample i sits at start + offsets[i] * step. The offsets array is left out
+    when the kept samples are evenly spaced, i.e. sample i is at start + i * step.
+
+    Returns:
+        Dict[str, Any]: {"start", "step", "points", "values"[, "offsets"]}
+    """
+    if not values:
+        return {"start": None, "step": 0, "points": 0, "values": []}
+
+    step = infer_step(timestamps)
+    indices = lttb(timestamps, values, max_points)
+    start = timestamps[0]
+
+    encoded = {
+        "start": int(start),
+        "step": step,
+        "points": len(values),
+        "values": [round(values[i], precision) for i in indices],
+    }
+    if step:
+        offsets = [int(round((timestamps[i] - start) / step)) for i in indices]
+        if offsets != list(range(len(indices))):
+            encoded["offsets"] = offsets
+    return encoded
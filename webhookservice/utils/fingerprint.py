@@ -0,0 +1,85 @@
+import hashlib
+import json
+import math
+from typing import Any, Dict, List, Optional
+from webhookservice.utils.series import TimeSeries, as_series
+
+# Keys that change on every snapshot without changing what it says
+VOLATILE_KEYS = {"server_time", "timestamp", "fetched_at"}
+
+# Range series are reduced to this many bucket means before quantizing
+SHAPE_BUCKETS = 12
+
+
+def quantize(value: float, significant_digits: int) -> float:
+    """Round a value to a number of significant digits, e.g. 35.35 -> 35.0 at 2 digits"""
+    if value == 0 or not math.isfinite(value):
+        return value
+    digits = significant_digits - int(math.floor(math.log10(abs(value)))) - 1
+    return round(value, digits)
+
+
+def _shape(values: List[float], significant_digits: int) -> List[float]:
+    if not values:
+        return []
+    buckets = min(SHAPE_BUCKETS, len(values))
+    size = len(values) / buckets
+    shape = []
+    for i in range(buckets):
+        bucket = values[int(i * size):int((i + 1) * size)] or values[-1:]
+        shape.append(quantize(sum(bucket) / len(bucket), significant_digits))
+    return shape
+
+
+def _canonical(metrics: Dict[str, Any], significant_digits: int) -> Any:
+    data = metrics.get("data")
+    if isinstance(data, dict) and "result" in data:
+        series_list = []
+        for series in data.get("result") or []:
+            metric = series.metric if isinstance(series, TimeSeries) else series.get("metric", {})
+            labels = sorted(metric.items())
+            if isinstance(series, TimeSeries) or "values" in series:
+                series = as_series(series)
+                duration = int(series.timestamps[-1] - series.timestamps[0]) if len(series) else 0
+                series_list.append(
+                    {
+                        "labels": labels,
+                        "points": len(series),
+                        "duration": duration,
+                        "shape": _shape(series.values.tolist(), significant_digits),
+                    }
+                )
+            elif "value" in series:
+                series_list.append(
+                    {"labels": labels, "value": quantize(float(series["value"][1]), significant_digits)}
+                )
+        return {"resultType": data.get("resultType"), "series": series_list}
+
+    canonical = {}
+    for key, value in metrics.items():
+        if key in VOLATILE_KEYS:
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            canonical[key] = quantize(float(value), significant_digits)
+        else:
+            canonical[key] = value
+    return canonical
+
+
+def metrics_fingerprint(metrics: Dict[str, Any], significant_digits: int = 2) -> Optional[str]:
+    """
+    Fingerprint a metrics snapshot so near-identical snapshots collide
+
+    Values are rounded to `significant_digits` significant digits, range
+    series are reduced to a coarse shape plus their length and duration, and
+    timestamps of when the snapshot was taken are ignored.
+
+    Returns:
+        Optional[str]: A hex digest, or None if the snapshot can't be fingerprinted
+    """
+    try:
+        canonical = _canonical(metrics, significant_digits)
+        encoded = json.dumps(canonical, sort_keys=True, default=str)
+    except (TypeError, ValueError, KeyError, IndexError):
+        return None
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
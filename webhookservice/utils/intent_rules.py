@@ -0,0 +1,265 @@
+"""
+Deterministic fast-path intent parsing for common monitoring and deploy commands
+
+The grammars mirror the examples in prompts/Monitor.md and prompts/deploy.md and
+produce the same dicts as the Dify-backed parsers. Each matcher returns an
+(intent, confidence) pair; callers fall back to the LLM when confidence is low.
+"""
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import INTENT_FAST_PATH_MAX_HOURS
+
+CPU_METRIC = "todo_process_cpu_seconds_total"
+MEMORY_METRIC = "todo_process_resident_memory_bytes"
+START_TIME_METRIC = "todo_process_start_time_seconds"
+HEALTH_METRIC = "up"
+
+METRIC_WORDS = {
+    "cpu": CPU_METRIC,
+    "processor": CPU_METRIC,
+    "memory": MEMORY_METRIC,
+    "mem": MEMORY_METRIC,
+    "ram": MEMORY_METRIC,
+    "uptime": START_TIME_METRIC,
+    "health": HEALTH_METRIC,
+    "healthy": HEALTH_METRIC,
+    "up": HEALTH_METRIC,
+}
+RANGE_WORDS = {"trend", "trends", "history", "historical", "over", "past", "last", "previous", "during", "graph", "chart"}
+CURRENT_WORDS = {"current", "currently", "now", "right", "latest", "present"}
+SWEEP_WORDS = {"fleet", "sweep", "all", "services", "every", "everything", "worst", "offenders"}
+# Any of these asks for the fleet sweep rather than the todo service's metrics
+SWEEP_TRIGGERS = re.compile(r"\b(fleet|sweep|all services|every service|worst offenders)\b")
+MONITOR_WORDS = {"usage", "utilization", "utilisation", "consumption", "load", "metrics", "metric", "stats", "status"}
+FILLER_WORDS = {
+    "show", "me", "display", "get", "check", "view", "see", "give", "tell", "what", "what's", "whats",
+    "is", "are", "the", "a", "an", "for", "of", "in", "and", "to", "please", "can", "you", "how",
+    "much", "level", "levels", "data", "application", "app", "system", "server", "service",
+    "process", "our", "its", "it's", "my", "with", "time",
+}
+HELP_TRIGGERS = re.compile(
+    r"^(hi|hello|hey|help)\b|\bwho are you\b|\bwhat can you do\b|\bhow do i use\b|^你能做什么|^帮助"
+)
+HELP_WORDS = {"hi", "hello", "hey", "help", "who", "are", "you", "what", "can", "do", "how", "i", "use", "there", "bot"}
+
+DURATION_PATTERN = re.compile(
+    r"\b(?:(?P<count>\d+)\s*(?P<unit>minutes?|mins?|hours?|hrs?|h|days?|d|weeks?|w)"
+    r"|(?:(?:an?|one)\s+)?(?P<word_unit>minute|hour|day|week))\b"
+)
+# Hours per unit; None marks minute ranges, which are passed on with unit="minutes"
+UNIT_HOURS = {
+    "minute": None, "minutes": None, "min": None, "mins": None,
+    "hour": 1, "hours": 1, "hr": 1, "hrs": 1, "h": 1,
+    "day": 24, "days": 24, "d": 24,
+    "week": 168, "weeks": 168, "w": 168,
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+MONITOR_HELP_MESSAGE = (
+    "👋 Hello! I'm a monitoring assistant that can help you query various application metrics:\n\n"
+    "📊 Supported metrics include:\n• CPU usage\n• Memory usage\n• Application health status\n"
+    "• Application uptime\n\n🕒 Supported time ranges:\n• Last hour (default)\n• Last 24 hours\n"
+    "• Last week\n\n💡 Example commands:\n• Show current CPU usage\n"
+    "• Display memory usage trend for the last 24 hours\n• Check application health status\n"
+    "• Sweep the fleet for the worst offenders"
+)
+
+ENVIRONMENTS = {"staging", "production", "dev", "test"}
+ENVIRONMENT_ALIASES = {
+    "stage": "staging",
+    "stg": "staging",
+    "prod": "production",
+    "prd": "production",
+    "development": "dev",
+    "生产": "production",
+    "测试": "staging",
+    "预发": "staging",
+    "开发": "dev",
+}
+BRANCH = r"[A-Za-z0-9][A-Za-z0-9._/-]*"
+DEPLOY_VERB = r"(?:please\s+)?(?:deploy|release|publish|ship|roll\s+out)"
+ENV_SUFFIX = r"(?:\s+env(?:ironment)?)?"
+DEPLOY_PATTERNS = [
+    # deploy feature/new-login to staging, deploy test version, release branch main to prod
+    re.compile(
+        rf"^{DEPLOY_VERB}\s+(?:the\s+)?(?:(?:branch|version)\s+)?(?P<branch>{BRANCH})"
+        rf"(?:\s+(?:branch|version|build))?"
+        rf"(?:\s+(?:to|on|into|in)\s+(?:the\s+)?(?P<env>\w+){ENV_SUFFIX})?\s*[.!]?$",
+        re.IGNORECASE,
+    ),
+    # deploy to production
+    re.compile(
+        rf"^{DEPLOY_VERB}\s+(?:to|on|into)\s+(?:the\s+)?(?P<env>\w+){ENV_SUFFIX}\s*[.!]?$",
+        re.IGNORECASE,
+    ),
+    # update staging environment
+    re.compile(rf"^update\s+(?:the\s+)?(?P<env>\w+){ENV_SUFFIX}\s*[.!]?$", re.IGNORECASE),
+    # 部署测试版本, 部署 feature/new-login 到测试环境, 发布到生产环境, 更新测试环境
+    re.compile(
+        rf"^(?:部署|发布|更新)\s*(?:(?P<zh_test>测试)版本|(?P<branch>{BRANCH})\s*(?:版本|分支)?)?"
+        rf"\s*(?:(?:到|至)?\s*(?P<env>生产|测试|预发|开发)环境)?\s*[。！]?$"
+    ),
+]
+DEPLOY_STOP_WORDS = {"to", "on", "into", "in", "the", "branch", "version", "build", "environment", "env"}
+# Words that fill the branch slot without naming a branch ("deploy it", "release the latest")
+VAGUE_BRANCH_WORDS = {
+    "it", "this", "that", "these", "those", "them", "now", "again", "latest", "last", "newest",
+    "current", "everything", "something", "anything", "all", "please", "today", "asap",
+}
+# Branch names common enough to be trusted without "branch" or "version" next to them
+KNOWN_BRANCHES = {"main", "master", "develop", "trunk"}
+BRANCH_MARKERS = re.compile(r"\b(?:branch|version|build)\b|版本|分支", re.IGNORECASE)
+BRANCH_LIKE = re.compile(r"[/._\d-]")
+
+DEPLOY_HELP_MESSAGE = (
+    "I can help you deploy applications. Try commands like:\n"
+    "- deploy test version\n- deploy to production\n- update staging environment\n"
+    "- deploy feature/new-login to staging"
+)
+DEPLOY_HELP_MESSAGE_ZH = (
+    "我可以帮您进行应用部署。试试以下命令：\n"
+    "- 部署测试版本\n- 发布到生产环境\n- 更新测试环境\n- 部署 feature/new-login 到测试环境"
+)
+
+
+def _parse_duration(text: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Extract a "last N hours/days/weeks" duration and return the remaining text"""
+    match = DURATION_PATTERN.search(text)
+    if not match:
+        return None, text
+
+    unit = match.group("unit") or match.group("word_unit")
+    count = int(match.group("count")) if match.group("count") else 1
+    remaining = (text[: match.start()] + " " + text[match.end():]).strip()
+
+    hours_per_unit = UNIT_HOURS[unit]
+    if hours_per_unit is None:
+        return {"hours": count, "unit": "minutes"}, remaining
+    return {"hours": count * hours_per_unit}, remaining
+
+
+def match_monitoring_intent(message: str) -> Tuple[Optional[Dict[str, Any]], float]:
+    """
+    Match a monitoring request against the fast-path grammar
+
+    Confidence is the share of words the grammar accounts for, so anything
+    with unfamiliar words ("disk", "why", "compared") scores low. Empty
+    ranges and ranges longer than INTENT_FAST_PATH_MAX_HOURS score zero.
+
+    Returns:
+        Tuple[Optional[Dict], float]: The parsed intent (or None) and its confidence
+    """
+    text = " ".join(message.lower().split())
+    if not text:
+        return None, 0.0
+
+    if HELP_TRIGGERS.search(text):
+        tokens = TOKEN_PATTERN.findall(text)
+        known = sum(1 for token in tokens if token in HELP_WORDS)
+        confidence = known / len(tokens) if tokens else 1.0
+        return {"type": "help", "message": MONITOR_HELP_MESSAGE}, confidence
+
+    if SWEEP_TRIGGERS.search(text):
+        tokens = TOKEN_PATTERN.findall(text)
+        vocabulary = SWEEP_WORDS | FILLER_WORDS | MONITOR_WORDS | METRIC_WORDS.keys()
+        known = sum(1 for token in tokens if token in vocabulary)
+        return {"type": "monitoring", "query_type": "sweep", "original_message": message}, known / len(tokens)
+
+    duration, text = _parse_duration(text)
+    if duration:
+        hours = duration["hours"] / 60 if duration.get("unit") == "minutes" else duration["hours"]
+        if not 0 < hours <= INTENT_FAST_PATH_MAX_HOURS:
+            # "last 0 hours", "last 100000 weeks": not a range to query as written
+            return None, 0.0
+    tokens = TOKEN_PATTERN.findall(text)
+    if not tokens:
+        return None, 0.0
+
+    metrics = set()
+    is_range = duration is not None
+    has_signal = duration is not None
+    known = 0
+    for token in tokens:
+        if token in METRIC_WORDS:
+            metrics.add(METRIC_WORDS[token])
+            has_signal = True
+        elif token in RANGE_WORDS:
+            is_range = True
+            has_signal = True
+        elif token in CURRENT_WORDS or token in MONITOR_WORDS:
+            has_signal = True
+        elif token not in FILLER_WORDS:
+            continue
+        known += 1
+
+    if not has_signal:
+        return None, 0.0
+
+    intent = {
+        "type": "monitoring",
+        "query_type": "range" if is_range else "current",
+        "metric": metrics.pop() if len(metrics) == 1 else "all",
+        "hours": 1,
+        "original_message": message,
+    }
+    if duration:
+        intent.update(duration)
+    return intent, known / len(tokens)
+
+
+def match_deployment_intent(message: str) -> Tuple[Optional[Dict[str, Any]], float]:
+    """
+    Match a deploy request against the fast-path grammar
+
+    Deploy commands either match a pattern completely or not at all, so the
+    confidence is 1.0 or 0.0. Unknown environments and invalid branch names
+    are left to the LLM, which explains the error to the user. So are plain
+    words in the branch slot ("deploy it", "release the latest"): a branch
+    must be marked as one, look like one (feature/x, hotfix-42) or be a
+    common name such as main. An environment there is taken as the target.
+
+    Returns:
+        Tuple[Optional[Dict], float]: The deployment parameters (or None) and confidence
+    """
+    text = " ".join(message.split())
+    if not text:
+        return None, 0.0
+
+    if HELP_TRIGGERS.search(text.lower()):
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        if all(token in HELP_WORDS for token in tokens):
+            help_message = DEPLOY_HELP_MESSAGE_ZH if re.search(r"[一-鿿]", text) else DEPLOY_HELP_MESSAGE
+            return {"message": help_message}, 1.0
+        return None, 0.0
+
+    for pattern in DEPLOY_PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+
+        groups = match.groupdict()
+        branch = groups.get("branch")
+        env = groups.get("env")
+        marked = BRANCH_MARKERS.search(text) is not None
+        if branch and not marked and ENVIRONMENT_ALIASES.get(branch.lower(), branch.lower()) in ENVIRONMENTS:
+            # "deploy production": the only word names an environment, not a branch
+            if env:
+                return None, 0.0
+            branch, env = None, branch
+        if branch and (
+            branch.lower() in DEPLOY_STOP_WORDS
+            or branch.lower() in VAGUE_BRANCH_WORDS
+            or not (marked or BRANCH_LIKE.search(branch) or branch.lower() in KNOWN_BRANCHES)
+        ):
+            return None, 0.0
+        branch = branch or ("test" if groups.get("zh_test") else "main")
+
+        environment = (env or "staging").lower()
+        environment = ENVIRONMENT_ALIASES.get(environment, environment)
+        if environment not in ENVIRONMENTS:
+            return None, 0.0
+
+        return {"branch": branch, "environment": environment, "channel": "#chatops"}, 1.0
+
+    return None, 0.0
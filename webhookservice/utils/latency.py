@@ -0,0 +1,51 @@
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+def percentile(sorted_samples, fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, max(0, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+class LatencyTracker:
+    """Rolling window of latency samples, grouped by name"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def mean(self, name: str) -> Optional[float]:
+        with self._lock:
+            samples = self._samples.get(name)
+            return sum(samples) / len(samples) if samples else None
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Count, mean, p50 and p95 (seconds) per name over the current window"""
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+            counts = dict(self._counts)
+
+        return {
+            name: {
+                "count": counts[name],
+                "avg": round(sum(samples) / len(samples), 4),
+                "p50": round(percentile(samples, 0.5), 4),
+                "p95": round(percentile(samples, 0.95), 4),
+            }
+            for name, samples in snapshot.items()
+            if samples
+        }
@@ -0,0 +1,325 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import requests
+
+from webhookservice.utils.deadline import DeadlineExceeded
+from webhookservice.utils.latency import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean the backend, not the request, is at fault
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class BackendUnavailable(requests.RequestException):
+    """Raised when no backend is allowed to take the call"""
+
+
+@dataclass
+class Backend:
+    """One Dify-compatible chat endpoint, with the app keys it uses per bot"""
+
+    name: str
+    endpoint: Optional[str]
+    api_keys: Dict[str, str] = field(default_factory=dict)
+
+    def api_key(self, bot: Optional[str], default: str) -> str:
+        return self.api_keys.get(bot) or default
+
+
+def parse_backends(config: str, default_endpoint: Optional[str]) -> List[Backend]:
+    """
+    Build backends from a JSON list, falling back to the single default endpoint
+
+    Each entry has a "name", an "endpoint" and optional "<bot>_api_key"
+    fields, e.g. "deploy_api_key", for the Dify apps on that backend.
+    """
+    if not config:
+        return [Backend("dify", default_endpoint)]
+
+    backends = []
+    for index, entry in enumerate(json.loads(config)):
+        api_keys = {
+            key[: -len("_api_key")]: value for key, value in entry.items() if key.endswith("_api_key")
+        }
+        backends.append(Backend(entry.get("name") or f"backend-{index}", entry["endpoint"], api_keys))
+    return backends
+
+
+class CircuitBreaker:
+    """
+    Stop calling a backend after repeated failures
+
+    The circuit opens after `failure_threshold` consecutive failures. Once
+    `reset_timeout` seconds have passed it lets a single probe through
+    (half-open); the probe's outcome closes or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        """Whether a call would be allowed right now, without claiming the probe"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return self.clock() - self.opened_at >= self.reset_timeout
+            return not self._probing
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def release(self):
+        """Give back a probe whose call ended without an outcome, so another can be sent"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                self._probing = False
+
+
+def _close_response(task):
+    """Done-callback releasing the connection of a hedged request that lost"""
+    if task.cancelled() or task.exception() is not None:
+        return
+    task.result().close()
+
+
+class LLMRouter:
+    """
+    Route LLM calls to the fastest healthy backend
+
+    Backends are ranked by mean response latency inflated by their recent
+    error rate; backends that haven't been called yet go first. A failing
+    call (connection error or a retryable status) fails over to the next
+    backend and counts towards that backend's circuit breaker; running out
+    of the caller's deadline (DeadlineExceeded) stops failover without
+    counting against the backend. With hedge=True a second backend is
+    asked as well if the first hasn't answered within `hedge_delay`
+    seconds, and the first success wins. Calls are coroutines; a hedge
+    runs as a task next to the first call on the caller's event loop.
+    """
+
+    def __init__(
+        self,
+        backends: List[Backend],
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        error_window: int = 20,
+        hedge_delay: float = 0.3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backends = list(backends)
+        self.hedge_delay = hedge_delay
+        self.clock = clock
+        self.breakers = {
+            backend.name: CircuitBreaker(failure_threshold, reset_timeout, clock) for backend in self.backends
+        }
+        self.latency = LatencyTracker()
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._outcomes = {backend.name: deque(maxlen=error_window) for backend in self.backends}
+        self._lock = threading.Lock()
+
+    def error_rate(self, name: str) -> float:
+        with self._lock:
+            outcomes = self._outcomes[name]
+            return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def _score(self, backend: Backend) -> float:
+        mean = self.latency.mean(backend.name)
+        error_rate = self.error_rate(backend.name)
+        if mean is None:
+            # Untried backends go first so they get measured; ones that only ever failed go last
+            return float("inf") if error_rate else 0.0
+        return mean / max(0.05, 1.0 - error_rate)
+
+    def ranked(self) -> List[Backend]:
+        """Backends whose circuit allows a call, best first; ties keep the configured order"""
+        available = [backend for backend in self.backends if self.breakers[backend.name].available()]
+        return sorted(available, key=self._score)
+
+    def _record(self, backend: Backend, ok: bool, seconds: Optional[float] = None):
+        with self._lock:
+            self._outcomes[backend.name].append(ok)
+        if ok:
+            self.breakers[backend.name].record_success()
+            self.latency.record(backend.name, seconds)
+        else:
+            self.breakers[backend.name].record_failure()
+
+    def _record_response(self, backend: Backend, response, started: float):
+        ok = response.status_code not in RETRYABLE_STATUS_CODES
+        self._record(backend, ok, self.clock() - started)
+        if not ok:
+            logger.warning(f"LLM backend {backend.name} returned {response.status_code}")
+        return response
+
+    async def _attempt(self, backend: Backend, send: Callable[[Backend], Awaitable]):
+        started = self.clock()
+        try:
+            response = await send(backend)
+        except DeadlineExceeded:
+            # The caller ran out of time; that says nothing about the backend
+            self.breakers[backend.name].release()
+            raise
+        except requests.RequestException as e:
+            logger.warning(f"LLM backend {backend.name} failed: {str(e)}")
+            self._record(backend, False)
+            raise
+        return self._record_response(backend, response, started)
+
+    async def _failover(self, candidates: List[Backend], send: Callable[[Backend], Awaitable]):
+        last_response = None
+        last_error = None
+        for backend in candidates:
+            if not self.breakers[backend.name].allow():
+                continue
+            try:
+                response = await self._attempt(backend, send)
+            except DeadlineExceeded:
+                raise
+            except requests.RequestException as e:
+                last_error = e
+                continue
+            if last_response is not None:
+                last_response.close()
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                return response
+            last_response = response
+
+        # Every backend failed: hand back the last error response so callers report it as before
+        if last_response is not None:
+            return last_response
+        if last_error is not None:
+            raise last_error
+        raise BackendUnavailable("No LLM backend is available")
+
+    async def _hedged(self, candidates: List[Backend], send: Callable[[Backend], Awaitable]):
+        primary = asyncio.ensure_future(self._failover(candidates[:1], send))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        if done:
+            try:
+                response = primary.result()
+            except requests.RequestException:
+                return await self._failover(candidates[1:], send)
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                return response
+            response.close()
+            return await self._failover(candidates[1:], send)
+
+        self.hedges_sent += 1
+        logger.info(f"LLM backend {candidates[0].name} slower than {self.hedge_delay}s, hedging")
+        secondary = asyncio.ensure_future(self._failover(candidates[1:], send))
+
+        winner = None
+        fallback = None
+        last_error = None
+        pending = {primary, secondary}
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    response = task.result()
+                except requests.RequestException as e:
+                    last_error = e
+                    continue
+                if winner is None and response.status_code not in RETRYABLE_STATUS_CODES:
+                    winner = response
+                    if task is secondary:
+                        self.hedges_won += 1
+                elif fallback is None:
+                    fallback = response
+                else:
+                    response.close()
+
+        for task in pending:
+            task.add_done_callback(_close_response)
+        if winner is not None:
+            if fallback is not None:
+                fallback.close()
+            return winner
+        if fallback is not None:
+            return fallback
+        raise last_error or BackendUnavailable("No LLM backend is available")
+
+    async def request(self, send: Callable[[Backend], Awaitable], hedge: bool = False):
+        """
+        Call `send` with the best backend, failing over on errors
+
+        Args:
+            send: Coroutine function making the HTTP call against the given backend
+            hedge: Also ask a second backend if the first one is slow
+
+        Returns:
+            The first successful response, or the last error response
+        """
+        candidates = self.ranked()
+        if not candidates:
+            raise BackendUnavailable("All LLM backends have open circuits")
+        if hedge and len(candidates) > 1:
+            return await self._hedged(candidates, send)
+        return await self._failover(candidates, send)
+
+    def stats(self) -> Dict:
+        """Circuit state, error rate and latency per backend, plus hedging counters"""
+        latency = self.latency.stats()
+        return {
+            "backends": {
+                backend.name: {
+                    "endpoint": backend.endpoint,
+                    "state": self.breakers[backend.name].state,
+                    "error_rate": round(self.error_rate(backend.name), 4),
+                    "latency": latency.get(backend.name),
+                }
+                for backend in self.backends
+            },
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+        }
@@ -1,57 +1,70 @@
 from datetime import datetime
 import logging
+from config.settings import FLEET_REPORT_TOP, SLACK_SUMMARY_MAX_SERIES
+from webhookservice.utils.report_state import ANALYSIS_BLOCK_ID, REFRESH_ACTION_ID
+from webhookservice.utils.series import as_series, format_epoch
+from webhookservice.utils.series_stats import display_unit, rank_by_peak, summarize
 
 logger = logging.getLogger(__name__)
 
+
 def format_timestamp(ts):
     """Format timestamp to human-readable format."""
     if isinstance(ts, str):
         return ts
     return datetime.fromtimestamp(float(ts)).strftime("%Y-%m-%d %H:%M:%S")
 
+
+def _series_label(summary):
+    """Labels that tell a series apart from the others, e.g. instance="app-1"."""
+    labels = [f'{key}="{value}"' for key, value in sorted(summary.metric.items()) if key != "__name__"]
+    return ", ".join(labels)
+
+
+def format_series_summary(summary, multiple=False):
+    """Slack mrkdwn lines describing one series summary."""
+    unit, divisor = display_unit(summary.name)
+    scaled = summary.scaled(divisor)
+    lines = [f"• Metric: `{summary.name}`"]
+    if multiple and _series_label(summary):
+        lines.append(f"• Series: `{_series_label(summary)}`")
+    lines.extend([
+        f"• Time Range: `{format_epoch(summary.start)}` to `{format_epoch(summary.end)}`",
+        f"• Minimum: `{scaled.min:.2f} {unit}` at `{format_epoch(summary.min_at)}`",
+        f"• Maximum: `{scaled.max:.2f} {unit}` at `{format_epoch(summary.max_at)}`",
+        f"• Average: `{scaled.mean:.2f} {unit}`",
+        f"• p50 / p95 / p99: `{scaled.p50:.2f}` / `{scaled.p95:.2f}` / `{scaled.p99:.2f} {unit}`",
+        f"• Last: `{scaled.last:.2f} {unit}` (trend `{scaled.slope:+.2f} {unit}/h`)",
+    ])
+    return "\n".join(lines)
+
+
 def process_time_series_data(results):
     """Process time series data and return formatted summary."""
     if not results:
         return None, None
     
-    series = results[0]
-    metric_name = series["metric"].get("__name__", "unknown")
-    values = series["values"]
-    
-    if not values:
+    summaries = rank_by_peak(summarize([as_series(series) for series in results]))
+    if not summaries:
         return None, None
-        
-    values_float = [float(v[1]) for v in values]
-    if "bytes" in metric_name.lower():
-        values_float = [v / 1024 / 1024 for v in values_float]
-        unit = "MB"
-    else:
-        unit = ""
-        
-    min_value = min(values_float)
-    max_value = max(values_float)
-    avg_value = sum(values_float) / len(values_float)
-    min_idx = values_float.index(min_value)
-    max_idx = values_float.index(max_value)
     
-    min_time = format_timestamp(values[min_idx][0])
-    max_time = format_timestamp(values[max_idx][0])
-    start_time = format_timestamp(values[0][0])
-    end_time = format_timestamp(values[-1][0])
+    if len(summaries) == 1:
+        header = "*Time Series Summary:*"
+    else:
+        shown = min(len(summaries), SLACK_SUMMARY_MAX_SERIES)
+        header = f"*Time Series Summary:* {len(summaries)} series, top {shown} by peak"
     
-    summary_text = (
-        f"*Time Series Summary:*\n"
-        f"• Metric: `{metric_name}`\n"
-        f"• Time Range: `{start_time}` to `{end_time}`\n"
-        f"• Minimum: `{min_value:.2f} {unit}` at `{min_time}`\n"
-        f"• Maximum: `{max_value:.2f} {unit}` at `{max_time}`\n"
-        f"• Average: `{avg_value:.2f} {unit}`"
-    )
+    blocks = [
+        format_series_summary(summary, multiple=len(summaries) > 1)
+        for summary in summaries[:SLACK_SUMMARY_MAX_SERIES]
+    ]
+    summary_text = header + "\n" + "\n\n".join(blocks)
     
-    return summary_text, metric_name
+    return summary_text, summaries[0].name
 
-def format_metrics_message(raw_metrics, dify_response, is_refresh=False):
-    """Format metrics data into Slack message blocks."""
+
+def format_metrics_message(raw_metrics, dify_response, is_refresh=False, changes=None):
+    """Format metrics data into Slack message blocks; `changes` describes what moved since the last analysis."""
     formatted_message = [
         {
             "type": "section",
@@ -120,6 +133,41 @@ def format_metrics_message(raw_metrics, dify_response, is_refresh=False):
                     }
                 ],
             })
+        if "fetched_at" in raw_metrics:
+            formatted_message.append({
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": f"📡 Data as of: `{raw_metrics['fetched_at']}`",
+                    }
+                ],
+            })
+    
+    limits = list(raw_metrics.get("guard", {}).get("rewrites", []))
+    if raw_metrics.get("data", {}).get("truncated"):
+        limits.append("truncated to fit the response limits")
+    if limits:
+        formatted_message.append({
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"⚠️ Query result {', '.join(limits)}",
+                }
+            ],
+        })
+    
+    if changes:
+        formatted_message.append({
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": changes,
+                }
+            ],
+        })
     
     formatted_message.extend([
         {"type": "divider"},
@@ -132,6 +180,7 @@ def format_metrics_message(raw_metrics, dify_response, is_refresh=False):
         },
         {
             "type": "section",
+            "block_id": ANALYSIS_BLOCK_ID,
             "text": {
                 "type": "mrkdwn",
                 "text": dify_response.get("analysis", "No analysis available").replace("**", "*"),
@@ -148,10 +197,45 @@ def format_metrics_message(raw_metrics, dify_response, is_refresh=False):
                         "emoji": True,
                     },
                     "style": "primary",
-                    "action_id": "refresh_metrics",
+                    "action_id": REFRESH_ACTION_ID,
                 }
             ],
         },
     ])
     
-    return formatted_message 
\ No newline at end of file
+    return formatted_message
+
+
+def _sweep_line(service):
+    """One line of a sweep report: the service, why it is flagged and its values."""
+    icon = "🔴" if service.outage else "🟠"
+    values = []
+    if service.cpu_usage is not None:
+        values.append(f"CPU `{service.cpu_usage:.1f}%`")
+    if service.memory_usage is not None:
+        values.append(f"mem `{service.memory_usage / 1024 / 1024:.0f} MB`")
+    detail = f" · {' · '.join(values)}" if values else ""
+    return f"{icon} *{service.name}* ({', '.join(service.issues)}){detail}"
+
+
+def format_sweep_message(sweep, top=FLEET_REPORT_TOP):
+    """Format a fleet sweep into one compact Slack report: counts, then the worst `top` services."""
+    flagged = sweep.flagged
+    down = sum(1 for service in flagged if service.outage)
+    header = f"🛰️ *Fleet Health Sweep*: {len(sweep.services)} services, {down} down or silent, {len(flagged) - down} flagged"
+    lines = [_sweep_line(service) for service in flagged[:top]]
+    if len(flagged) > top:
+        lines.append(f"… and {len(flagged) - top} more flagged")
+    healthy = len(sweep.services) - len(flagged)
+    if healthy:
+        lines.append(f"✅ {'All' if not flagged else healthy} {'services' if not flagged else 'others'} healthy")
+    
+    blocks = [
+        {"type": "section", "text": {"type": "mrkdwn", "text": header}},
+        {"type": "section", "text": {"type": "mrkdwn", "text": "\n".join(lines) or "ℹ️ No services configured."}},
+    ]
+    context = f"📡 {sweep.queries} Prometheus {'query' if sweep.queries == 1 else 'queries'}"
+    if sweep.errors:
+        context += f" · ⚠️ {len(sweep.errors)} failed"
+    blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": context}]})
+    return blocks
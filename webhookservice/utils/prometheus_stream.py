@@ -0,0 +1,129 @@
+import codecs
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from webhookservice.utils.series import TimeSeries
+
+# Where the series list starts; Prometheus writes status and resultType before it
+_RESULT_START = re.compile(r'"result"\s*:\s*\[')
+_STATUS = re.compile(r'"status"\s*:\s*"(\w+)"')
+_RESULT_TYPE = re.compile(r'"resultType"\s*:\s*"(\w+)"')
+_SKIPPED = " \t\r\n,"
+
+
+class PrometheusStreamDecoder:
+    """
+    Incrementally decode a Prometheus API response, one series at a time
+
+    Feed it the body in chunks. Only the series being decoded is held as
+    text; each complete series is turned into a TimeSeries (range results)
+    or kept as its small dict (instant results) and its text dropped.
+    Decoding stops early once `max_series` series have been read, and range
+    series are cut to their newest `max_points` points; either sets
+    "truncated" in the result's data.
+
+    Responses without a series list (errors, scalars, strings) are small
+    and are decoded whole.
+    """
+
+    def __init__(self, max_series: Optional[int] = None, max_points: Optional[int] = None):
+        self.max_series = max_series
+        self.max_points = max_points
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._head = ""
+        self._state = "head"  # head -> series -> (limit) -> done, or head -> raw
+        self._retry_at = 0
+        self.series: List[Any] = []
+        self.truncated = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: bytes) -> bool:
+        """Add a chunk of the body; returns False once nothing more is needed"""
+        self._buffer += self._text.decode(chunk)
+        self._advance(final=False)
+        return not self.done
+
+    def _advance(self, final: bool):
+        if self._state == "head":
+            match = _RESULT_START.search(self._buffer)
+            if not match:
+                return
+            self._head = self._buffer[: match.start()]
+            self._buffer = self._buffer[match.end():]
+            self._state = "series"
+
+        if self._state == "series":
+            self._read_series(final)
+
+        if self._state == "limit":
+            rest = self._buffer.lstrip(" \t\r\n")
+            if rest:
+                self.truncated = rest[0] == ","
+                self._state = "done"
+                self._buffer = ""
+
+    def _read_series(self, final: bool):
+        buffer, pos = self._buffer, 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in _SKIPPED:
+                pos += 1
+            if pos == len(buffer):
+                break
+            if buffer[pos] == "]":
+                self._state = "done"
+                pos = len(buffer)
+                break
+            if buffer[pos] != "{":
+                # A scalar or string result; small enough to decode whole
+                self._state = "raw"
+                self._buffer = self._head + '"result":[' + buffer[pos:]
+                return
+            if not final and len(buffer) < self._retry_at:
+                break
+            try:
+                item, pos = self._json.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                # Wait until the buffer has doubled, so a huge series is parsed in linear time
+                self._retry_at = 2 * len(buffer) - pos
+                break
+            self._retry_at = 0
+            self._add(item)
+            if self.max_series and len(self.series) >= self.max_series:
+                self._state = "limit"
+                break
+        self._buffer = buffer[pos:]
+
+    def _add(self, item: Dict[str, Any]):
+        if "values" in item:
+            values = item["values"]
+            if self.max_points and len(values) > self.max_points:
+                values = values[-self.max_points:]
+                self.truncated = True
+            self.series.append(TimeSeries.from_values(item.get("metric", {}), values))
+        else:
+            self.series.append(item)
+
+    def finish(self) -> Dict[str, Any]:
+        """The decoded response; call once the body has ended or feed returned False"""
+        if self._state in ("head", "raw"):
+            self._buffer += self._text.decode(b"", final=True)
+            return json.loads(self._buffer)
+        if self._state == "series":
+            self._advance(final=True)
+            if self._state != "done":
+                raise json.JSONDecodeError("Response ended inside the result list", self._buffer, 0)
+
+        status = _STATUS.search(self._head)
+        result_type = _RESULT_TYPE.search(self._head)
+        data = {"resultType": result_type.group(1) if result_type else None, "result": self.series}
+        if self.truncated:
+            data["truncated"] = True
+        return {"status": status.group(1) if status else "success", "data": data}
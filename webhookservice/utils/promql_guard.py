@@ -0,0 +1,383 @@
+"""
+Cost estimate and guard for ad-hoc PromQL
+
+Queries written by users or by the LLM go through guard_query before they
+reach Prometheus. The analysis is lexical rather than a full parse: it finds
+every vector selector with its label matchers, range, offset, @ modifier and
+enclosing subqueries, which is what decides how many samples Prometheus has
+to read.
+"""
+import re
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# Seconds per PromQL duration unit
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800, "y": 31536000}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y)")
+
+AGGREGATIONS = {
+    "sum", "min", "max", "avg", "group", "stddev", "stdvar", "count", "count_values",
+    "bottomk", "topk", "quantile", "limitk", "limit_ratio",
+}
+# Followed by a parenthesized label list rather than an expression
+GROUPING_KEYWORDS = {"by", "without", "on", "ignoring", "group_left", "group_right"}
+KEYWORDS = {"and", "or", "unless", "bool", "offset", "atan2", "inf", "nan"}
+
+# Series assumed behind a selector without label matchers, for the cost score
+UNSCOPED_SERIES_FACTOR = 20
+
+_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+|\#[^\n]*)
+    |(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|`[^`]*`)
+    |(?P<matchers>\{(?:[^{}"'`]|"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|`[^`]*`)*\})
+    |(?P<range>\[[^\[\]]*\])
+    |(?P<duration>(?:\d+(?:\.\d+)?(?:ms|s|m|h|d|w|y))+(?![\w.]))
+    |(?P<number>(?:0x[0-9a-fA-F]+|\d*\.?\d+(?:[eE][+-]?\d+)?))
+    |(?P<ident>[a-zA-Z_:][a-zA-Z0-9_:]*)
+    |(?P<op>=~|!~|==|!=|<=|>=|[-+*/%^<>=(),@])
+    """,
+    re.VERBOSE,
+)
+_MATCHER = re.compile(
+    r"""([a-zA-Z_][a-zA-Z0-9_]*)\s*(=~|!~|!=|=)\s*("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|`[^`]*`)"""
+)
+# Regexes that match any value, so they do not narrow a selector down
+_MATCH_ALL = {"", ".*", ".+", "(.*)", "(.+)", ".*?"}
+
+
+class QueryRejected(ValueError):
+    """An ad-hoc query the guard refuses to send to Prometheus"""
+
+
+def parse_duration(text: str) -> float:
+    """Seconds in a PromQL duration such as 5m or 1h30m; bare numbers are seconds"""
+    text = text.strip()
+    if re.fullmatch(r"\d+(?:\.\d+)?", text):
+        return float(text)
+    parts = _DURATION_PART.findall(text)
+    if not parts or "".join(value + unit for value, unit in parts) != text:
+        raise QueryRejected(f"Invalid duration: {text!r}")
+    return sum(float(value) * DURATION_UNITS[unit] for value, unit in parts)
+
+
+@dataclass
+class Selector:
+    """A vector selector and what reading it costs"""
+
+    text: str
+    scoped: bool  # A label matcher narrows it below every series of the metric
+    range: float = 0.0  # Seconds of samples per series, 0 for an instant selector
+    offset: float = 0.0  # Seconds, including the ranges of enclosing subqueries
+    at: float = 0.0  # Seconds before now that an @ modifier pins evaluation to
+    evaluations: float = 1.0  # Times it is evaluated, from enclosing subqueries
+    aggregated: bool = False  # Inside an aggregation, which bounds the series it returns
+
+    @property
+    def lookback(self) -> float:
+        return self.range + self.offset + self.at
+
+
+@dataclass
+class QueryCost:
+    """What the guard learned about a query"""
+
+    selectors: List[Selector] = field(default_factory=list)
+    subquery_range: float = 0.0  # Longest subquery, in seconds
+    aggregated: bool = False  # The whole query is one aggregation
+    scalar: bool = False  # The whole query is scalar(...), which topk cannot wrap
+    range_vector: bool = False  # The query returns a range vector, which topk cannot wrap either
+    score: float = 0.0  # Estimated sample reads, in scoped-series-at-one-scrape units
+
+    @property
+    def unscoped(self) -> List[str]:
+        return [selector.text for selector in self.selectors if not selector.scoped]
+
+    @property
+    def unbounded(self) -> List[str]:
+        """Unscoped selectors whose every series can reach the result"""
+        return [selector.text for selector in self.selectors if not selector.scoped and not selector.aggregated]
+
+    @property
+    def max_range(self) -> float:
+        return max([self.subquery_range] + [selector.range for selector in self.selectors])
+
+    @property
+    def max_lookback(self) -> float:
+        return max([0.0] + [selector.lookback for selector in self.selectors])
+
+
+def _tokenize(query: str) -> List[tuple]:
+    tokens = []
+    position = 0
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if not match:
+            raise QueryRejected(f"Unexpected character {query[position]!r} at position {position}")
+        if match.lastgroup != "space":
+            tokens.append((match.lastgroup, match.group()))
+        position = match.end()
+    return tokens
+
+
+def _is_scoped(matchers: str) -> bool:
+    for name, operator, quoted in _MATCHER.findall(matchers):
+        value = quoted[1:-1]
+        if name == "__name__":
+            continue
+        if operator == "=" and value:
+            return True
+        if operator == "=~" and value not in _MATCH_ALL:
+            return True
+    return False
+
+
+def _names_metric(name: Optional[str], matchers: str) -> bool:
+    if name:
+        return True
+    return any(
+        label == "__name__" and not (operator == "=~" and quoted[1:-1] in _MATCH_ALL) and operator in ("=", "=~")
+        for label, operator, quoted in _MATCHER.findall(matchers)
+    )
+
+
+def analyze(query: str, resolution: float, now: Optional[float] = None) -> QueryCost:
+    """
+    Find the selectors of a query and estimate its cost
+
+    `resolution` is the scrape interval: a range selector reads one sample
+    per series per interval, and subqueries without a step are evaluated
+    once per interval. An unscoped selector is counted as
+    UNSCOPED_SERIES_FACTOR series. An @ timestamp counts as looking back
+    from `now`, the current time unless given.
+    """
+    tokens = _tokenize(query)
+    if not tokens:
+        raise QueryRejected("Empty query")
+    now = time.time() if now is None else now
+    cost = QueryCost()
+    # Selector count at each open parenthesis, and whether it opens an aggregation
+    opened: List[Tuple[int, bool]] = []
+    grouping_end, grouping_aggregates = -1, False  # Last label list, and whether it followed an aggregation
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        following = tokens[i + 1] if i + 1 < len(tokens) else (None, None)
+        if kind == "op" and text == "(":
+            previous = tokens[i - 1][1] if i > 0 else None
+            opened.append((len(cost.selectors), previous in AGGREGATIONS or (i - 1 == grouping_end and grouping_aggregates)))
+        elif kind == "op" and text == ")":
+            if not opened:
+                raise QueryRejected("Unbalanced parentheses")
+            start, _ = opened.pop()
+            if following[0] == "range":
+                i += 1
+                if ":" not in following[1]:
+                    raise QueryRejected(f"Range {following[1]} applied to an expression; use a subquery [range:step]")
+                i = _apply_subquery(cost, tokens, i, start, resolution, now)
+        elif (kind, text) in (("op", "@"), ("ident", "offset")):
+            raise QueryRejected(f"{text} must follow a selector or subquery")
+        elif kind == "ident" and text in GROUPING_KEYWORDS:
+            if following == ("op", "("):
+                # A label list such as by (job); its names are not selectors
+                grouping_aggregates = text in ("by", "without") and i > 0 and tokens[i - 1][1] in AGGREGATIONS
+                i += 1
+                while i < len(tokens) and tokens[i] != ("op", ")"):
+                    i += 1
+                grouping_end = i
+        elif kind == "matchers" or (
+            kind == "ident" and text not in KEYWORDS and text not in AGGREGATIONS and following != ("op", "(")
+        ):
+            name, matchers = (None, text) if kind == "matchers" else (text, "")
+            if kind == "ident" and following[0] == "matchers":
+                matchers = following[1]
+                i += 1
+            if not _names_metric(name, matchers):
+                raise QueryRejected(f"Selector {matchers} does not name a metric, so it reads every series")
+            selector = Selector(f"{name or ''}{matchers}", _is_scoped(matchers))
+            selector.aggregated = any(aggregates for _, aggregates in opened)
+            cost.selectors.append(selector)
+            if i + 1 < len(tokens) and tokens[i + 1][0] == "range" and ":" in tokens[i + 1][1]:
+                i = _apply_subquery(cost, tokens, i + 1, len(cost.selectors) - 1, resolution, now)
+            else:
+                if i + 1 < len(tokens) and tokens[i + 1][0] == "range":
+                    i += 1
+                    selector.range = parse_duration(tokens[i][1][1:-1])
+                i, selector.offset, selector.at = _read_modifiers(tokens, i, now)
+        i += 1
+    if opened:
+        raise QueryRejected("Unbalanced parentheses")
+
+    cost.aggregated = _is_aggregation(tokens)
+    cost.scalar = tokens[0] == ("ident", "scalar") and _closes_at_end(tokens, 1)
+    last = len(tokens) - 1
+    while last > 0:
+        if tokens[last][0] in ("duration", "number") or tokens[last] in (("op", "-"), ("op", "@"), ("ident", "offset")):
+            last -= 1
+        elif last > 2 and tokens[last - 2][1] in ("start", "end") and tokens[last - 1:last + 1] == [("op", "("), ("op", ")")]:
+            last -= 3
+        else:
+            break
+    cost.range_vector = tokens[last][0] == "range"
+    cost.score = sum(
+        (1.0 if selector.scoped else UNSCOPED_SERIES_FACTOR)
+        * max(1.0, selector.range / resolution)
+        * selector.evaluations
+        for selector in cost.selectors
+    )
+    return cost
+
+
+def _read_modifiers(tokens: List[tuple], i: int, now: float) -> Tuple[int, float, float]:
+    """
+    The offset and @ modifiers after token i, in either order
+
+    Returns the index of the last token read, the offset, and how far
+    before `now` the @ modifier pins evaluation to.
+    """
+    offset, at = 0.0, 0.0
+    while i + 1 < len(tokens):
+        if tokens[i + 1] == ("ident", "offset"):
+            i, offset = _read_offset(tokens, i)
+        elif tokens[i + 1] == ("op", "@"):
+            i, at = _read_at(tokens, i, now)
+        else:
+            break
+    return i, offset, at
+
+
+def _read_at(tokens: List[tuple], i: int, now: float) -> Tuple[int, float]:
+    """The @ modifier after token i, as seconds before now, and the index of its last token"""
+    i += 2
+    if i + 2 < len(tokens) and tokens[i][1] in ("start", "end") and tokens[i + 1:i + 3] == [("op", "("), ("op", ")")]:
+        # The query's own evaluation time, for an instant query
+        return i + 2, 0.0
+    sign = 1.0
+    if i < len(tokens) and tokens[i] in (("op", "-"), ("op", "+")):
+        sign = -1.0 if tokens[i][1] == "-" else 1.0
+        i += 1
+    if i >= len(tokens) or tokens[i][0] != "number":
+        raise QueryRejected("@ without a timestamp")
+    text = tokens[i][1]
+    timestamp = sign * (float(int(text, 16)) if text.lower().startswith("0x") else float(text))
+    # A timestamp ahead of now reads nothing older than an unpinned query
+    return i, max(0.0, now - timestamp)
+
+
+def _read_offset(tokens: List[tuple], i: int) -> Tuple[int, float]:
+    """The offset modifier after token i, and the index of its last token"""
+    i += 2
+    if i < len(tokens) and tokens[i] == ("op", "-"):
+        # A negative offset reads ahead of the evaluation time, not further back
+        i += 1
+    if i >= len(tokens) or tokens[i][0] not in ("duration", "number"):
+        raise QueryRejected("offset without a duration")
+    return i, parse_duration(tokens[i][1])
+
+
+def _apply_subquery(cost: QueryCost, tokens: List[tuple], i: int, start: int, resolution: float, now: float) -> int:
+    """
+    Account for the subquery range at token i over the selectors from `start` on
+
+    Returns the index of the subquery's last token, including any modifiers.
+    """
+    span, _, step = tokens[i][1][1:-1].partition(":")
+    span = parse_duration(span)
+    step = parse_duration(step) if step.strip() else resolution
+    if step <= 0:
+        raise QueryRejected("Subquery step must be positive")
+    cost.subquery_range = max(cost.subquery_range, span)
+    i, offset, at = _read_modifiers(tokens, i, now)
+    for selector in cost.selectors[start:]:
+        selector.evaluations *= max(1.0, span / step)
+        selector.offset += span + offset + at
+    return i
+
+
+def _closes_at_end(tokens: List[tuple], open_index: int) -> bool:
+    """Whether the parenthesis at open_index closes with the query's last token"""
+    if open_index >= len(tokens) or tokens[open_index] != ("op", "("):
+        return False
+    depth = 0
+    for index in range(open_index, len(tokens)):
+        kind, text = tokens[index]
+        if kind == "op" and text in "()":
+            depth += 1 if text == "(" else -1
+            if depth == 0:
+                return index == len(tokens) - 1
+    return False
+
+
+def _is_aggregation(tokens: List[tuple]) -> bool:
+    """Whether the whole query is one aggregation, e.g. sum by (job) (...)"""
+    if not tokens or tokens[0][1] not in AGGREGATIONS:
+        return False
+    index = 1
+    if index < len(tokens) and tokens[index][1] in ("by", "without"):
+        index += 1
+        while index < len(tokens) and tokens[index] != ("op", ")"):
+            index += 1
+        index += 1
+    if _closes_at_end(tokens, index):
+        return True
+    # sum(...) by (job)
+    depth = 0
+    for position in range(index, len(tokens)):
+        kind, text = tokens[position]
+        if kind == "op" and text in "()":
+            depth += 1 if text == "(" else -1
+            if depth == 0:
+                rest = tokens[position + 1:]
+                return bool(rest) and rest[0][1] in ("by", "without") and _closes_at_end(tokens, position + 2)
+    return False
+
+
+@dataclass
+class GuardedQuery:
+    """A query cleared to run, possibly rewritten"""
+
+    query: str
+    original: str
+    cost: QueryCost
+    rewrites: List[str] = field(default_factory=list)
+
+
+def guard_query(
+    query: str,
+    resolution: float,
+    max_cost: float,
+    max_range: float,
+    max_lookback: float,
+    max_series: int,
+    now: Optional[float] = None,
+) -> GuardedQuery:
+    """
+    Check an ad-hoc query, rewriting or rejecting it if it is too expensive
+
+    Raises QueryRejected when a range, subquery, offset or @ timestamp
+    reaches further than the limits, or the estimated cost is above
+    `max_cost`. A query that reads unscoped selectors outside any
+    aggregation is wrapped in topk(max_series, ...), so it cannot return
+    every series of a metric.
+    """
+    query = query.strip()
+    if not query:
+        raise QueryRejected("Empty query")
+    cost = analyze(query, resolution, now)
+    if cost.max_range > max_range:
+        raise QueryRejected(
+            f"Range of {cost.max_range / 3600:g}h is longer than the {max_range / 3600:g}h allowed; "
+            "use the range report for long trends"
+        )
+    if cost.max_lookback > max_lookback:
+        raise QueryRejected(f"Query looks back {cost.max_lookback / 86400:g}d, more than the {max_lookback / 86400:g}d allowed")
+    if cost.score > max_cost:
+        hint = f"; add label matchers to {', '.join(cost.unscoped)}" if cost.unscoped else ""
+        raise QueryRejected(f"Query is too expensive (estimated cost {cost.score:.0f}, limit {max_cost:.0f}){hint}")
+
+    guarded = GuardedQuery(query, query, cost)
+    if cost.unbounded and not (cost.scalar or cost.range_vector):
+        guarded.query = f"topk({max_series}, {query})"
+        guarded.rewrites.append(f"limited to the top {max_series} series")
+    return guarded
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from webhookservice.utils.async_http_client import run_sync
+from webhookservice.utils.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[Optional[Deadline]], Awaitable[Any]]
+
+
+@dataclass
+class _Entry:
+    value: Any
+    fetched_at: float  # Unix time the value was loaded
+    loaded_at: float  # Refresher clock reading at load time
+
+
+class BackgroundRefresher:
+    """
+    Keep named values warm by reloading them in the background
+
+    Loaders are coroutine functions. A daemon thread reloads every
+    registered value each `interval` seconds on the shared event loop.
+    Reads are stale-while-revalidate: a value younger than `interval` is
+    served as is, one up to `max_stale` seconds old is served while a
+    background reload is started, and only a missing or older value is
+    loaded by the caller. A failed reload keeps the old value.
+    """
+
+    def __init__(self, interval: float, max_stale: float, clock: Callable[[], float] = time.monotonic):
+        self.interval = interval
+        self.max_stale = max_stale
+        self.clock = clock
+        self._loaders: Dict[str, Loader] = {}
+        self._entries: Dict[str, _Entry] = {}
+        self._in_flight = set()
+        self._revalidations = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def register(self, name: str, loader: Loader):
+        with self._lock:
+            self._loaders[name] = loader
+
+    async def refresh(self, name: str, deadline: Optional[Deadline] = None) -> Optional[_Entry]:
+        """Reload a value now; returns the new entry, or None if the load failed"""
+        try:
+            value = await self._loaders[name](deadline)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logger.warning(f"Refreshing {name} failed: {str(e)}")
+            return None
+        entry = _Entry(value, time.time(), self.clock())
+        with self._lock:
+            self._entries[name] = entry
+        return entry
+
+    def _revalidate(self, name: str):
+        with self._lock:
+            if name in self._in_flight:
+                return
+            self._in_flight.add(name)
+
+        async def run():
+            try:
+                await self.refresh(name)
+            finally:
+                with self._lock:
+                    self._in_flight.discard(name)
+
+        # Held until done; the loop only keeps weak references to its tasks
+        task = asyncio.ensure_future(run())
+        self._revalidations.add(task)
+        task.add_done_callback(self._revalidations.discard)
+
+    async def get(self, name: str, deadline: Optional[Deadline] = None) -> Tuple[Any, float]:
+        """
+        The value and the Unix time it was fetched at
+
+        Raises:
+            Exception: Whatever the loader raised, if there was no usable
+                       cached value and loading it failed
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            age = self.clock() - entry.loaded_at if entry else None
+            if entry and age <= self.interval:
+                self.fresh_hits += 1
+                return entry.value, entry.fetched_at
+            if entry and age <= self.max_stale:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+
+        if entry and age <= self.max_stale:
+            self._revalidate(name)
+            return entry.value, entry.fetched_at
+
+        value = await self._loaders[name](deadline)
+        entry = _Entry(value, time.time(), self.clock())
+        with self._lock:
+            self._entries[name] = entry
+        return entry.value, entry.fetched_at
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                names = list(self._loaders)
+            for name in names:
+                run_sync(self.refresh(name))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the background thread, if it is not running yet"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="metrics-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread:
+            thread.join(timeout=self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self.clock()
+            return {
+                "running": bool(self._thread and self._thread.is_alive()),
+                "interval": self.interval,
+                "max_stale": self.max_stale,
+                "fresh_hits": self.fresh_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "ages": {name: round(now - entry.loaded_at, 3) for name, entry in self._entries.items()},
+            }
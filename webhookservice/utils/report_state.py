@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from config.settings import SLACK_SUMMARY_MAX_SERIES
+from webhookservice.utils.series import as_series
+from webhookservice.utils.series_stats import rank_by_peak, summarize
+
+logger = logging.getLogger(__name__)
+
+REFRESH_ACTION_ID = "refresh_metrics"
+ANALYSIS_BLOCK_ID = "analysis"
+
+# Slack rejects button values longer than this
+BUTTON_VALUE_MAX_LENGTH = 2000
+
+# Blocks that change on every render without the report changing
+_VOLATILE_BLOCK_TYPES = ("context", "actions")
+
+
+def report_digest(metrics: Dict[str, Any]) -> Dict[str, float]:
+    """
+    The handful of numbers a report shows, for comparing two views of it
+
+    Current metrics give their values; range results give the last, peak and
+    mean of the series the report shows; instant vectors give each value.
+    """
+    data = metrics.get("data") or {}
+    digest = {}
+    if data.get("resultType") == "matrix":
+        summaries = rank_by_peak(summarize([as_series(series) for series in data.get("result", [])]))
+        for summary in summaries[:SLACK_SUMMARY_MAX_SERIES]:
+            label = ",".join(f"{k}={v}" for k, v in sorted(summary.metric.items()) if k != "__name__") or summary.name
+            for stat in ("last", "max", "mean"):
+                digest[f"{label} {stat}"] = getattr(summary, stat)
+    elif data.get("resultType") == "vector":
+        for item in data.get("result", [])[:SLACK_SUMMARY_MAX_SERIES]:
+            label = ",".join(f"{k}={v}" for k, v in sorted(item.get("metric", {}).items())) or "value"
+            digest[label] = float(item["value"][1])
+    else:
+        for key in ("cpu_usage", "memory_usage"):
+            if isinstance(metrics.get(key), (int, float)):
+                digest[key] = float(metrics[key])
+    return {key: float(f"{value:.4g}") for key, value in digest.items()}
+
+
+def digest_changes(previous: Dict[str, float], current: Dict[str, float]) -> Dict[str, Optional[float]]:
+    """
+    Relative change of every digest value since the previous view
+
+    Values that appeared or disappeared map to None.
+    """
+    changes = {}
+    for key in previous.keys() | current.keys():
+        old, new = previous.get(key), current.get(key)
+        if old is None or new is None:
+            changes[key] = None
+        elif old == new:
+            changes[key] = 0.0
+        else:
+            changes[key] = (new - old) / abs(old) if old else float("inf")
+    return changes
+
+
+def is_significant(changes: Dict[str, Optional[float]], threshold: float) -> bool:
+    """Whether any value moved by more than `threshold` (a fraction), or came or went"""
+    return any(change is None or abs(change) > threshold for change in changes.values())
+
+
+def describe_changes(
+    previous: Dict[str, float], current: Dict[str, float], changes: Dict[str, Optional[float]]
+) -> str:
+    """One line of mrkdwn saying what changed since the values the analysis was written for"""
+    moved = [key for key in sorted(changes) if changes[key] != 0.0]
+    if not moved:
+        return "🔁 No change since last analysis"
+    parts = []
+    for key in moved:
+        if key not in previous:
+            parts.append(f"`{key}` new: `{current[key]:.4g}`")
+        elif key not in current:
+            parts.append(f"`{key}` gone")
+        else:
+            parts.append(f"`{key}` `{previous[key]:.4g}` → `{current[key]:.4g}` ({changes[key]:+.1%})")
+    return "🔁 Since last analysis: " + ", ".join(parts)
+
+
+def blocks_hash(blocks: List[Dict[str, Any]]) -> str:
+    """Hash of what a report shows, ignoring timestamps and the Refresh button"""
+    content = [block for block in blocks if block.get("type") not in _VOLATILE_BLOCK_TYPES]
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def attach_report_state(blocks: List[Dict[str, Any]], state: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Store `state` in the report's Refresh button so the next refresh can use it"""
+    value = json.dumps(state, separators=(",", ":"))
+    if len(value) > BUTTON_VALUE_MAX_LENGTH:
+        # Keep the query; without the digest the next refresh just re-analyzes
+        value = json.dumps({"report": state.get("report")}, separators=(",", ":"))
+    for block in blocks:
+        if block.get("type") == "actions":
+            for element in block.get("elements", []):
+                if element.get("action_id") == REFRESH_ACTION_ID:
+                    element["value"] = value
+    return blocks
+
+
+def read_report_state(action: Dict[str, Any]) -> Dict[str, Any]:
+    """The state stored in a Refresh button; reports without one refresh current metrics"""
+    try:
+        state = json.loads(action.get("value") or "{}")
+    except ValueError:
+        logger.warning("Ignoring unreadable Refresh button value")
+        state = {}
+    state.setdefault("report", {"type": "current"})
+    return state
+
+
+def shown_analysis(blocks: List[Dict[str, Any]]) -> Optional[str]:
+    """The analysis text a posted report shows, if it has one to reuse"""
+    for block in blocks or []:
+        if block.get("block_id") == ANALYSIS_BLOCK_ID:
+            return block.get("text", {}).get("text")
+    return None
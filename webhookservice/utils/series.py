@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Sequence, Union
+
+import numpy as np
+
+
+class TimeSeries:
+    """
+    One range query series, held as columns
+
+    Timestamps are int64 Unix seconds and values float64; both are parsed
+    once when the Prometheus response arrives and shared read-only by every
+    consumer. Human-readable timestamps are only produced when the series is
+    rendered.
+    """
+
+    __slots__ = ("metric", "timestamps", "values")
+
+    def __init__(self, metric: Dict[str, str], timestamps: np.ndarray, values: np.ndarray):
+        self.metric = metric
+        self.timestamps = timestamps
+        self.values = values
+        self.timestamps.flags.writeable = False
+        self.values.flags.writeable = False
+
+    @classmethod
+    def from_values(cls, metric: Dict[str, str], values: Sequence[Sequence[Any]]) -> "TimeSeries":
+        """Parse Prometheus [[timestamp, "value"], ...] pairs"""
+        if not values:
+            return cls(metric, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+        timestamps, samples = zip(*values)
+        return cls(
+            metric,
+            np.fromiter((int(round(float(t))) for t in timestamps), dtype=np.int64, count=len(values)),
+            np.array(samples, dtype=np.float64),
+        )
+
+    @property
+    def name(self) -> str:
+        return self.metric.get("__name__", "unknown")
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __repr__(self) -> str:
+        return f"TimeSeries({self.metric}, {len(self)} points)"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Prometheus-shaped series with readable timestamps, for JSON and Slack output"""
+        return {
+            "metric": dict(self.metric),
+            "values": [
+                [format_epoch(timestamp), repr(value)]
+                for timestamp, value in zip(self.timestamps.tolist(), self.values.tolist())
+            ],
+        }
+
+
+def format_epoch(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def as_series(series: Union[TimeSeries, Dict[str, Any]]) -> TimeSeries:
+    """A TimeSeries for either a parsed series or a raw Prometheus series dict"""
+    if isinstance(series, TimeSeries):
+        return series
+    return TimeSeries.from_values(series.get("metric", {}), series.get("values", []))
+
+
+def series_result(series: Iterable[TimeSeries]) -> Dict[str, Any]:
+    """A query_range style response whose result entries are TimeSeries"""
+    return {"status": "success", "data": {"resultType": "matrix", "result": list(series)}}
+
+
+def render_series_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a response with every TimeSeries turned back into plain JSON"""
+    data = result.get("data")
+    if not isinstance(data, dict) or not any(isinstance(s, TimeSeries) for s in data.get("result") or []):
+        return result
+    rendered: List[Any] = [s.to_dict() if isinstance(s, TimeSeries) else s for s in data["result"]]
+    return {**result, "data": {**data, "result": rendered}}
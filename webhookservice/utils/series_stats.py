@@ -0,0 +1,142 @@
+from dataclasses import dataclass, replace
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from webhookservice.utils.series import TimeSeries
+
+
+@dataclass
+class SeriesSummary:
+    """Summary statistics of one series, in the series' own unit"""
+
+    index: int  # Position of the series in the summarized list
+    metric: Dict[str, str]
+    points: int
+    start: int
+    end: int
+    min: float
+    max: float
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+    last: float
+    slope: float  # Least-squares trend, per hour
+    min_at: int
+    max_at: int
+
+    @property
+    def name(self) -> str:
+        return self.metric.get("__name__", "unknown")
+
+    def scaled(self, divisor: float) -> "SeriesSummary":
+        """The same summary with every value divided by `divisor`, e.g. bytes to MB"""
+        return replace(
+            self,
+            **{key: getattr(self, key) / divisor for key in ("min", "max", "mean", "p50", "p95", "p99", "last", "slope")},
+        )
+
+    def rounded(self, precision: int) -> Dict[str, float]:
+        """The statistics as a compact dict, values rounded to `precision` decimals"""
+        stats = {
+            key: round(getattr(self, key), precision)
+            for key in ("min", "max", "mean", "p50", "p95", "p99", "last")
+        }
+        stats["slope_per_hour"] = round(self.slope, precision)
+        stats["min_at"] = self.min_at
+        stats["max_at"] = self.max_at
+        return stats
+
+
+def display_unit(metric_name: str) -> Tuple[str, float]:
+    """Unit label and divisor used to show a metric, e.g. bytes as MB"""
+    if "bytes" in metric_name.lower():
+        return "MB", 1024 * 1024
+    return "", 1.0
+
+
+def _columns(series: Sequence[TimeSeries]) -> Tuple[np.ndarray, np.ndarray]:
+    """Series as (n, width) timestamp and value matrices; shorter rows are NaN-padded"""
+    lengths = {len(s) for s in series}
+    if len(lengths) == 1:
+        return np.stack([s.timestamps for s in series]), np.stack([s.values for s in series])
+
+    width = max(lengths)
+    timestamps = np.zeros((len(series), width), dtype=np.int64)
+    values = np.full((len(series), width), np.nan)
+    for row, s in enumerate(series):
+        timestamps[row, : len(s)] = s.timestamps
+        values[row, : len(s)] = s.values
+    return timestamps, values
+
+
+def summarize(series: Sequence[TimeSeries]) -> List[SeriesSummary]:
+    """
+    Summary statistics for every series, computed together
+
+    All series are stacked into one matrix so every statistic is a single
+    NumPy reduction over all of them. Series without any numeric samples
+    are left out.
+
+    Returns:
+        List[SeriesSummary]: One per remaining series, in input order; each
+                             records its position in `series` as `index`
+    """
+    indices = [i for i, s in enumerate(series) if len(s)]
+    series = [series[i] for i in indices]
+    if not series:
+        return []
+
+    timestamps, values = _columns(series)
+    valid = ~np.isnan(values)
+    has_values = valid.any(axis=1)
+    if not has_values.all():
+        series = [s for s, keep in zip(series, has_values) if keep]
+        indices = [i for i, keep in zip(indices, has_values) if keep]
+        timestamps, values, valid = timestamps[has_values], values[has_values], valid[has_values]
+        if not series:
+            return []
+
+    rows = np.arange(len(series))
+    counts = valid.sum(axis=1)
+    complete = bool(valid.all())
+
+    argmin = np.nanargmin(values, axis=1)
+    argmax = np.nanargmax(values, axis=1)
+    percentile = np.percentile if complete else np.nanpercentile
+    p50, p95, p99 = percentile(values, [50, 95, 99], axis=1)
+    mean = np.nanmean(values, axis=1)
+
+    first_index = valid.argmax(axis=1)
+    last_index = valid.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+
+    # Least-squares slope per row, over valid samples only
+    hours = (timestamps - timestamps[rows, first_index][:, None]) / 3600.0
+    hours_mean = np.where(valid, hours, 0).sum(axis=1) / counts
+    dx = np.where(valid, hours - hours_mean[:, None], 0)
+    dy = np.where(valid, values - mean[:, None], 0)
+    spread = (dx * dx).sum(axis=1)
+    slope = np.divide((dx * dy).sum(axis=1), spread, out=np.zeros(len(series)), where=spread > 0)
+
+    columns = zip(
+        counts.tolist(),
+        timestamps[rows, first_index].tolist(),
+        timestamps[rows, last_index].tolist(),
+        values[rows, argmin].tolist(),
+        values[rows, argmax].tolist(),
+        mean.tolist(),
+        p50.tolist(),
+        p95.tolist(),
+        p99.tolist(),
+        values[rows, last_index].tolist(),
+        slope.tolist(),
+        timestamps[rows, argmin].tolist(),
+        timestamps[rows, argmax].tolist(),
+    )
+    return [SeriesSummary(i, s.metric, *column) for i, s, column in zip(indices, series, columns)]
+
+
+def rank_by_peak(summaries: List[SeriesSummary]) -> List[SeriesSummary]:
+    """Summaries ordered by maximum value, highest first; ties keep their order"""
+    return sorted(summaries, key=lambda summary: -summary.max)
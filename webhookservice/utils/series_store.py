@@ -0,0 +1,154 @@
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from webhookservice.utils.series import TimeSeries, as_series, series_result
+
+
+@dataclass
+class _Window:
+    """Samples kept for one (query, step), covering [first_ts, last_ts]"""
+
+    span: float = 0.0
+    first_ts: Optional[float] = None
+    last_ts: Optional[float] = None
+    series: Dict[Tuple, TimeSeries] = field(default_factory=dict)
+
+
+def _series_key(metric: Dict[str, str]) -> Tuple:
+    return tuple(sorted(metric.items()))
+
+
+class SeriesStore:
+    """
+    Sliding-window store of range query samples, per (query, step)
+
+    Ranges are assumed to be aligned to their step, so every fetch of the
+    same query lands on the same sample timestamps. After the first fetch
+    only the tail has to be requested. The tail starts at the newest cached
+    sample, or earlier for an `overlap` of more than one step: that sample
+    may have been computed before Prometheus ingested the last scrape, so
+    it is fetched again and overwritten. Samples older than the
+    largest window asked for are dropped.
+    """
+
+    def __init__(self, maxsize: int = 64, overlap: float = 0.0):
+        self.maxsize = maxsize
+        self.overlap = overlap
+        self._windows: "OrderedDict[Tuple[str, float], _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.tail_fetches = 0
+        self.full_fetches = 0
+        self.cached_hits = 0
+
+    def _window(self, query: str, step: float) -> _Window:
+        key = (query, step)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _Window()
+            if len(self._windows) > self.maxsize:
+                self._windows.popitem(last=False)
+        self._windows.move_to_end(key)
+        return window
+
+    def missing_start(self, query: str, step: float, start: float, end: float) -> Optional[float]:
+        """
+        Where the fetch for [start, end] has to begin, or None if it is all cached
+
+        Also records the window size, which decides what gets evicted.
+        """
+        with self._lock:
+            window = self._window(query, step)
+            window.span = max(window.span, end - start)
+            if window.first_ts is None or window.first_ts > start or window.last_ts + step < start:
+                self.full_fetches += 1
+                return start
+            if window.last_ts >= end:
+                self.cached_hits += 1
+                return None
+            self.tail_fetches += 1
+            # The newest cached sample, and any others within the overlap
+            refetch = max(0, math.ceil(self.overlap / step) - 1) * step
+            return max(window.first_ts, window.last_ts - refetch)
+
+    def merge(self, query: str, step: float, result: Dict[str, Any], fetch_start: float, fetch_end: float):
+        """
+        Add a query_range result covering [fetch_start, fetch_end] to the window
+
+        A series' cached samples in that range are replaced by the fetched
+        ones, so a re-fetched tail overwrites the samples it overlaps.
+        """
+        with self._lock:
+            window = self._window(query, step)
+            if window.first_ts is None or not window.first_ts <= fetch_start <= window.last_ts + step:
+                # Not contiguous with what is cached; start over
+                window.series = {}
+                window.first_ts = fetch_start
+                window.last_ts = fetch_end
+
+            for item in result.get("data", {}).get("result", []):
+                fetched = as_series(item)
+                key = _series_key(fetched.metric)
+                series = window.series.get(key)
+                if series is None:
+                    window.series[key] = fetched
+                    continue
+                lo = int(np.searchsorted(series.timestamps, fetch_start, side="left"))
+                hi = int(np.searchsorted(series.timestamps, fetch_end, side="right"))
+                window.series[key] = TimeSeries(
+                    series.metric,
+                    np.concatenate((series.timestamps[:lo], fetched.timestamps, series.timestamps[hi:])),
+                    np.concatenate((series.values[:lo], fetched.values, series.values[hi:])),
+                )
+            window.last_ts = max(window.last_ts, fetch_end)
+            self._evict(window)
+
+    def _evict(self, window: _Window):
+        cutoff = window.last_ts - window.span
+        if cutoff <= window.first_ts:
+            return
+        window.first_ts = cutoff
+        for key in list(window.series):
+            series = window.series[key]
+            drop = int(np.searchsorted(series.timestamps, cutoff, side="left"))
+            if drop == len(series):
+                del window.series[key]
+            elif drop:
+                window.series[key] = TimeSeries(series.metric, series.timestamps[drop:], series.values[drop:])
+
+    def slice(self, query: str, step: float, start: float, end: float) -> Dict[str, Any]:
+        """
+        The cached samples in [start, end], as a query_range style response
+
+        The result entries are TimeSeries views onto the stored columns.
+        """
+        with self._lock:
+            window = self._windows.get((query, step))
+            result = []
+            for series in window.series.values() if window else ():
+                lo = int(np.searchsorted(series.timestamps, start, side="left"))
+                hi = int(np.searchsorted(series.timestamps, end, side="right"))
+                if lo < hi:
+                    result.append(TimeSeries(series.metric, series.timestamps[lo:hi], series.values[lo:hi]))
+        return series_result(result)
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "windows": len(self._windows),
+                "maxsize": self.maxsize,
+                "samples": sum(
+                    len(series.timestamps) for window in self._windows.values() for series in window.series.values()
+                ),
+                "full_fetches": self.full_fetches,
+                "tail_fetches": self.tail_fetches,
+                "cached_hits": self.cached_hits,
+            }
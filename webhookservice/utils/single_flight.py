@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from webhookservice.utils.deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Share one in-flight call among concurrent callers asking for the same thing
+
+    The first caller for a key runs the call; callers arriving while it is
+    running wait for it and get the same result, or the same exception.
+    Nothing is kept once the call returns, so a later caller starts a new
+    call. Results are shared objects: callers must not modify them. Calls
+    are coroutines, shared between callers on the same event loop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        # Counters are also read from worker threads
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    async def do(
+        self, key: Hashable, fn: Callable[[], Awaitable[Any]], deadline: Optional[Deadline] = None
+    ) -> Any:
+        """
+        Run `fn`, or wait for the identical call already running
+
+        Args:
+            key: What identifies identical calls, e.g. a normalized request
+            fn: Coroutine function to run when none is in flight for `key`
+            deadline: Bounds how long a waiting caller waits for the shared call
+
+        Raises:
+            DeadlineExceeded: If the deadline runs out while waiting
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = asyncio.get_running_loop().create_future()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            logger.debug(f"Joining in-flight {self.name} call: {key}")
+            timeout = deadline.timeout() if deadline is not None else None
+            # Unlike wait_for, giving up here leaves the shared call running for the others
+            done, _ = await asyncio.wait({call}, timeout=timeout)
+            if not done:
+                raise DeadlineExceeded(f"Deadline exceeded waiting for in-flight {self.name} call")
+            return call.result()
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            with self._lock:
+                self.failures += 1
+            if isinstance(e, asyncio.CancelledError):
+                call.cancel()
+            else:
+                call.set_exception(e)
+                # Marks it retrieved, so a call nobody joined doesn't log it again
+                call.exception()
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.executions + self.coalesced
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "failures": self.failures,
+                "in_flight": len(self._calls),
+                "coalesced_rate": round(self.coalesced / calls, 4) if calls else None,
+            }
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """
+    Get the shared single-flight group for an upstream service
+
+    Args:
+        name: Upstream name, e.g. 'prometheus', 'dify' or 'jenkins'
+    """
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = _groups[name] = SingleFlight(name)
+        return group
+
+
+def get_single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """Coalescing counters for every upstream"""
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.stats() for name, group in groups.items()}
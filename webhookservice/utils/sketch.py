@@ -0,0 +1,186 @@
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+
+from webhookservice.utils.series_stats import SeriesSummary
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative error (DDSketch)
+
+    Values fall into logarithmic buckets whose bounds are a factor
+    (1 + a) / (1 - a) apart, so any quantile is returned within a relative
+    error `a` of a value at that rank. Sketches with the same accuracy merge
+    by adding bucket counts, which makes the result independent of how the
+    values were split up. When a sign has more than `max_buckets` buckets,
+    its smallest-magnitude ones are folded together, so the size stays
+    bounded; only the lowest quantiles lose accuracy.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _add_to(self, buckets: Dict[int, int], magnitudes: np.ndarray):
+        indices, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64), return_counts=True)
+        for index, count in zip(indices.tolist(), counts.tolist()):
+            buckets[index] = buckets.get(index, 0) + count
+        self._collapse(buckets)
+
+    def _collapse(self, buckets: Dict[int, int]):
+        if len(buckets) <= self.max_buckets:
+            return
+        ordered = sorted(buckets)
+        folded = ordered[: len(ordered) - self.max_buckets + 1]
+        total = sum(buckets.pop(index) for index in folded)
+        buckets[folded[-1]] = total
+
+    def add(self, values: np.ndarray):
+        """Add an array of values; NaNs are ignored"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.zeros += int(np.count_nonzero(values == 0))
+        if (values > 0).any():
+            self._add_to(self.positive, values[values > 0])
+        if (values < 0).any():
+            self._add_to(self.negative, -values[values < 0])
+
+    def merge(self, other: "QuantileSketch"):
+        """Add another sketch's values into this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in theirs.items():
+                mine[index] = mine.get(index, 0) + count
+            self._collapse(mine)
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The value at quantile `q` (0..1), or None if the sketch is empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.positive))
+
+
+@dataclass
+class RunningSummary:
+    """
+    Statistics of one series built up chunk by chunk, without keeping its points
+
+    Moments are combined with Chan et al.'s pairwise update, so the mean and
+    least-squares slope are as accurate as computing them in one pass.
+    """
+
+    metric: Dict[str, str]
+    relative_accuracy: float = 0.01
+    count: int = 0
+    start: Optional[int] = None
+    end: Optional[int] = None
+    min: float = math.inf
+    max: float = -math.inf
+    min_at: int = 0
+    max_at: int = 0
+    last: float = math.nan
+    mean: float = 0.0  # Of values
+    mean_hours: float = 0.0  # Of timestamps, in hours
+    m2_hours: float = 0.0  # Sum of squared timestamp deviations
+    co_moment: float = 0.0  # Sum of timestamp x value deviations
+    sketch: QuantileSketch = field(default=None)
+
+    def __post_init__(self):
+        if self.sketch is None:
+            self.sketch = QuantileSketch(self.relative_accuracy)
+
+    def add(self, timestamps: np.ndarray, values: np.ndarray):
+        """Fold in a chunk of samples, in time order"""
+        valid = ~np.isnan(values)
+        timestamps, values = timestamps[valid], values[valid]
+        if not len(values):
+            return
+        chunk = RunningSummary(self.metric, self.relative_accuracy)
+        hours = timestamps / 3600.0
+        chunk.count = len(values)
+        chunk.start, chunk.end = int(timestamps[0]), int(timestamps[-1])
+        low, high = int(np.argmin(values)), int(np.argmax(values))
+        chunk.min, chunk.min_at = float(values[low]), int(timestamps[low])
+        chunk.max, chunk.max_at = float(values[high]), int(timestamps[high])
+        chunk.last = float(values[-1])
+        chunk.mean, chunk.mean_hours = float(values.mean()), float(hours.mean())
+        dx, dy = hours - chunk.mean_hours, values - chunk.mean
+        chunk.m2_hours, chunk.co_moment = float(dx @ dx), float(dx @ dy)
+        chunk.sketch.add(values)
+        self.merge(chunk)
+
+    def merge(self, other: "RunningSummary"):
+        """Combine with the summary of another stretch of the same series"""
+        if not other.count:
+            return
+        if not self.count:
+            self.__dict__.update({k: v for k, v in other.__dict__.items() if k not in ("metric", "sketch")})
+            self.sketch.merge(other.sketch)
+            return
+        n = self.count + other.count
+        delta_hours = other.mean_hours - self.mean_hours
+        delta = other.mean - self.mean
+        weight = self.count * other.count / n
+        self.m2_hours += other.m2_hours + delta_hours * delta_hours * weight
+        self.co_moment += other.co_moment + delta_hours * delta * weight
+        self.mean_hours += delta_hours * other.count / n
+        self.mean += delta * other.count / n
+        self.count = n
+        if other.min < self.min:
+            self.min, self.min_at = other.min, other.min_at
+        if other.max > self.max:
+            self.max, self.max_at = other.max, other.max_at
+        if other.end >= self.end:
+            self.end, self.last = other.end, other.last
+        self.start = min(self.start, other.start)
+        self.sketch.merge(other.sketch)
+
+    def to_summary(self, index: int = 0) -> SeriesSummary:
+        return SeriesSummary(
+            index=index,
+            metric=self.metric,
+            points=self.count,
+            start=self.start,
+            end=self.end,
+            min=self.min,
+            max=self.max,
+            mean=self.mean,
+            p50=self.sketch.quantile(0.5),
+            p95=self.sketch.quantile(0.95),
+            p99=self.sketch.quantile(0.99),
+            last=self.last,
+            slope=self.co_moment / self.m2_hours if self.m2_hours > 0 else 0.0,
+            min_at=self.min_at,
+            max_at=self.max_at,
+        )
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+from slack_sdk.errors import SlackApiError
+
+logger = logging.getLogger(__name__)
+
+
+class ThrottledMessageUpdater:
+    """
+    Coalesce rapid updates to one Slack message
+
+    push() records the latest text and starts an update only when at least
+    `min_interval` seconds have passed since the last one and none is still
+    running, so intermediate texts are dropped instead of queued and the
+    caller never waits on Slack. finish() waits for a running update, then
+    always sends the final text, retrying a few times if Slack rejects it.
+    A rate-limited update doubles the interval. Must be used on one event
+    loop; `update` is a coroutine function.
+    """
+
+    def __init__(
+        self,
+        update: Callable[[str], Awaitable],
+        min_interval: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep,
+        final_attempts: int = 3,
+    ):
+        self.update = update
+        self.min_interval = min_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.final_attempts = final_attempts
+        self.updates_sent = 0
+        self.updates_coalesced = 0
+        self._pending: Optional[str] = None
+        self._last_sent: Optional[str] = None
+        self._last_sent_at: Optional[float] = None
+        self._sending: Optional[asyncio.Task] = None
+
+    def push(self, text: str):
+        self._pending = text
+        now = self.clock()
+        if self._sending is not None or (
+            self._last_sent_at is not None and now - self._last_sent_at < self.min_interval
+        ):
+            self.updates_coalesced += 1
+            return
+        self._sending = asyncio.ensure_future(self._send_pushed(now))
+
+    async def finish(self, text: str) -> bool:
+        """Send the final text, returning whether Slack accepted it"""
+        if self._sending is not None:
+            await self._sending
+        self._pending = text
+        for attempt in range(self.final_attempts):
+            if attempt:
+                await self.sleep(self.min_interval)
+            if await self._send(self.clock()):
+                return True
+        return False
+
+    async def _send_pushed(self, now: float):
+        try:
+            await self._send(now)
+        finally:
+            self._sending = None
+
+    async def _send(self, now: float) -> bool:
+        text = self._pending
+        if text is None or text == self._last_sent:
+            return True
+        self._last_sent_at = now
+        try:
+            await self.update(text)
+        except SlackApiError as e:
+            if e.response is not None and e.response.get("error") == "ratelimited":
+                self.min_interval *= 2
+                logger.warning(f"Slack update rate limited, slowing updates to every {self.min_interval}s")
+            else:
+                logger.error(f"Error streaming update to Slack: {str(e)}")
+            return False
+        self.updates_sent += 1
+        self._last_sent = text
+        return True
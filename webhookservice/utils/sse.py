@@ -0,0 +1,171 @@
+import json
+import logging
+import requests
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+from webhookservice.utils.deadline import Deadline, deadline_expired
+
+logger = logging.getLogger(__name__)
+
+SSE_FIELDS = ("data", "event", "id", "retry")
+
+
+@dataclass
+class SSEEvent:
+    event: str
+    data: str
+    id: Optional[str] = None
+
+
+class SSEParser:
+    """
+    Incremental parser for text/event-stream framing
+
+    Lines are fed one at a time and an SSEEvent is returned whenever a blank
+    line completes an event. Consecutive data lines are joined with newlines.
+    Lines that don't start with a known field (e.g. a bare JSON document) are
+    treated as data so slightly malformed streams still parse.
+    """
+
+    def __init__(self):
+        self._event = None
+        self._id = None
+        self._data: List[str] = []
+
+    def feed_line(self, line: Union[str, bytes]) -> Optional[SSEEvent]:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.rstrip("\r\n")
+
+        if not line:
+            return self.flush()
+        if line.startswith("data: "):  # Fast path for the common case
+            self._data.append(line[6:])
+            return None
+        if line.startswith(":"):  # Comment / keep-alive
+            return None
+
+        field, sep, value = line.partition(":")
+        if not sep or field not in SSE_FIELDS:
+            self._data.append(line)
+            return None
+        if value.startswith(" "):
+            value = value[1:]
+
+        if field == "data":
+            self._data.append(value)
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            self._id = value
+        return None
+
+    def flush(self) -> Optional[SSEEvent]:
+        """Complete the pending event, if it carries any data"""
+        event = None
+        if self._data:
+            event = SSEEvent(
+                event=self._event or "message",
+                data="\n".join(self._data),
+                id=self._id,
+            )
+        self._event = None
+        self._data = []
+        return event
+
+
+def iter_sse_events(lines: Iterable[Union[str, bytes]]) -> Iterator[SSEEvent]:
+    """Yield SSE events from an iterable of raw stream lines"""
+    parser = SSEParser()
+    for line in lines:
+        event = parser.feed_line(line)
+        if event:
+            yield event
+    event = parser.flush()
+    if event:
+        yield event
+
+
+def decode_dify_event(event: SSEEvent) -> List[Dict[str, Any]]:
+    """
+    Decode the JSON payloads carried in one event's data
+
+    When an event holds several JSON documents on separate data lines
+    (streams without blank line separators), each line is decoded on its own.
+    """
+    try:
+        payload = json.loads(event.data)
+    except json.JSONDecodeError:
+        payloads = []
+        for data_line in event.data.split("\n"):
+            try:
+                payload = json.loads(data_line)
+            except json.JSONDecodeError:
+                logger.debug(f"Skipping undecodable stream data: {data_line}")
+                continue
+            if isinstance(payload, dict):
+                payloads.append(payload)
+        return payloads
+    return [payload] if isinstance(payload, dict) else []
+
+
+def iter_dify_events(lines: Iterable[Union[str, bytes]]) -> Iterator[Dict[str, Any]]:
+    """Yield decoded Dify payloads from a streaming response"""
+    for event in iter_sse_events(lines):
+        yield from decode_dify_event(event)
+
+
+def dispatch_dify_event(event: SSEEvent, handlers: Dict[str, Callable[[Dict[str, Any]], Any]]) -> Any:
+    """Run the handlers for each payload in an event, returning the first non-None result"""
+    for payload in decode_dify_event(event):
+        handler = handlers.get(payload.get("event"))
+        if handler is None:
+            continue
+        result = handler(payload)
+        if result is not None:
+            return result
+    return None
+
+
+async def async_stream_dify_events(
+    response,
+    handlers: Dict[str, Callable[[Dict[str, Any]], Any]],
+    deadline: Optional[Deadline] = None,
+) -> Any:
+    """
+    Dispatch Dify stream events to handlers keyed by event type
+
+    Handlers are plain functions. One that returns anything other than None
+    ends the stream early: reading stops and its value is returned. Reading
+    also stops once the deadline has passed, leaving the handlers with what
+    arrived so far. The response is always closed so the connection goes
+    back to the pool.
+
+    Args:
+        response: A streaming AsyncResponse from async_make_dify_request
+        handlers: Callbacks such as {"agent_thought": fn, "end": fn}
+        deadline: Optional budget for the whole request
+
+    Returns:
+        The first non-None handler result, or None once the stream ends
+    """
+    parser = SSEParser()
+    try:
+        async for line in response.iter_lines():
+            event = parser.feed_line(line)
+            if event is not None:
+                result = dispatch_dify_event(event, handlers)
+                if result is not None:
+                    return result
+                if deadline_expired(deadline):
+                    logger.warning("Request deadline reached, stopping Dify stream early")
+                    return None
+        event = parser.flush()
+        return dispatch_dify_event(event, handlers) if event else None
+    except requests.RequestException:
+        if deadline_expired(deadline):
+            logger.warning("Request deadline reached while reading Dify stream")
+            return None
+        raise
+    finally:
+        response.close()
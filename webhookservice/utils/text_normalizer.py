@@ -0,0 +1,91 @@
+"""
+Linear-time normalization of Dify text answers
+
+Replaces the character-by-character line building and list-membership
+dedupe that parse_deployment_intent used, producing identical output.
+"""
+from typing import Iterable, List
+
+HELP_PREFIX = "I can help you"
+
+
+def dedupe_ordered(items: Iterable[str]) -> List[str]:
+    """Drop repeated items while keeping first-seen order"""
+    seen = set()
+    unique = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            unique.append(item)
+    return unique
+
+
+def normalize_bullet(line: str) -> str:
+    """Turn "-item" into "- item"; other lines are returned unchanged"""
+    if line.startswith("-") and not line.startswith("- "):
+        return "- " + line[1:].strip()
+    return line
+
+
+def clean_lines(lines: Iterable[str]) -> List[str]:
+    """
+    Strip lines, drop empty and repeated ones and normalize bullets
+
+    A line is skipped when its stripped form matches an already normalized
+    line, which is how the original cleanup compared them.
+    """
+    seen = set()
+    cleaned = []
+    for line in lines:
+        line = line.strip()
+        if not line or line in seen:
+            continue
+        line = normalize_bullet(line)
+        seen.add(line)
+        cleaned.append(line)
+    return cleaned
+
+
+def split_on_dashes(text: str) -> List[str]:
+    """
+    Start a new line at every "-" that follows non-blank text
+
+    Leading dashes preceded only by whitespace stay on the first line.
+    """
+    parts = text.split("-")
+    first = parts[0]
+    index = 1
+    # A dash only starts a new line once the current line has content
+    while not first.strip() and index < len(parts):
+        first = first + "-" + parts[index]
+        index += 1
+
+    lines = [first.strip()] if first.strip() else []
+    lines.extend(("-" + part).strip() for part in parts[index:])
+    return lines
+
+
+def find_help_text(text: str):
+    """Return the first well-formed "I can help you ... Try commands like:" answer, if any"""
+    for possible_text in text.split(HELP_PREFIX):
+        if "deploy applications" in possible_text and "Try commands like:" in possible_text:
+            return HELP_PREFIX + possible_text
+    return None
+
+
+def clean_text(text: str) -> str:
+    """
+    Normalize a streamed Dify answer for display
+
+    Streamed help answers often repeat themselves; when a well-formed help
+    answer is present it is split into bullet lines, otherwise the text is
+    cleaned line by line.
+    """
+    if not text:
+        return ""
+
+    formatted_text = find_help_text(text)
+    if not formatted_text:
+        return "\n".join(clean_lines(text.split("\n")))
+
+    return "\n".join(clean_lines(split_on_dashes(formatted_text)))